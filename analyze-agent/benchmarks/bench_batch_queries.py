@@ -0,0 +1,107 @@
+"""Throughput of Orchestrator.run_batch vs calling Orchestrator.run once per query.
+
+Usage:
+    python benchmarks/bench_batch_queries.py --listings 20000 --queries 2000
+    python benchmarks/bench_batch_queries.py --semantic   # 额外构建向量索引（需下载 embedding 模型）
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.agent.orchestrator import Orchestrator
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.retrieval.bm25_engine import BM25Engine
+from src.retrieval.filter_engine import apply_filters
+from src.retrieval.query_parser import CITY_DISTRICTS, QueryParser
+
+NEEDS = ["近地铁", "学区房", "南北通透", "精装修", "采光好", "安静", "公园", "高性价比"]
+
+
+def saved_search_queries(n: int, seed: int = 0) -> list[str]:
+    """模拟保存的搜索条件：城市/城区/户型/预算 + 若干需求关键词。"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        city = rng.choice(list(CITY_DISTRICTS))
+        parts = [city]
+        if rng.random() < 0.6:
+            parts.append(rng.choice(CITY_DISTRICTS[city]))
+        if rng.random() < 0.5:
+            parts.append(f"{rng.randint(1, 4)}室")
+        parts.extend(rng.sample(NEEDS, k=rng.randint(1, 3)))
+        queries.append(" ".join(parts))
+    return queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--semantic", action="store_true", help="同时评测语义检索（需要 sentence-transformers 模型）")
+    args = parser.parse_args()
+
+    df = preprocess_dataframe(generate_listings(n=args.listings)).reset_index(drop=True)
+    semantic = None
+    if args.semantic:
+        from src.pipeline.build_vectors import build_vectors_from_dataframe
+        from src.retrieval.semantic_engine import SemanticEngine
+
+        index, model = build_vectors_from_dataframe(df)
+        semantic = SemanticEngine(index=index, model=model)
+    orch = Orchestrator(bm25=BM25Engine(bundle=build_bm25_from_dataframe(df)), semantic=semantic, parser=QueryParser(), ranker=Ranker())
+    queries = saved_search_queries(args.queries)
+    opts = {"top_k": args.top_k, "use_bm25": True, "use_semantic": semantic is not None}
+
+    t0 = time.perf_counter()
+    looped = [orch.run(q, df, **opts) for q in queries]
+    loop_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batched = orch.run_batch(queries, df, **opts)
+    batch_s = time.perf_counter() - t0
+
+    # 单看检索阶段：逐条 search vs 一次 search_batch（同样限定在过滤后的候选集内）
+    allowed_list = [apply_filters(df, orch.parser.parse(q)).index.to_numpy() for q in queries]
+    stages = [("bm25", orch.bm25)] + ([("semantic", semantic)] if semantic is not None else [])
+    stage_lines = []
+    for (name, engine), (scope, allowed_rows) in itertools.product(
+        stages, [("filtered", allowed_list), ("full", [None] * len(queries))]
+    ):
+        t0 = time.perf_counter()
+        single = [engine.search(q, top_k=args.top_k * 2, allowed=a) for q, a in zip(queries, allowed_rows)]
+        single_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        batch = engine.search_batch(queries, top_k=args.top_k * 2, allowed_list=allowed_rows)
+        stage_s = time.perf_counter() - t0
+        same = sum(a == b for a, b in zip(single, batch))
+        stage_lines.append(
+            f"{name:<8} {scope:<8} search loop {single_s:.2f}s vs search_batch {stage_s:.2f}s "
+            f"({single_s / stage_s:.1f}x), {same}/{len(queries)} identical"
+        )
+
+    mismatched = sum(
+        list(a["results"].get("id", [])) != list(b["results"].get("id", [])) for a, b in zip(looped, batched)
+    )
+    print(f"{len(queries)} queries over {len(df):,} listings (semantic={'on' if semantic else 'off'})")
+    print(f"loop : {loop_s:.2f}s  {len(queries) / loop_s:.0f} q/s")
+    print(f"batch: {batch_s:.2f}s  {len(queries) / batch_s:.0f} q/s  ({loop_s / batch_s:.1f}x)")
+    print(f"result lists differing from the loop: {mismatched}")
+    for line in stage_lines:
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Memory of the resident listing table before/after compaction, plus filter/rank/summary equivalence.
+
+Usage:
+    python benchmarks/bench_compact.py --listings 1000000 --queries 200
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench_filter_index import random_conditions
+from src.agent.orchestrator import Orchestrator
+from src.analytics.summary import summarize_listings
+from src.pipeline.compact import compact_listings, decode_tags, has_tags, memory_report
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.retrieval.filter_engine import _apply_filters_mask, apply_filters
+from src.retrieval.filter_index import FilterIndex
+from src.retrieval.query_parser import QueryParser
+
+
+def resident_frame(n: int) -> pd.DataFrame:
+    """与 load_data 读到的默认库一致：预处理后经 parquet 往返（tags 为数组列）。"""
+    base = preprocess_dataframe(generate_listings(n=min(n, 5000))).reset_index(drop=True)
+    df = pd.concat([base] * -(-n // len(base)), ignore_index=True).iloc[:n].copy()
+    df["id"] = [f"L{i:07d}" for i in range(len(df))]
+    rng = np.random.default_rng(0)
+    df.loc[rng.random(len(df)) < 0.01, "floor"] = np.nan
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    buf.seek(0)
+    return pd.read_parquet(buf)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    df = resident_frame(args.listings)
+    t0 = time.perf_counter()
+    compact = compact_listings(df)
+    compact_s = time.perf_counter() - t0
+    print(memory_report(df, compact).to_string())
+    print(f"compaction took {compact_s:.1f}s for {len(df):,} rows")
+    FilterIndex.for_frame(df)  # 两份表都按常驻表登记，比较的是索引路径
+    FilterIndex.for_frame(compact)
+
+    orch = Orchestrator(bm25=None, semantic=None, parser=QueryParser(), ranker=Ranker())
+    opts = {"top_k": 20, "use_bm25": False, "use_semantic": False}
+    rng = np.random.default_rng(1)
+    for _ in range(args.queries):
+        cond = random_conditions(rng)
+        rows = apply_filters(df, cond).index
+        assert apply_filters(compact, cond).index.equals(rows), cond
+        assert _apply_filters_mask(compact, cond).index.equals(rows), cond
+        expected = orch.run("", df, conditions=cond, **opts)["results"]
+        got = orch.run("", compact, conditions=cond, **opts)["results"]
+        assert list(expected.get("id", [])) == list(got.get("id", [])), cond
+        if not expected.empty:
+            assert np.array_equal(expected["fused_score"], got["fused_score"]), cond
+            assert summarize_listings(expected, cond) == summarize_listings(got, cond), cond
+
+    tags = df["tags"].map(set)
+    assert decode_tags(compact).map(set).equals(tags)
+    for wanted in (["近地铁"], ["学区房", "南北通透"]):
+        assert np.array_equal(has_tags(compact, wanted), tags.map(set(wanted).issubset).to_numpy())
+    print(f"{args.queries} condition sets: filters, rankings and summaries identical; tags round-trip")
+
+
+if __name__ == "__main__":
+    main()
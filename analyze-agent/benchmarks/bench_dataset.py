@@ -0,0 +1,101 @@
+"""Filter-mode latency and memory: partitioned-dataset pushdown reads vs the resident full DataFrame.
+
+Usage:
+    python benchmarks/bench_dataset.py --listings 200000 --queries 200
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.agent.orchestrator import Orchestrator
+from src.pipeline.build_dataset import MANIFEST_FILE, build_dataset
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.ranking.scoring import SCORING_COLUMNS
+from src.retrieval.filter_engine import FILTER_COLUMNS
+from src.retrieval.filter_index import FilterIndex
+from src.retrieval.listing_dataset import ListingDataset
+from src.retrieval.query_parser import CITY_DISTRICTS, QueryParser
+
+DISPLAY_COLUMNS = ["id", "city", "district", "community", "layout", "total_price", "area", "unit_price"]
+
+
+def filter_mode_conditions(rng: np.random.Generator) -> dict:
+    """模拟条件筛选页：城市/城区下拉 + 价格/面积/户型/学区。"""
+    city = str(rng.choice(list(CITY_DISTRICTS)))
+    cond: dict = {"city": city if rng.random() < 0.8 else None}
+    cond["districts"] = [str(rng.choice(CITY_DISTRICTS[city]))] if cond["city"] and rng.random() < 0.6 else None
+    if rng.random() < 0.6:
+        low = float(rng.uniform(200, 900))
+        cond["min_price"], cond["max_price"] = low, low + float(rng.uniform(50, 300))
+    if rng.random() < 0.4:
+        cond["min_area"] = float(rng.uniform(50, 120))
+    cond["bedrooms_exact"] = int(rng.integers(1, 5)) if rng.random() < 0.5 else None
+    cond["school_district"] = True if rng.random() < 0.3 else None
+    return cond
+
+
+def frame_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+
+    base = preprocess_dataframe(generate_listings(n=min(args.listings, 5000))).reset_index(drop=True)
+    df = pd.concat([base] * -(-args.listings // len(base)), ignore_index=True).iloc[: args.listings].copy()
+    df["id"] = [f"L{i:07d}" for i in range(len(df))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "listings.parquet"
+        df.to_parquet(source, index=False)
+        root = build_dataset(source, Path(tmp) / "dataset")
+        dataset = ListingDataset(root, joblib.load(root / MANIFEST_FILE))  # 临时源文件，不做过期检查
+        resident = pd.read_parquet(source)
+        FilterIndex.for_frame(resident)
+        columns = list(dict.fromkeys([*DISPLAY_COLUMNS, *FILTER_COLUMNS, *SCORING_COLUMNS]))
+
+        orch = Orchestrator(bm25=None, semantic=None, parser=QueryParser(), ranker=Ranker())
+        opts = {"top_k": args.top_k, "use_bm25": False, "use_semantic": False}
+        rng = np.random.default_rng(0)
+        mem_lat, ds_lat, read_mb, mismatched = [], [], [], 0
+        for _ in range(args.queries):
+            cond = filter_mode_conditions(rng)
+            t0 = time.perf_counter()
+            expected = orch.run("", resident, conditions=cond, **opts)["results"]
+            mem_lat.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            frame = dataset.read(cond, columns)
+            got = orch.run("", frame, conditions=cond, **opts)["results"]
+            ds_lat.append(time.perf_counter() - t0)
+            read_mb.append(frame_mb(frame))
+            mismatched += list(expected.get("id", [])) != list(got.get("id", []))
+
+    print(f"{args.queries} filter-mode queries over {len(df):,} listings, {len(dataset.manifest['partitions'])} partitions")
+    print(f"resident DataFrame: {frame_mb(resident):.0f}MB held per worker")
+    for label, lat in (("memory", mem_lat), ("dataset", ds_lat)):
+        lat_ms = np.asarray(lat) * 1000
+        print(f"{label:<8} p50={np.percentile(lat_ms, 50):.1f}ms p99={np.percentile(lat_ms, 99):.1f}ms")
+    print(f"dataset reads per query: p50={np.percentile(read_mb, 50):.1f}MB max={max(read_mb):.1f}MB")
+    print(f"result lists differing from the resident path: {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
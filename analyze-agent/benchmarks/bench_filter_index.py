@@ -0,0 +1,101 @@
+"""Equivalence and latency of the prebuilt FilterIndex vs the per-column mask scan.
+
+Usage:
+    python benchmarks/bench_filter_index.py
+    python benchmarks/bench_filter_index.py --n 1000000 --queries 300
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.retrieval.filter_engine import _apply_filters_mask
+from src.retrieval.filter_index import FilterIndex
+from src.retrieval.query_parser import CITY_DISTRICTS
+
+
+def synthetic_listings(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    cities = list(CITY_DISTRICTS)
+    city = rng.choice(cities, n)
+    district = np.empty(n, dtype=object)
+    for c in cities:
+        mask = city == c
+        district[mask] = rng.choice(CITY_DISTRICTS[c], int(mask.sum()))
+    price = rng.uniform(150, 1500, n)
+    price[rng.random(n) < 0.01] = np.nan
+    return pd.DataFrame(
+        {
+            "city": city,
+            "district": district,
+            "total_price": price,
+            "area": rng.uniform(35, 220, n),
+            "bedrooms": rng.integers(1, 6, n).astype("float64"),
+            "livingrooms": rng.integers(0, 3, n).astype("float64"),
+            "school_district": pd.array(rng.choice([True, False], n), dtype="boolean"),
+        }
+    )
+
+
+def random_conditions(rng: np.random.Generator) -> dict:
+    city = rng.choice(list(CITY_DISTRICTS))
+    cond: dict = {"city": city if rng.random() < 0.8 else None}
+    if rng.random() < 0.5:
+        cond["districts"] = [rng.choice(CITY_DISTRICTS[city])]
+    if rng.random() < 0.6:
+        lo = float(rng.uniform(150, 900))
+        cond["min_price"] = lo
+        cond["max_price"] = lo + float(rng.uniform(50, 500)) if rng.random() < 0.7 else None
+    if rng.random() < 0.4:
+        cond["min_area"] = float(rng.uniform(40, 120))
+    if rng.random() < 0.5:
+        cond["bedrooms_exact"] = int(rng.integers(1, 5))
+    elif rng.random() < 0.3:
+        cond["bedrooms"] = int(rng.integers(1, 5))
+    if rng.random() < 0.2:
+        cond["livingrooms_exact"] = int(rng.integers(1, 3))
+    if rng.random() < 0.3:
+        cond["school_district"] = True
+    return cond
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    df = synthetic_listings(args.n)
+    t0 = time.perf_counter()
+    index = FilterIndex(df)
+    print(f"built FilterIndex over {args.n:,} rows in {time.perf_counter() - t0:.2f}s")
+
+    rng = np.random.default_rng(1)
+    idx_lat, mask_lat = [], []
+    for _ in range(args.queries):
+        cond = random_conditions(rng)
+        t0 = time.perf_counter()
+        rows = index.query(cond)
+        idx_lat.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        expected = _apply_filters_mask(df, cond).index.to_numpy()
+        mask_lat.append(time.perf_counter() - t0)
+        assert np.array_equal(rows, expected), cond
+
+    for label, lat in (("index", idx_lat), ("mask", mask_lat)):
+        lat_ms = np.asarray(lat) * 1000
+        print(f"{label:<6} p50={np.percentile(lat_ms, 50):.3f}ms p99={np.percentile(lat_ms, 99):.3f}ms")
+    print(f"{args.queries} random condition sets returned identical rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Peak memory and throughput of streaming preprocess vs whole-file preprocess.
+
+Usage:
+    python benchmarks/bench_ingest.py --rows 500000 --format csv
+    python benchmarks/bench_ingest.py --rows 50000 --format xlsx --chunk-rows 10000
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess
+
+
+def write_source(path: Path, rows: int, fmt: str) -> None:
+    """以 2000 条生成样本平铺出指定行数（faker 生成百万行太慢），id 重新编号。"""
+    base = generate_listings(n=2000)
+    reps = -(-rows // len(base))
+    df = pd.concat([base] * reps, ignore_index=True).iloc[:rows]
+    df["id"] = [f"L{i:07d}" for i in range(len(df))]
+    df["tags"] = df["tags"].map(",".join)  # 与导出文件一致：标签为逗号分隔字符串
+    df.loc[np.random.default_rng(0).random(len(df)) < 0.01, "floor"] = np.nan
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def peak_rss_mb() -> float:
+    """本进程峰值 RSS（Linux VmHWM）；ru_maxrss 会带上 fork 时父进程的峰值，不能用于子进程。"""
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def worker(mode: str, src: Path, dst: Path, chunk_rows: int) -> None:
+    """子进程内执行一次预处理，输出耗时与峰值 RSS（MB）。"""
+    t0 = time.perf_counter()
+    preprocess(src, dst, chunk_rows=chunk_rows if mode == "stream" else None)
+    elapsed = time.perf_counter() - t0
+    print(f"RESULT {elapsed:.3f} {peak_rss_mb():.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--format", choices=["csv", "parquet", "xlsx"], default="csv")
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    parser.add_argument("--worker", nargs=3, metavar=("MODE", "SRC", "DST"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        mode, src, dst = args.worker
+        worker(mode, Path(src), Path(dst), args.chunk_rows)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / f"listings.{args.format}"
+        write_source(src, args.rows, args.format)
+        print(f"{args.rows:,} rows, {args.format} source {src.stat().st_size / 2**20:.0f}MB")
+        outputs = {}
+        for mode in ("full", "stream"):
+            dst = Path(tmp) / f"{mode}.parquet"
+            proc = subprocess.run(
+                [sys.executable, __file__, "--chunk-rows", str(args.chunk_rows), "--worker", mode, str(src), str(dst)],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            elapsed, peak = proc.stdout.strip().splitlines()[-1].split()[1:]
+            print(f"{mode:<6} {float(elapsed):.1f}s  {args.rows / float(elapsed):,.0f} rows/s  peak RSS {peak}MB")
+            outputs[mode] = pd.read_parquet(dst)
+        pd.testing.assert_frame_equal(outputs["full"], outputs["stream"])
+        print("outputs identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Per-request intermediate memory: ranking the full-width frame vs a narrow projection with late materialization.
+
+Usage:
+    python benchmarks/bench_late.py --listings 200000 --queries 50
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench_dataset import filter_mode_conditions
+from src.agent.orchestrator import RANK_COLUMNS, Orchestrator
+from src.pipeline.build_dataset import MANIFEST_FILE, build_dataset
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.retrieval.filter_engine import apply_filters
+from src.retrieval.filter_index import FilterIndex
+from src.retrieval.listing_dataset import ListingDataset
+from src.retrieval.query_parser import QueryParser
+
+
+def eager_rank(ranker: Ranker, df: pd.DataFrame, conditions: dict, top_k: int) -> pd.DataFrame:
+    """改动前的路径：整行过滤、复制并排序，所有列贯穿全程。"""
+    filtered = apply_filters(df, conditions)
+    if filtered.empty:
+        return pd.DataFrame()
+    filtered = filtered.copy()
+    filtered["bm25_score"] = 0.0
+    filtered["semantic_score"] = 0.0
+    return ranker.rank(filtered, top_k=top_k)
+
+
+def measure(fn) -> tuple[object, float, float]:
+    """返回 (结果, 峰值新增分配 MB, 耗时 ms)；耗时取不开 tracemalloc 的单独一次运行。"""
+    t0 = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - t0) * 1000
+    tracemalloc.start()
+    out = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, peak / 2**20, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+
+    base = preprocess_dataframe(generate_listings(n=min(args.listings, 5000))).reset_index(drop=True)
+    df = pd.concat([base] * -(-args.listings // len(base)), ignore_index=True).iloc[: args.listings].copy()
+    df["id"] = [f"L{i:07d}" for i in range(len(df))]
+
+    orch = Orchestrator(bm25=None, semantic=None, parser=QueryParser(), ranker=Ranker())
+    opts = {"top_k": args.top_k, "use_bm25": False, "use_semantic": False}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "listings.parquet"
+        df.to_parquet(source, index=False)
+        root = build_dataset(source, Path(tmp) / "dataset")
+        dataset = ListingDataset(root, joblib.load(root / MANIFEST_FILE))
+        resident = pd.read_parquet(source)
+        FilterIndex.for_frame(resident)
+
+        stats = {name: ([], []) for name in ("resident eager", "resident late", "dataset eager", "dataset late")}
+        rng = np.random.default_rng(0)
+        for _ in range(args.queries):
+            cond = filter_mode_conditions(rng)
+            runs = {
+                "resident eager": lambda: eager_rank(orch.ranker, resident, cond, args.top_k),
+                "resident late": lambda: orch.run("", resident, conditions=cond, **opts)["results"],
+                "dataset eager": lambda: eager_rank(orch.ranker, dataset.read(cond), cond, args.top_k),
+                "dataset late": lambda: orch.run(
+                    "", dataset.read(cond, RANK_COLUMNS), conditions=cond, fetch_rows=dataset.take, **opts
+                )["results"],
+            }
+            results = {}
+            for name, fn in runs.items():
+                results[name], peak_mb, ms = measure(fn)
+                stats[name][0].append(peak_mb)
+                stats[name][1].append(ms)
+            expected = results["resident eager"]
+            for name, got in results.items():
+                pd.testing.assert_frame_equal(got, expected, check_exact=True, obj=f"{name} {cond}")
+
+    print(f"{args.queries} filter-mode queries over {len(df):,} listings (top_k={args.top_k}), all result frames identical")
+    for name, (peaks, lat) in stats.items():
+        print(
+            f"{name:<15} peak alloc p50={np.percentile(peaks, 50):7.1f}MB max={max(peaks):7.1f}MB  "
+            f"latency p50={np.percentile(lat, 50):6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Connections opened, latency and failure handling of LLM calls: a fresh OpenAI client per request vs the pooled LLMClient.
+
+Concurrent users call a local fake OpenAI-compatible server (tests/fake_llm.py), optionally with injected 503s
+and stalled responses, so the numbers show connection reuse, the concurrency cap, retries and the deadline.
+
+Usage:
+    python benchmarks/bench_llm_client.py --users 20 --calls 5 --fail-rate 0.2 --stall-rate 0.05 --deadline 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from openai import OpenAI
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.agent.llm_client import LLMClient
+from src.config import settings
+from tests.fake_llm import REPORT, fake_llm_server
+
+REQUEST = {"model": settings.llm_model, "messages": [{"role": "user", "content": "生成报告"}]}
+
+
+def run_users(call: Callable[[], str], users: int, calls: int) -> tuple[np.ndarray, int]:
+    """users 个并发用户各调用 calls 次，返回 (各次耗时, 失败次数)；失败指抛出异常（调用方会回退本地模板）。"""
+
+    def user() -> list[tuple[float, bool]]:
+        out = []
+        for _ in range(calls):
+            t0 = time.perf_counter()
+            try:
+                ok = call() == REPORT
+            except Exception:
+                ok = False
+            out.append((time.perf_counter() - t0, ok))
+        return out
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = [r for rs in pool.map(lambda _: user(), range(users)) for r in rs]
+    return np.array([r[0] for r in results]), sum(not r[1] for r in results)
+
+
+async def run_async(client: LLMClient, n: int) -> tuple[np.ndarray, int]:
+    async def one() -> tuple[float, bool]:
+        t0 = time.perf_counter()
+        try:
+            ok = await client.acomplete(REQUEST) == REPORT
+        except Exception:
+            ok = False
+        return time.perf_counter() - t0, ok
+
+    results = await asyncio.gather(*(one() for _ in range(n)))
+    return np.array([r[0] for r in results]), sum(not r[1] for r in results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=2)
+    parser.add_argument("--fail-rate", type=float, default=0.2, help="故障场景中返回 503 的请求比例")
+    parser.add_argument("--stall-rate", type=float, default=0.05, help="故障场景中挂起不响应的请求比例")
+    parser.add_argument("--deadline", type=float, default=5.0, help="LLMClient 的单次调用总时限（秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLMClient 的并发上限")
+    args = parser.parse_args()
+
+    tokens = [REPORT[i : i + 2] for i in range(0, len(REPORT), 2)]
+    rng = np.random.default_rng(0)
+    faulty = {"on": False}
+
+    def fault() -> str | None:
+        if not faulty["on"]:
+            return None
+        r = rng.random()
+        return "error" if r < args.fail_rate else "stall" if r < args.fail_rate + args.stall_rate else None
+
+    server = fake_llm_server(tokens, args.first_token_ms / 1000, args.token_ms / 1000, fault=fault)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    def fresh_call() -> str:
+        """改动前：每个请求新建 OpenAI client（SDK 默认 2 次重试、600 秒超时），用完即弃。"""
+        client = OpenAI(base_url=base_url, api_key="fake")
+        return client.chat.completions.create(**REQUEST).choices[0].message.content
+
+    pooled = LLMClient(api_key="fake", base_url=base_url, timeout=args.deadline, max_concurrency=args.concurrency)
+    n = args.users * args.calls
+    print(
+        f"{args.users} concurrent users x {args.calls} calls; fake LLM {args.first_token_ms:.0f}ms + {len(tokens)} tokens x "
+        f"{args.token_ms:.0f}ms; LLMClient concurrency={args.concurrency}, deadline={args.deadline:.1f}s"
+    )
+    print(f"{'':<26} {'connections':>11} {'p50':>8} {'p99':>8} {'max':>8} {'failed':>7}")
+    scenarios = (
+        ("healthy", False, "fresh client", lambda: run_users(fresh_call, args.users, args.calls)),
+        ("healthy", False, "pooled", lambda: run_users(lambda: pooled.complete(REQUEST), args.users, args.calls)),
+        ("healthy", False, "pooled async", lambda: asyncio.run(run_async(pooled, n))),
+        ("faults", True, "fresh client", lambda: run_users(fresh_call, args.users, args.calls)),
+        ("faults", True, "pooled", lambda: run_users(lambda: pooled.complete(REQUEST), args.users, args.calls)),
+    )
+    for name, faults_on, label, fn in scenarios:
+        faulty["on"] = faults_on
+        before = server.connections
+        lat, failed = fn()
+        print(
+            f"{name + ' / ' + label:<26} {server.connections - before:>11} {np.percentile(lat, 50) * 1000:7.0f}ms "
+            f"{np.percentile(lat, 99) * 1000:7.0f}ms {lat.max() * 1000:7.0f}ms {failed:>4}/{n}"
+        )
+    print(
+        f"faults: {args.fail_rate:.0%} of upstream requests return 503 and {args.stall_rate:.0%} stall for 60s; pooled calls that "
+        f"hit the {args.deadline:.1f}s deadline or run out of retries ({settings.llm_max_retries}) fall back to the local template"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
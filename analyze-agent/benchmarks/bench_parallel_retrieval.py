@@ -0,0 +1,81 @@
+"""Request latency of Orchestrator.run with serial vs parallel filter/BM25/semantic branches.
+
+Usage:
+    python benchmarks/bench_parallel_retrieval.py --listings 20000 --queries 300
+    python benchmarks/bench_parallel_retrieval.py --semantic   # 额外构建向量索引（需下载 embedding 模型）
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_batch_queries import saved_search_queries
+from src.agent.orchestrator import Orchestrator
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.retrieval.bm25_engine import BM25Engine
+from src.retrieval.query_parser import QueryParser
+
+
+def run_mode(orch: Orchestrator, df, queries: list[str], parallel: bool, opts: dict) -> tuple[list[dict], dict]:
+    settings.retrieval_parallel = parallel
+    orch.run(queries[0], df, **opts)  # 预热（线程池、jieba 词典、模型）
+    outputs, stages = [], {}
+    for q in queries:
+        out = orch.run(q, df, **opts)
+        outputs.append(out)
+        for name, ms in out["timings"].items():
+            stages.setdefault(name, []).append(ms)
+    return outputs, stages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--semantic", action="store_true", help="同时评测语义检索（需要 sentence-transformers 模型）")
+    args = parser.parse_args()
+
+    df = preprocess_dataframe(generate_listings(n=args.listings)).reset_index(drop=True)
+    semantic = None
+    if args.semantic:
+        from src.pipeline.build_vectors import build_vectors_from_dataframe
+        from src.retrieval.semantic_engine import SemanticEngine
+
+        index, model = build_vectors_from_dataframe(df)
+        semantic = SemanticEngine(index=index, model=model)
+    orch = Orchestrator(bm25=BM25Engine(bundle=build_bm25_from_dataframe(df)), semantic=semantic, parser=QueryParser(), ranker=Ranker())
+    queries = saved_search_queries(args.queries, seed=7)
+    opts = {"top_k": args.top_k, "use_bm25": True, "use_semantic": semantic is not None}
+
+    print(f"{len(queries)} queries over {len(df):,} listings (semantic={'on' if semantic else 'off'}, "
+          f"workers={settings.retrieval_max_workers})")
+    results = {}
+    for label, parallel in (("serial", False), ("parallel", True)):
+        outputs, stages = run_mode(orch, df, queries, parallel, opts)
+        results[label] = outputs
+        total = np.asarray(stages.pop("total"))
+        branch = " ".join(f"{k}={np.mean(v):.2f}ms" for k, v in stages.items())
+        print(f"{label:<9} p50={np.percentile(total, 50):.2f}ms p99={np.percentile(total, 99):.2f}ms  mean per stage: {branch}")
+
+    mismatched = sum(
+        list(a["results"].get("id", [])) != list(b["results"].get("id", []))
+        for a, b in zip(results["serial"], results["parallel"])
+    )
+    print(f"result lists differing between modes: {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
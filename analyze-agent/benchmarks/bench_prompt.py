@@ -0,0 +1,112 @@
+"""Input tokens of the assistant report prompt: legacy JSON rendering vs the compact, token-budgeted prompt builder.
+
+Each saved-search query is retrieved and summarized as in assistant mode, then rendered three ways: the previous
+format (full user_filter and summary JSON, verbose listing records), the compact format without a budget, and the
+compact format under one or more token budgets. Counts use tiktoken for settings.llm_model when available and a
+conservative estimate otherwise (the output says which).
+
+Usage:
+    python benchmarks/bench_prompt.py --listings 5000 --queries 200 --budgets 1200 800 600
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_batch_queries import saved_search_queries
+from src.agent.answer_generator import SYSTEM_PROMPT, AnswerGenerator, load_template
+from src.agent.orchestrator import Orchestrator
+from src.agent.prompt_builder import build_prompt, compact_filter, count_message_tokens, tokens_exact
+from src.analytics.summary import summarize_listings
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.pipeline.context import SessionDataContext
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.retrieval.query_parser import QueryParser
+
+LEGACY_COLUMNS = ["id", "city", "district", "community", "layout", "total_price", "area", "unit_price"]
+
+
+def legacy_prompt(template: str, user_query: str, user_filter: dict, summary_stats: dict, listings: pd.DataFrame) -> str:
+    """改动前的渲染方式：完整条件与统计 JSON（含内嵌条件与空值）、前 5 套房源的 records JSON。"""
+    return template.format(
+        user_query=user_query,
+        user_filter_json=json.dumps(user_filter, ensure_ascii=False),
+        summary_stats_json=json.dumps(summary_stats, ensure_ascii=False),
+        top_listings_table=listings[LEGACY_COLUMNS].head(5).to_json(force_ascii=False, orient="records"),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[settings.llm_prompt_max_tokens, 800, 600])
+    args = parser.parse_args()
+
+    df = preprocess_dataframe(generate_listings(n=args.listings)).reset_index(drop=True)
+    context = SessionDataContext(df=df, bm25_index=build_bm25_from_dataframe(df))
+    orch = Orchestrator(bm25=None, semantic=None, parser=QueryParser(), ranker=Ranker())
+    template = load_template()
+    formatter = AnswerGenerator(llm_client=None, cache=None)
+
+    inputs = []
+    for q in saved_search_queries(args.queries, seed=5):
+        out = orch.run(q, df, top_k=args.top_k, use_semantic=False, context=context)
+        if not out["results"].empty:
+            summary = formatter._format_summary(summarize_listings(out["results"], out["parsed"]))
+            inputs.append((q, out["parsed"], summary, out["results"]))
+
+    def messages(prompt: str) -> list[dict]:
+        return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+    rows = {"legacy": ([count_message_tokens(messages(legacy_prompt(template, *x))) for x in inputs], 0.0, None, None)}
+    for budget in [0, *args.budgets]:
+        tokens, kept, trimmed = [], [], 0
+        t0 = time.perf_counter()
+        for q, parsed, summary, ranked in inputs:
+            built = build_prompt(template, q, parsed, summary, ranked, system_prompt=SYSTEM_PROMPT, max_tokens=budget)
+            assert built.tokens == count_message_tokens(messages(built.text)), q
+            ids = ranked["id"].astype(str).head(built.rows).tolist()
+            assert all(i in built.text for i in ids), q  # 保留的房源都在简表中
+            assert all(str(v) in built.text for v in compact_filter(parsed).values() if not isinstance(v, list)), q
+            if budget == 0:
+                assert built.rows == min(len(ranked), settings.llm_prompt_max_rows) and not built.dropped, q
+            else:
+                assert built.tokens <= budget or built.rows == 1, q  # 只有裁剪到最后一步仍超出时才允许超预算
+            tokens.append(built.tokens)
+            kept.append(built.rows)
+            trimmed += bool(built.dropped)
+        label = "compact, no budget" if budget == 0 else f"compact, budget {budget}"
+        rows[label] = (tokens, (time.perf_counter() - t0) / len(inputs) * 1000, np.mean(kept), trimmed)
+
+    print(
+        f"{len(inputs)} assistant prompts over {len(df):,} listings; tokens for {settings.llm_model} "
+        f"({'tiktoken' if tokens_exact() else 'estimated, tiktoken unavailable'}), system prompt included"
+    )
+    base = np.mean(rows["legacy"][0])
+    print(f"{'':<22} {'mean':>7} {'p50':>7} {'max':>7} {'vs legacy':>10} {'build':>8} {'listings':>9} {'trimmed':>8}")
+    for label, (tokens, ms, kept, trimmed) in rows.items():
+        extra = "" if kept is None else f" {ms:6.2f}ms {kept:9.1f} {trimmed:>4}/{len(inputs)}"
+        print(
+            f"{label:<22} {np.mean(tokens):7.0f} {np.percentile(tokens, 50):7.0f} {max(tokens):7.0f} "
+            f"{np.mean(tokens) / base - 1:+10.0%}{extra}"
+        )
+
+
+if __name__ == "__main__":
+    main()
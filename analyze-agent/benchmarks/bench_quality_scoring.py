@@ -0,0 +1,114 @@
+"""Equivalence check and speed-up of the columnar quality scoring vs the per-row reference.
+
+Usage:
+    python benchmarks/bench_quality_scoring.py
+    python benchmarks/bench_quality_scoring.py --n 100000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.config import settings
+from src.ranking.scoring import (
+    QUALITY_COMPONENTS,
+    _clip01,
+    _compute_quality_components,
+    add_static_quality_columns,
+    compute_quality_scores,
+)
+
+FILTER_CASES = [
+    {},
+    {"max_price": 600.0},
+    {"min_price": 300.0, "max_price": 800.0},
+    {"min_area": 80},
+    {"max_area": 120.0},
+    {"min_area": 70, "max_area": 110.0},
+]
+
+
+def synthetic_candidates(n: int, seed: int = 0) -> pd.DataFrame:
+    """生成含缺失值与边界值的候选集，覆盖各子分数的分支。"""
+    rng = np.random.default_rng(seed)
+
+    def with_nan(values: np.ndarray, ratio: float = 0.03) -> np.ndarray:
+        values = values.astype("float64")
+        values[rng.random(n) < ratio] = np.nan
+        return values
+
+    floor = rng.integers(0, 31, n).astype("float64")
+    total_floors = np.maximum(floor, rng.integers(0, 35, n)).astype("float64")
+    total_floors[rng.random(n) < 0.05] = 0
+    return pd.DataFrame(
+        {
+            "id": [f"L{i:07d}" for i in range(n)],
+            "total_price": with_nan(rng.uniform(0.5, 1500, n)),
+            "area": with_nan(rng.uniform(30, 220, n)),
+            "year_built": with_nan(rng.integers(1980, 2030, n)),
+            "distance_to_subway": with_nan(rng.uniform(0, 4, n)),
+            "school_district": pd.array(rng.choice([True, False, None], n, p=[0.45, 0.5, 0.05]), dtype="boolean"),
+            "floor": with_nan(floor),
+            "total_floors": with_nan(total_floors),
+            "orientation": rng.choice(["南北", "南", "东南", "西", "东西", "北", None], n),
+            "renovation": rng.choice(["精装修", "简装", "毛坯", "其他", None], n),
+        }
+    )
+
+
+def reference_scores(df: pd.DataFrame, user_filters: dict) -> pd.DataFrame:
+    """逐行参考实现（原 iterrows 路径），pd.NA 学区按 False 处理以便对比。"""
+    w = settings.quality_weights
+    rows = []
+    ref_df = df.astype({"school_district": object}).replace({pd.NA: None})
+    for _, row in ref_df.iterrows():
+        comp = _compute_quality_components(row, user_filters)
+        values = {name: getattr(comp, name) for name in QUALITY_COMPONENTS}
+        total = values["price"] * w.get("price", 0)
+        for name in QUALITY_COMPONENTS[1:]:
+            total = total + values[name] * w.get(name, 0)
+        values["quality"] = _clip01(total)
+        rows.append(values)
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = synthetic_candidates(args.n)
+    prebuilt = add_static_quality_columns(df.copy())  # 模拟 preprocess 产出的预计算列
+    for filters in FILTER_CASES:
+        t0 = time.perf_counter()
+        ref = reference_scores(df, filters)
+        row_s = time.perf_counter() - t0
+
+        timings = {}
+        for label, frame in (("columnar", df), ("prebuilt", prebuilt)):
+            t0 = time.perf_counter()
+            scored = compute_quality_scores(frame, filters)
+            timings[label] = time.perf_counter() - t0
+            for name in QUALITY_COMPONENTS:
+                np.testing.assert_allclose(
+                    scored[f"{name}_score"].to_numpy(), ref[name].to_numpy(), rtol=0, atol=1e-12, err_msg=f"{label}:{name}"
+                )
+            np.testing.assert_allclose(scored["quality_score"].to_numpy(), ref["quality"].to_numpy(), rtol=0, atol=1e-12)
+        print(
+            f"filters={filters}: row={row_s * 1000:.1f}ms "
+            + " ".join(f"{k}={v * 1000:.1f}ms ({row_s / v:.0f}x)" for k, v in timings.items())
+            + "  [equal]"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Report cache hit rate and LLM time saved on a workload of near-duplicate assistant questions.
+
+Requests are drawn from groups of paraphrases (same intent, different wording) with a skewed popularity, and
+sent through Orchestrator.run_assistant against the local fake OpenAI-compatible server of bench_stream.py,
+once with the report cache disabled and once enabled.
+
+Usage:
+    python benchmarks/bench_report_cache.py --listings 5000 --requests 200 [--semantic]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from openai import OpenAI
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_stream import REPORT, fake_llm_server
+from src.agent.orchestrator import Orchestrator
+from src.agent.report_cache import report_cache
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.pipeline.build_vectors import build_vectors_from_dataframe
+from src.pipeline.context import SessionDataContext
+from src.pipeline.corpus import build_corpus
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.retrieval.query_parser import QueryParser
+
+PARAPHRASES = [
+    ["北京海淀两室学区", "海淀 2室 学区房", "北京 海淀 两室 学区"],
+    ["上海浦东三室近地铁", "浦东 3室 地铁", "上海 浦东 三室 靠近地铁"],
+    ["深圳南山两室", "南山 2室", "深圳 南山 两室的房子"],
+    ["北京朝阳一室500万以内", "朝阳 1室 500万", "北京 朝阳 一室 500万"],
+    ["上海徐汇两室一厅", "徐汇 2室1厅", "上海 徐汇 两室一厅"],
+    ["深圳福田三室学区", "福田 3室 学区房", "深圳 福田 三室 学区"],
+]
+
+
+def workload(n: int, seed: int = 0) -> list[str]:
+    """按 Zipf 式热度抽取意图组，再在组内随机选一种问法。"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(PARAPHRASES) + 1)
+    groups = rng.choice(len(PARAPHRASES), size=n, p=weights / weights.sum())
+    return [PARAPHRASES[g][rng.integers(len(PARAPHRASES[g]))] for g in groups]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--first-token-ms", type=float, default=800)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--semantic", action="store_true", help="同时开启语义层（按查询 embedding 相似度复用）")
+    args = parser.parse_args()
+
+    df = preprocess_dataframe(generate_listings(n=args.listings)).reset_index(drop=True)
+    corpus = build_corpus(df)
+    index, model = build_vectors_from_dataframe(df, corpus=corpus)
+    context = SessionDataContext(
+        df=df, bm25_index=build_bm25_from_dataframe(df, corpus=corpus), vector_index={"index": index, "model": model}
+    )
+    orch = Orchestrator(bm25=None, semantic=None, parser=QueryParser(), ranker=Ranker())
+    tokens = [REPORT[i : i + 2] for i in range(0, len(REPORT), 2)]
+    server = fake_llm_server(tokens, args.first_token_ms / 1000, args.token_ms / 1000)
+    client = OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="fake", max_retries=0)
+    queries = workload(args.requests)
+    orch.run(queries[0], df, top_k=args.top_k, context=context)  # 预热 jieba 词典与模型
+
+    settings.report_cache_semantic = args.semantic
+    latencies = {}
+    for label, enabled in (("no cache", False), ("report cache", True)):
+        settings.report_cache_enabled = enabled
+        report_cache.clear()
+        lat = []
+        for q in queries:
+            t0 = time.perf_counter()
+            out = orch.run_assistant(q, df, top_k=args.top_k, context=context, llm_client=client)
+            lat.append(time.perf_counter() - t0)
+            assert out["answer"] == REPORT, q
+        latencies[label] = np.asarray(lat)
+    server.shutdown()
+
+    stats = report_cache.stats()
+    distinct = len(set(queries))
+    print(
+        f"{len(queries)} requests ({distinct} distinct wordings, {len(PARAPHRASES)} intents) over {len(df):,} listings, "
+        f"semantic layer {'on' if args.semantic else 'off'}"
+    )
+    for label, lat in latencies.items():
+        print(f"{label:<13} total {lat.sum():7.1f}s  p50 {np.percentile(lat, 50) * 1000:7.0f}ms  p99 {np.percentile(lat, 99) * 1000:7.0f}ms")
+    print(
+        f"hit rate {stats['hit_rate']:.0%} (exact {stats['hits']}, semantic {stats['semantic_hits']}, miss {stats['misses']}), "
+        f"LLM time saved {stats['saved_seconds']:.1f}s, entries {stats['entries']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Per-request allocations and latency of scoring: DataFrame copies per stage vs position-aligned score buffers.
+
+Usage:
+    python benchmarks/bench_score_buffers.py --listings 200000 --queries 50
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench_dataset import filter_mode_conditions
+from src.agent.orchestrator import RANK_COLUMNS, Orchestrator, _late_materialize
+from src.config import settings
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.ranking.scoring import compute_quality_scores
+from src.retrieval.filter_engine import apply_filters
+from src.retrieval.filter_index import FilterIndex
+from src.retrieval.query_parser import QueryParser
+from src.utils.array_utils import top_k_indices
+
+
+def _normalize(scores: pd.Series) -> pd.Series:
+    if scores.min() == scores.max():
+        return pd.Series(0.0, index=scores.index)
+    return (scores - scores.min()) / (scores.max() - scores.min())
+
+
+def frame_pipeline(df: pd.DataFrame, conditions: dict, top_k: int) -> pd.DataFrame:
+    """改动前的打分路径：候选表复制后逐阶段以 DataFrame 列写入得分，再 iloc 取 top-k。"""
+    filtered = apply_filters(df, conditions, RANK_COLUMNS)
+    if filtered.empty:
+        return pd.DataFrame()
+    filtered = filtered.copy()
+    filtered["bm25_score"] = pd.Series(0.0, index=filtered.index)
+    filtered["semantic_score"] = pd.Series(0.0, index=filtered.index)
+    fused = compute_quality_scores(filtered)
+    fused["bm25_score"] = fused["bm25_score"].fillna(0)
+    fused["semantic_score"] = fused["semantic_score"].fillna(0)
+    fused["bm25_norm"] = _normalize(fused["bm25_score"])
+    fused["semantic_norm"] = _normalize(fused["semantic_score"])
+    w = settings.weights
+    base_score = fused["quality_score"] * w.quality + fused["bm25_norm"] * w.bm25 + fused["semantic_norm"] * w.semantic
+    promotion_factor = 1.0 + w.promotion * np.sqrt(fused["promotion_weight"].fillna(0)).clip(0, 1)
+    fused["fused_score"] = base_score * promotion_factor
+    fused["base_score"] = base_score
+    fused["promotion_factor"] = promotion_factor
+    top = top_k_indices(fused["fused_score"].to_numpy(), top_k, tie_break=fused["id"].to_numpy())
+    return _late_materialize(fused.iloc[top], df, None)
+
+
+def measure(fn) -> tuple[object, float, float]:
+    """返回 (结果, 峰值新增分配 MB, 耗时 ms)；耗时取不开 tracemalloc 的单独一次运行。"""
+    t0 = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - t0) * 1000
+    tracemalloc.start()
+    out = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, peak / 2**20, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+
+    base = preprocess_dataframe(generate_listings(n=min(args.listings, 5000))).reset_index(drop=True)
+    df = pd.concat([base] * -(-args.listings // len(base)), ignore_index=True).iloc[: args.listings].copy()
+    df["id"] = [f"L{i:07d}" for i in range(len(df))]
+    FilterIndex.for_frame(df)
+
+    orch = Orchestrator(bm25=None, semantic=None, parser=QueryParser(), ranker=Ranker())
+    opts = {"top_k": args.top_k, "use_bm25": False, "use_semantic": False}
+    rng = np.random.default_rng(0)
+    conditions = [{}, {"city": df["city"].iloc[0]}] + [filter_mode_conditions(rng) for _ in range(args.queries)]
+    stats: dict[str, list[tuple[int, float, float]]] = {"frames": [], "buffers": []}
+    for cond in conditions:
+        expected, peak, ms = measure(lambda: frame_pipeline(df, cond, args.top_k))
+        stats["frames"].append((len(apply_filters(df, cond)), peak, ms))
+        got, peak, ms = measure(lambda: orch.run("", df, conditions=cond, **opts)["results"])
+        stats["buffers"].append((stats["frames"][-1][0], peak, ms))
+        pd.testing.assert_frame_equal(got, expected, check_exact=True, obj=str(cond))
+
+    print(f"{len(conditions)} queries over {len(df):,} listings (top_k={args.top_k}), results identical")
+    for label, idx in (("all listings", 0), ("one city", 1)):
+        n = stats["frames"][idx][0]
+        (_, f_peak, f_ms), (_, b_peak, b_ms) = stats["frames"][idx], stats["buffers"][idx]
+        print(f"{label:<13} {n:>7,} candidates: {f_peak:6.1f}MB {f_ms:6.1f}ms -> {b_peak:6.1f}MB {b_ms:6.1f}ms")
+    for name, rows in stats.items():
+        peaks, lat = np.array([r[1] for r in rows[2:]]), np.array([r[2] for r in rows[2:]])
+        print(f"{name:<8} random filters: peak alloc p50={np.percentile(peaks, 50):6.1f}MB latency p50={np.percentile(lat, 50):6.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Per-query retrieval latency with city-sharded indexes vs one global index.
+
+Usage:
+    python benchmarks/bench_shards.py --listings 50000 --queries 500
+    python benchmarks/bench_shards.py --semantic   # 额外对比向量分片（需下载 embedding 模型）
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_batch_queries import saved_search_queries
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.pipeline.build_shards import partition_slots, shard_bm25_bundle, shard_vector_index
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.retrieval.bm25_engine import BM25Engine
+from src.retrieval.filter_engine import apply_filters
+from src.retrieval.query_parser import QueryParser
+from src.retrieval.shard_router import ShardedEngine
+
+
+def compare(label: str, global_engine, shard_engines: dict, queries, parsed_list, allowed_list) -> None:
+    lat = {"global": [], "sharded": []}
+    mismatched = 0
+    for q, parsed, allowed in zip(queries, parsed_list, allowed_list):
+        prepared = global_engine.prepare(q)
+        t0 = time.perf_counter()
+        expected = global_engine.search_prepared(prepared, top_k=20, allowed=allowed)
+        lat["global"].append(time.perf_counter() - t0)
+        city = parsed.get("city")
+        routed = ShardedEngine([shard_engines[city]] if city else list(shard_engines.values()))
+        t0 = time.perf_counter()
+        got = routed.search_prepared(prepared, top_k=20, allowed=allowed)
+        lat["sharded"].append(time.perf_counter() - t0)
+        mismatched += [i for i, _ in got] != [i for i, _ in expected]
+    for mode, values in lat.items():
+        ms = np.asarray(values) * 1000
+        print(f"{label:<8} {mode:<8} p50={np.percentile(ms, 50):.3f}ms p99={np.percentile(ms, 99):.3f}ms")
+    print(f"{label:<8} result lists differing from the global index: {mismatched}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--semantic", action="store_true", help="同时评测向量分片（需要 sentence-transformers 模型）")
+    args = parser.parse_args()
+
+    df = preprocess_dataframe(generate_listings(n=args.listings)).reset_index(drop=True)
+    queries = saved_search_queries(args.queries, seed=3)
+    qp = QueryParser()
+    parsed_list = [qp.parse(q) for q in queries]
+    allowed_list = [apply_filters(df, p).index.to_numpy() for p in parsed_list]
+    slots = partition_slots(df, "city")
+    print(f"{len(queries)} queries over {len(df):,} listings, {len(slots)} city shards")
+
+    bundle = build_bm25_from_dataframe(df)
+    compare(
+        "bm25", BM25Engine(bundle=bundle),
+        {city: BM25Engine(bundle=shard_bm25_bundle(bundle, s)) for city, s in slots.items()},
+        queries, parsed_list, allowed_list,
+    )
+
+    if args.semantic:
+        from src.pipeline.build_vectors import build_vectors_from_dataframe
+        from src.retrieval.semantic_engine import SemanticEngine
+
+        index, model = build_vectors_from_dataframe(df, ids=df.index.to_numpy())
+        xb = np.vstack([index.index.reconstruct(i) for i in range(index.ntotal)])
+        compare(
+            "semantic", SemanticEngine(index=index, model=model),
+            {city: SemanticEngine(index=shard_vector_index(xb[s], s), model=model) for city, s in slots.items()},
+            queries, parsed_list, allowed_list,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Time to first content of the assistant mode: blocking report vs streamed report, against a local fake OpenAI-compatible server.
+
+The fake server (tests/fake_llm.py) answers /v1/chat/completions after a configurable first-token delay and then emits the report
+one token at a time (SSE when stream=true, a single JSON body after the last token otherwise), so the numbers
+isolate how soon the UI has something to show, independent of any real model.
+
+Usage:
+    python benchmarks/bench_stream.py --listings 5000 --queries 5 --first-token-ms 800 --token-ms 20
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openai import OpenAI
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_batch_queries import saved_search_queries
+from src.agent.orchestrator import Orchestrator
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.pipeline.build_vectors import build_vectors_from_dataframe
+from src.pipeline.context import SessionDataContext
+from src.pipeline.corpus import build_corpus
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.retrieval.query_parser import QueryParser
+from tests.fake_llm import REPORT, fake_llm_server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--first-token-ms", type=float, default=800)
+    parser.add_argument("--token-ms", type=float, default=20)
+    args = parser.parse_args()
+    settings.report_cache_enabled = False  # 阻塞与流式都要真正调用 LLM，不能命中对方写入的报告缓存
+
+    df = preprocess_dataframe(generate_listings(n=args.listings)).reset_index(drop=True)
+    corpus = build_corpus(df)
+    index, model = build_vectors_from_dataframe(df, corpus=corpus)
+    context = SessionDataContext(
+        df=df, bm25_index=build_bm25_from_dataframe(df, corpus=corpus), vector_index={"index": index, "model": model}
+    )
+    orch = Orchestrator(bm25=None, semantic=None, parser=QueryParser(), ranker=Ranker())
+
+    tokens = [REPORT[i : i + 2] for i in range(0, len(REPORT), 2)]
+    server = fake_llm_server(tokens, args.first_token_ms / 1000, args.token_ms / 1000)
+    client = OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="fake", max_retries=0)
+    opts = {"df": df, "top_k": args.top_k, "context": context, "llm_client": client}
+    queries = saved_search_queries(args.queries, seed=11)
+    orch.run(queries[0], df, top_k=args.top_k, context=context)  # 预热 jieba 词典与模型
+
+    stats = {name: [] for name in ("retrieval", "blocking", "stream results", "stream first token", "stream done")}
+    for q in queries:
+        t0 = time.perf_counter()
+        orch.run(q, df, top_k=args.top_k, context=context)
+        stats["retrieval"].append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        expected = orch.run_assistant(q, **opts)
+        stats["blocking"].append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        first_token = None
+        for i, event in enumerate(orch.run_assistant_stream(q, **opts)):
+            if i == 0:
+                stats["stream results"].append(time.perf_counter() - t0)
+            if first_token is None and event["answer"]:
+                first_token = time.perf_counter() - t0
+        stats["stream first token"].append(first_token)
+        stats["stream done"].append(time.perf_counter() - t0)
+        assert event["answer"] == expected["answer"], q
+        pd.testing.assert_frame_equal(event["results"], expected["results"], check_exact=True, obj=q)
+    server.shutdown()
+
+    print(
+        f"{len(queries)} assistant queries over {len(df):,} listings; fake LLM: first token {args.first_token_ms:.0f}ms, "
+        f"{len(tokens)} tokens x {args.token_ms:.0f}ms; streamed answers and result tables identical to blocking"
+    )
+    print(f"{'':<20} {'p50':>8} {'max':>8}")
+    for name, values in stats.items():
+        print(f"{name:<20} {np.percentile(values, 50) * 1000:7.0f}ms {max(values) * 1000:7.0f}ms")
+    print("time to first content: blocking = 'blocking', streaming = 'stream results' (table) / 'stream first token'")
+
+
+if __name__ == "__main__":
+    main()
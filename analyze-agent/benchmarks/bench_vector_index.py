@@ -0,0 +1,103 @@
+"""Recall / latency / memory benchmark for the FAISS index types on synthetic corpora.
+
+Usage:
+    python benchmarks/bench_vector_index.py
+    python benchmarks/bench_vector_index.py --sizes 10000 100000 --dim 512 --queries 200 --k 20
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.pipeline.vector_index import INDEX_TYPES, build_faiss_index, describe_index, index_memory_bytes
+
+
+def synthetic_embeddings(n: int, dim: int, seed: int = 0, n_clusters: int = 200, chunk: int = 100_000) -> np.ndarray:
+    """生成带簇结构的归一化向量，模拟房源描述 embedding 的分布。"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype("float32")
+    out = np.empty((n, dim), dtype="float32")
+    for start in range(0, n, chunk):
+        stop = min(n, start + chunk)
+        assign = rng.integers(0, n_clusters, stop - start)
+        out[start:stop] = centers[assign] + 0.6 * rng.standard_normal((stop - start, dim)).astype("float32")
+    faiss.normalize_L2(out)
+    return out
+
+
+def _search_params(index: faiss.Index, k: int) -> faiss.SearchParameters | None:
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=max(index.hnsw.efSearch, k))
+    return None
+
+
+def bench_one(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    """逐条查询计时（模拟线上单请求），并与 Flat 结果对比计算 recall@k。"""
+    params = _search_params(index, k)
+    latencies = np.empty(len(queries))
+    hits = 0
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        _, idxs = index.search(queries[i : i + 1], k, params=params)
+        latencies[i] = time.perf_counter() - t0
+        hits += len(np.intersect1d(idxs[0], truth[i]))
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "memory_mb": index_memory_bytes(index) / 2**20,
+    }
+
+
+def run(sizes: list[int], dim: int, n_queries: int, k: int, index_types: list[str]) -> list[dict]:
+    rows = []
+    for n in sizes:
+        print(f"\n== corpus {n:,} x {dim} ==")
+        xb = synthetic_embeddings(n, dim, seed=n)
+        # 查询取自语料附近的扰动点，保证存在真实近邻
+        rng = np.random.default_rng(1)
+        queries = xb[rng.integers(0, n, n_queries)] + 0.05 * rng.standard_normal((n_queries, dim)).astype("float32")
+        faiss.normalize_L2(queries)
+
+        flat = build_faiss_index(xb, "flat")
+        _, truth = flat.search(queries, k)
+        for kind in index_types:
+            t0 = time.perf_counter()
+            index = flat if kind == "flat" else build_faiss_index(xb, kind)
+            build_s = 0.0 if kind == "flat" else time.perf_counter() - t0
+            stats = bench_one(index, queries, truth, k)
+            row = {"n": n, "index": describe_index(index)["index_type"], "build_s": build_s, **stats}
+            rows.append(row)
+            print(
+                f"{row['index']:<9} recall@{k}={row['recall']:.3f}  p50={row['p50_ms']:.2f}ms  "
+                f"p99={row['p99_ms']:.2f}ms  mem={row['memory_mb']:.1f}MB  build={row['build_s']:.1f}s"
+            )
+            del index
+        del flat, xb
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=512, help="bge-small-zh 输出维度为 512")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--index-types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    args = parser.parse_args()
+    run(args.sizes, args.dim, args.queries, args.k, args.index_types)
+
+
+if __name__ == "__main__":
+    main()
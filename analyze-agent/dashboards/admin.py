@@ -9,6 +9,7 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from src.config import settings
+from src.retrieval.listing_dataset import ListingDataset
 
 
 def load_data(path: Path = settings.paths.processed_parquet) -> pd.DataFrame:
@@ -16,29 +17,45 @@ def load_data(path: Path = settings.paths.processed_parquet) -> pd.DataFrame:
     return pd.read_parquet(path) if path.exists() else pd.DataFrame()
 
 
+@st.cache_resource
+def load_dataset() -> ListingDataset | None:
+    """分区数据集可用时按筛选条件下推读取，不再把全量数据读入每个会话。"""
+    return ListingDataset.load() if settings.data_access == "dataset" else None
+
+
 def main():
     st.set_page_config(page_title="Listing Admin", layout="wide")
     st.title("Listing Admin Dashboard")
 
-    df = load_data()
-    if df.empty:
+    dataset = load_dataset()
+    df = load_data() if dataset is None else None
+    if df is not None and df.empty:
         st.warning("No data found. Please run preprocessing pipeline first.")
         return
 
     with st.sidebar:
         st.header("Filters")
-        cities = st.multiselect("城市", sorted(df["city"].dropna().unique()))
-        districts = st.multiselect("城区", sorted(df["district"].dropna().unique()))
-        max_price_default = int(df["total_price"].max() or 1000)
+        if dataset is not None:
+            city_options, district_options = dataset.partition_values("city"), dataset.partition_values("district")
+            price_max = dataset.column_max("total_price")
+        else:
+            city_options, district_options = sorted(df["city"].dropna().unique()), sorted(df["district"].dropna().unique())
+            price_max = df["total_price"].max()
+        cities = st.multiselect("城市", city_options)
+        districts = st.multiselect("城区", district_options)
+        max_price_default = int(price_max or 1000)
         min_price, max_price = st.slider("总价区间(万)", 0, max_price_default, (0, max_price_default))
 
-    mask = pd.Series(True, index=df.index)
-    if cities:
-        mask &= df["city"].isin(cities)
-    if districts:
-        mask &= df["district"].isin(districts)
-    mask &= df["total_price"].between(min_price, max_price)
-    filtered = df.loc[mask]
+    if dataset is not None:
+        filtered = dataset.read({"city": cities, "districts": districts, "min_price": min_price, "max_price": max_price})
+    else:
+        mask = pd.Series(True, index=df.index)
+        if cities:
+            mask &= df["city"].isin(cities)
+        if districts:
+            mask &= df["district"].isin(districts)
+        mask &= df["total_price"].between(min_price, max_price)
+        filtered = df.loc[mask]
 
     st.subheader(f"数据概览（{len(filtered)} 条）")
     st.dataframe(filtered.head(200))
@@ -1,55 +1,100 @@
 """LLM answer generation (report-style)."""
 from __future__ import annotations
 
-import json
-import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 import pandas as pd
 
+from src.agent.llm_client import LLMClient, as_llm_client
+from src.agent.prompt_builder import BuiltPrompt, build_prompt, compact_summary, count_tokens
+from src.agent.report_cache import ReportCache, report_cache
 from src.config import settings
 
-try:
-    from openai import OpenAI  # type: ignore
-except Exception:  # pragma: no cover
-    OpenAI = None  # noqa: N816
+# 模板位于仓库根目录下的 prompts/answer_template.md
+TEMPLATE_PATH = Path(__file__).resolve().parents[2] / "prompts" / "answer_template.md"
+EMPTY_REPORT = "当前条件下没有找到合适的房源，请尝试放宽预算/面积/地段等。"
+SYSTEM_PROMPT = (
+    "你是一名购房分析助手，基于提供的数据输出客观、贴心的建议。"
+    "突出房源特点（如学区、地铁距离、总价/单价、面积、性价比），"
+    "给出简洁、可行动的推荐理由。"
+)
+
+
+@dataclass
+class GeneratedReport:
+    """一次报告生成的结果。source：llm / cache / fallback（LLM 调用失败回退本地模板）/ local（无 LLM 或模板）/ empty（无房源）。"""
+
+    text: str
+    source: str
+    prompt_tokens: int = 0  # 输入 token 数（含 system prompt），调用了 LLM 时记录
+    completion_tokens: int = 0  # 报告 token 数，仅 source 为 llm 时记录
+    seconds: float = 0.0
+    tokens_exact: bool = False  # True：token 数取自服务端返回的 usage；False：按 tokenizer 计算或估算
 
 
 class AnswerGenerator:
     """生成分析报告的回答器，支持 LLM 与本地回退模板。"""
 
-    def __init__(self, llm_client: Any | None = None) -> None:
-        # 如未显式传入 client，尝试读取环境变量构建 OpenAI 客户端
-        self.llm_client = llm_client or self._build_default_client()
-        self.template = self._load_template()
+    def __init__(self, llm_client: Any | None = None, cache: ReportCache | None = None) -> None:
+        # 未显式传入 client 时使用进程共享的 LLMClient（连接池、超时、重试与并发上限），未配置 API key 时为 None
+        self.llm_client: LLMClient | None = as_llm_client(llm_client)
+        self.template = load_template()
+        # 缺省使用进程共享的报告缓存（settings.report_cache_enabled 关闭时不缓存）
+        self.cache = cache if cache is not None else (report_cache if settings.report_cache_enabled else None)
+
+    def _render_prompt(
+        self, user_query: str, user_filter: Dict[str, Any], summary_stats: Dict[str, Any], listings: pd.DataFrame
+    ) -> BuiltPrompt:
+        """按 settings.llm_prompt_max_tokens 预算渲染 prompt，并记录本次请求的输入 token 数。"""
+        built = build_prompt(self.template, user_query, user_filter, summary_stats, listings, system_prompt=SYSTEM_PROMPT)
+        print(f"[LLM] prompt {built.describe()} (budget {settings.llm_prompt_max_tokens})")
+        return built
+
+    def _chat_request(self, prompt: str) -> Dict[str, Any]:
+        """chat.completions.create 的请求参数，阻塞与流式调用共用。"""
+        return {
+            "model": settings.llm_model,
+            "messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "presence_penalty": 0.2,
+            "frequency_penalty": 0.2,
+        }
+
+    def _cache_lookup(
+        self, user_query: str, user_filter: Dict[str, Any], listings: pd.DataFrame, summary_stats: Dict[str, Any]
+    ) -> tuple[str | None, str | None]:
+        """返回 (结果键, 缓存的报告)；未启用缓存时均为 None。只缓存 LLM 成功生成的报告，回退模板不入缓存。"""
+        if self.cache is None or "id" not in listings.columns:
+            return None, None
+        # 统计摘要取 prompt 中实际使用的紧凑形式（不含内嵌的解析条件与原始问题，条件另由条件键区分）
+        prompt_config = [self.template, self._chat_request(""), settings.llm_prompt_max_tokens, settings.llm_prompt_max_rows]
+        key = ReportCache.result_key(listings["id"].tolist(), compact_summary(summary_stats), prompt_config)
+        return key, self.cache.get(key, user_filter, user_query)
 
-    def _build_default_client(self):
-        api_key = settings.llm_api_key or os.getenv(settings.llm_api_key_env)
-        if api_key and OpenAI is not None:
-            return OpenAI(api_key=api_key)
+    def _store(self, cache_key: str | None, user_query: str, user_filter: Dict[str, Any], report: str, t0: float) -> None:
+        if cache_key is not None and report:
+            self.cache.put(cache_key, user_filter, user_query, report, time.perf_counter() - t0)
+
+    def _local_report(self, user_query: str, listings: pd.DataFrame, formatted_summary: Dict[str, Any]) -> str | None:
+        """不需要调用 LLM 时直接给出的报告（无结果、无 LLM 或无模板）；需要调用 LLM 时返回 None。"""
+        if listings.empty:
+            return EMPTY_REPORT
+        if self.llm_client is None or not self.template:
+            return self._fallback_prefix() + self._fallback_report(user_query, listings, formatted_summary)
         return None
 
-    def _load_template(self) -> str:
-        # 模板位于仓库根目录下的 prompts/answer_template.md
-        tmpl_path = Path(__file__).resolve().parents[2] / "prompts" / "answer_template.md"
-        if tmpl_path.exists():
-            return tmpl_path.read_text(encoding="utf-8")
+    def _fallback_prefix(self) -> str:
+        if self.llm_client is None:
+            return "(未检测到 OPENAI_API_KEY，使用本地模板生成简报)\n"
+        if not self.template:
+            return "(未找到回答模板，使用本地简报)\n"
         return ""
 
-    def _format_table(self, df: pd.DataFrame, max_rows: int = 5) -> str:
-        cols = ["id", "city", "district", "community", "layout", "total_price", "area", "unit_price"]
-        df = df[cols] if not df.empty else df
-        return df.head(max_rows).to_json(force_ascii=False, orient="records")
-
-    def _render_prompt(self, user_query: str, user_filter: Dict[str, Any], summary_stats: Dict[str, Any], listings: pd.DataFrame) -> str:
-        return self.template.format(
-            user_query=user_query,
-            user_filter_json=json.dumps(user_filter, ensure_ascii=False),
-            summary_stats_json=json.dumps(summary_stats, ensure_ascii=False),
-            top_listings_table=self._format_table(listings),
-        )
-
     def generate_report(
         self,
         user_query: str,
@@ -57,44 +102,112 @@ class AnswerGenerator:
         listings: pd.DataFrame,
         summary_stats: Dict[str, Any],
     ) -> str:
-        """生成结构化的报告；支持 LLM 或本地模板回退。"""
-        if listings.empty:
-            return "当前条件下没有找到合适的房源，请尝试放宽预算/面积/地段等。"
+        """生成结构化的报告；支持 LLM 或本地模板回退（调用失败或超过 settings.llm_timeout_seconds 时回退）。"""
+        formatted_summary = self._format_summary(summary_stats or {})
+        local = self._local_report(user_query, listings, formatted_summary)
+        if local is not None:
+            return local
 
-        formatted_summary = self._format_summary(summary_stats)
+        cache_key, cached = self._cache_lookup(user_query, user_filter, listings, formatted_summary)
+        if cached is not None:
+            return cached
+        prompt = self._render_prompt(user_query, user_filter, formatted_summary, listings).text
+        try:
+            print(f"[LLM] calling {settings.llm_model} via OpenAI client...")
+            t0 = time.perf_counter()
+            report = self.llm_client.complete(self._chat_request(prompt)).strip()
+            self._store(cache_key, user_query, user_filter, report, t0)
+            return report
+        except Exception as exc:  # pragma: no cover - LLM 调用失败时回退
+            return f"(LLM 调用失败，使用本地模板。原因: {exc})\n" + self._fallback_report(user_query, listings, formatted_summary)
 
-        if self.llm_client is not None and self.template:
-            prompt = self._render_prompt(user_query, user_filter, formatted_summary, listings)
-            try:
-                print(f"[LLM] calling {settings.llm_model} via OpenAI client...")
-                resp = self.llm_client.chat.completions.create(
-                    model=settings.llm_model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": (
-                                "你是一名购房分析助手，基于提供的数据输出客观、贴心的建议。"
-                                "突出房源特点（如学区、地铁距离、总价/单价、面积、性价比），"
-                                "给出简洁、可行动的推荐理由。"
-                            ),
-                        },
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.7,
-                    top_p=0.9,
-                    presence_penalty=0.2,
-                    frequency_penalty=0.2,
-                )
-                return resp.choices[0].message.content.strip()
-            except Exception as exc:  # pragma: no cover - LLM 调用失败时回退
-                return f"(LLM 调用失败，使用本地模板。原因: {exc})\n" + self._fallback_report(user_query, listings, formatted_summary)
-
-        prefix = ""
-        if self.llm_client is None:
-            prefix = "(未检测到 OPENAI_API_KEY，使用本地模板生成简报)\n"
-        elif not self.template:
-            prefix = "(未找到回答模板，使用本地简报)\n"
-        return prefix + self._fallback_report(user_query, listings, formatted_summary)
+    async def agenerate_report(
+        self,
+        user_query: str,
+        user_filter: Dict[str, Any],
+        listings: pd.DataFrame,
+        summary_stats: Dict[str, Any],
+    ) -> str:
+        """generate_report 的异步版本（LLMClient.areply），供批量离线生成在单线程内并发调用。"""
+        return (await self.agenerate(user_query, user_filter, listings, summary_stats)).text
+
+    async def agenerate(
+        self,
+        user_query: str,
+        user_filter: Dict[str, Any],
+        listings: pd.DataFrame,
+        summary_stats: Dict[str, Any],
+    ) -> GeneratedReport:
+        """同 agenerate_report，另返回报告来源、输入/输出 token 数与生成耗时，供批量任务统计吞吐与成本。
+
+        token 数优先取服务端返回的 usage；服务端未返回时输入按 prompt 计数、输出按 tokenizer 计算（tokens_exact 为 False）。
+        """
+        formatted_summary = self._format_summary(summary_stats or {})
+        local = self._local_report(user_query, listings, formatted_summary)
+        if local is not None:
+            return GeneratedReport(local, "empty" if listings.empty else "local")
+
+        t0 = time.perf_counter()
+        cache_key, cached = self._cache_lookup(user_query, user_filter, listings, formatted_summary)
+        if cached is not None:
+            return GeneratedReport(cached, "cache", seconds=time.perf_counter() - t0)
+        built = self._render_prompt(user_query, user_filter, formatted_summary, listings)
+        try:
+            reply = await self.llm_client.areply(self._chat_request(built.text))
+            report = reply.text.strip()
+            self._store(cache_key, user_query, user_filter, report, t0)
+            exact = reply.prompt_tokens is not None and reply.completion_tokens is not None
+            return GeneratedReport(
+                report,
+                "llm",
+                reply.prompt_tokens if exact else built.tokens,
+                reply.completion_tokens if exact else count_tokens(report),
+                time.perf_counter() - t0,
+                tokens_exact=exact,
+            )
+        except Exception as exc:  # pragma: no cover - LLM 调用失败时回退
+            report = f"(LLM 调用失败，使用本地模板。原因: {exc})\n" + self._fallback_report(user_query, listings, formatted_summary)
+            return GeneratedReport(report, "fallback", built.tokens, seconds=time.perf_counter() - t0)
+
+    def stream_report(
+        self,
+        user_query: str,
+        user_filter: Dict[str, Any],
+        listings: pd.DataFrame,
+        summary_stats: Dict[str, Any],
+    ) -> Iterator[str]:
+        """generate_report 的流式版本：逐段产出 LLM 返回的增量文本，拼接后即完整报告。
+
+        命中报告缓存或无 LLM 时一次性产出整份报告；调用失败时回退到本地模板，已输出部分之后再追加中断说明。
+        完整收到的报告写入缓存，与 generate_report 共用。
+        """
+        formatted_summary = self._format_summary(summary_stats or {})
+        local = self._local_report(user_query, listings, formatted_summary)
+        if local is not None:
+            yield local
+            return
+
+        cache_key, cached = self._cache_lookup(user_query, user_filter, listings, formatted_summary)
+        if cached is not None:
+            yield cached
+            return
+        prompt = self._render_prompt(user_query, user_filter, formatted_summary, listings).text
+        parts: List[str] = []
+        started = False
+        try:
+            print(f"[LLM] streaming {settings.llm_model} via OpenAI client...")
+            t0 = time.perf_counter()
+            for delta in self.llm_client.stream(self._chat_request(prompt)):
+                if not started:
+                    delta = delta.lstrip()  # 与 generate_report 的 strip 一致，去掉开头空白
+                if delta:
+                    started = True
+                    parts.append(delta)
+                    yield delta
+            self._store(cache_key, user_query, user_filter, "".join(parts).strip(), t0)
+        except Exception as exc:  # pragma: no cover - LLM 调用失败时回退
+            reason = f"LLM 输出中断，以下为本地模板简报。原因: {exc}" if started else f"LLM 调用失败，使用本地模板。原因: {exc}"
+            yield ("\n\n" if started else "") + f"({reason})\n" + self._fallback_report(user_query, listings, formatted_summary)
 
     def _format_summary(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """数值字段做一位小数的格式化，便于阅读。"""
@@ -167,3 +280,17 @@ class AnswerGenerator:
             )
         lines.append("(提示：可接入 LLM 生成更丰富的解释。)")
         return "\n".join(lines)
+
+
+@lru_cache(maxsize=4)
+def _read_template(path: str, mtime_ns: int) -> str:
+    return Path(path).read_text(encoding="utf-8")
+
+
+def load_template(path: Path = TEMPLATE_PATH) -> str:
+    """读取回答模板；按 (路径, 修改时间) 缓存，每次请求只做一次 stat，模板文件改动后自动重新读取。不存在时返回空串。"""
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return ""
+    return _read_template(str(path), mtime_ns)
@@ -0,0 +1,407 @@
+"""Offline batch generation of assistant reports: batched retrieval, rate-limited async LLM fan-out, resumable output."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.agent.answer_generator import AnswerGenerator, GeneratedReport
+from src.agent.llm_client import LLMClient
+from src.analytics.summary import summarize_listings
+from src.config import settings
+from src.pipeline.compact import compact_listings
+from src.pipeline.context import SessionDataContext
+from src.retrieval.filter_index import FilterIndex
+
+if TYPE_CHECKING:  # 检索层依赖 embedding 模型，只在 CLI 中实际导入
+    from src.agent.orchestrator import Orchestrator, RowFetcher
+
+CONDITIONS_ONLY_QUERY = "（按结构化条件生成的批量报告）"  # 只给条件、没有原始问题的条目在 prompt 中使用的问题文本
+RETRY_SOURCES = ("fallback",)  # 续跑时重新生成的报告来源（LLM 调用失败回退的本地简报）
+
+
+@dataclass
+class BatchItem:
+    """一条批量任务：query 与 conditions 至少给一个；conditions 给出时直接作为解析条件，不再解析 query。"""
+
+    id: str
+    query: str = ""
+    conditions: Dict[str, Any] | None = None
+
+
+def _item_id(query: str, conditions: Dict[str, Any] | None) -> str:
+    payload = json.dumps([query, conditions], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def read_items(path: Path) -> List[BatchItem]:
+    """读取任务文件：.txt 每行一个问题；.jsonl 每行一个问题字符串或 {"id", "query", "conditions"} 对象。
+
+    未给 id 时按 (query, conditions) 内容生成稳定 id，重复条目只保留第一条。
+    """
+    items: Dict[str, BatchItem] = {}
+    with open(path, encoding="utf-8-sig") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if path.suffix == ".jsonl":
+                obj = json.loads(line)
+                obj = {"query": obj} if isinstance(obj, str) else obj
+            else:
+                obj = {"query": line}
+            query, conditions = str(obj.get("query") or ""), obj.get("conditions")
+            if not query and not conditions:
+                raise ValueError(f"{path}:{line_no}: item needs a query or conditions")
+            item_id = str(obj.get("id") or _item_id(query, conditions))
+            items.setdefault(item_id, BatchItem(item_id, query, conditions))
+    return list(items.values())
+
+
+class ReportSink:
+    """增量写出报告记录，同时作为断点：已写出的记录即已完成的条目。
+
+    - .jsonl：每条记录生成后立即追加一行并 flush，每 flush_every 条 fsync 一次；续跑时截掉崩溃留下的半行；
+    - 其他路径视为目录：每 flush_every 条写一个 parquet 分片（先写临时文件再原子改名），崩溃最多丢失未落盘的一批。
+    同一 id 出现多条记录时以最后一条为准（续跑重新生成的回退报告会追加新记录）。
+    """
+
+    def __init__(self, path: Path, flush_every: int = 100) -> None:
+        self.path = path
+        self.flush_every = max(flush_every, 1)
+        self.jsonl = path.suffix == ".jsonl"
+        self._buffer: List[Dict[str, Any]] = []
+        self._file = None
+        self._parts: int | None = None  # 下一个 parquet 分片的编号，首次 load/flush 时按已有分片确定
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """已写出的记录（id → 最后一条记录）。"""
+        if self.jsonl:
+            return {r["id"]: r for r in self._load_jsonl()}
+        parts = self._part_files()
+        self._parts = self._next_part(parts)
+        if not parts:
+            return {}
+        df = pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+        return {r["id"]: r for r in df.to_dict(orient="records")}
+
+    def _part_files(self) -> List[Path]:
+        return sorted(self.path.glob("part-*.parquet")) if self.path.is_dir() else []
+
+    @staticmethod
+    def _next_part(parts: Sequence[Path]) -> int:
+        """已有分片的最大编号 + 1（编号可能不连续，按个数计会覆盖已有分片）。"""
+        numbers = [int(p.stem.split("-", 1)[1]) for p in parts if p.stem.split("-", 1)[1].isdigit()]
+        return max(numbers) + 1 if numbers else 0
+
+    def _load_jsonl(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        data = self.path.read_bytes()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):  # 写到一半时崩溃的最后一行
+            print(f"[batch] dropping truncated last record in {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        return [json.loads(line) for line in data[:end].decode("utf-8").splitlines() if line.strip()]
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.jsonl:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+        self._buffer.append(record)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """把缓冲的记录落盘：jsonl 做 fsync，目录模式写出一个 parquet 分片。"""
+        if not self._buffer:
+            return
+        if self.jsonl:
+            os.fsync(self._file.fileno())
+        else:
+            self.path.mkdir(parents=True, exist_ok=True)
+            df = pd.DataFrame(self._buffer)
+            for col in ("conditions", "listing_ids"):  # 嵌套字段以 JSON 文本存储，分片之间 schema 一致
+                df[col] = df[col].map(lambda v: json.dumps(v, ensure_ascii=False, default=str))
+            if self._parts is None:
+                self._parts = self._next_part(self._part_files())
+            target = self.path / f"part-{self._parts:05d}.parquet"
+            tmp = target.with_suffix(".tmp")
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, target)
+            self._parts += 1
+        self._buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class RateLimiter:
+    """按固定间隔放行：平均每秒不超过 rate 次（rate <= 0 不限速）。"""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+@dataclass
+class BatchStats:
+    """本次运行的吞吐与成本统计；tokens_exact 为 False 时至少有一条报告的 token 数未取自服务端 usage（为计算或估算值）。"""
+
+    items: int = 0
+    skipped: int = 0  # 断点中已完成、本次跳过的条目
+    sources: Dict[str, int] = field(default_factory=dict)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    retrieval_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+    tokens_exact: bool = True
+    llm_latencies: List[float] = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def add(self, report: GeneratedReport, input_price: float, output_price: float) -> None:
+        self.items += 1
+        self.sources[report.source] = self.sources.get(report.source, 0) + 1
+        if report.source in ("llm", "fallback"):
+            self.llm_latencies.append(report.seconds)
+        if report.source == "llm":
+            self.prompt_tokens += report.prompt_tokens
+            self.completion_tokens += report.completion_tokens
+            self.tokens_exact = self.tokens_exact and report.tokens_exact
+            self.cost += (report.prompt_tokens * input_price + report.completion_tokens * output_price) / 1e6
+
+    def summary(self) -> str:
+        lat = np.asarray(self.llm_latencies) if self.llm_latencies else np.zeros(1)
+        sources = ", ".join(f"{k} {v}" for k, v in sorted(self.sources.items()))
+        return (
+            f"{self.items} reports in {self.elapsed_seconds:.1f}s ({self.throughput:.1f}/s), {self.skipped} skipped from checkpoint; "
+            f"sources: {sources or '-'}; retrieval {self.retrieval_seconds:.1f}s; "
+            f"LLM latency p50 {np.percentile(lat, 50):.2f}s p95 {np.percentile(lat, 95):.2f}s; "
+            f"tokens in {self.prompt_tokens:,} out {self.completion_tokens:,}{'' if self.tokens_exact else ' (est.)'}, "
+            f"est. cost ${self.cost:.4f}"
+        )
+
+
+def _record(item: BatchItem, parsed: Dict[str, Any], ranked: pd.DataFrame, report: GeneratedReport) -> Dict[str, Any]:
+    return {
+        "id": item.id,
+        "query": item.query,
+        "conditions": {k: v for k, v in parsed.items() if k != "raw"},
+        "listing_ids": ranked["id"].astype(str).tolist() if "id" in ranked.columns else [],
+        "report": report.text,
+        "source": report.source,
+        "prompt_tokens": report.prompt_tokens,
+        "completion_tokens": report.completion_tokens,
+        "tokens_exact": report.tokens_exact,
+        "seconds": round(report.seconds, 3),
+        "model": settings.llm_model,
+        "created": time.time(),
+    }
+
+
+def _retrieve(
+    orch: Orchestrator,
+    items: Sequence[BatchItem],
+    df: pd.DataFrame,
+    top_k: int,
+    use_semantic: bool,
+    context: SessionDataContext | None,
+    fetch_rows: RowFetcher | None,
+) -> List[Dict[str, Any]]:
+    """一批条目的检索结果（顺序同 items）：有问题文本的走 BM25/语义批量检索，只有条件的只做过滤与质量排序。"""
+    out: List[Dict[str, Any] | None] = [None] * len(items)
+    groups = {
+        True: [i for i, it in enumerate(items) if it.query],
+        False: [i for i, it in enumerate(items) if not it.query],
+    }
+    for has_query, idx in groups.items():
+        if not idx:
+            continue
+        results = orch.run_batch(
+            [items[i].query for i in idx],
+            df,
+            top_k=top_k,
+            conditions=[items[i].conditions for i in idx],
+            use_bm25=has_query,
+            use_semantic=has_query and use_semantic,
+            context=context,
+            fetch_rows=fetch_rows,
+        )
+        for i, result in zip(idx, results):
+            out[i] = result
+    return out
+
+
+async def run_batch_reports(
+    items: Sequence[BatchItem],
+    sink: ReportSink,
+    orch: Orchestrator,
+    df: pd.DataFrame,
+    generator: AnswerGenerator,
+    top_k: int = 10,
+    concurrency: int = 8,
+    rate: float = 0.0,
+    chunk_size: int = 256,
+    use_semantic: bool = True,
+    context: SessionDataContext | None = None,
+    fetch_rows: RowFetcher | None = None,
+    input_price: float = 0.0,
+    output_price: float = 0.0,
+) -> BatchStats:
+    """批量生成报告：断点中已完成的条目跳过，其余按 chunk_size 分批检索，每批的报告生成以 asyncio 并发
+    （同时最多 concurrency 个、平均每秒最多 rate 个），每完成一条立即写入 sink。
+
+    检索在工作线程中执行，与上一批的 LLM 调用重叠；未完成的生成任务不超过一批，内存占用与任务总数无关。
+    """
+    t_start = time.perf_counter()
+    stats = BatchStats()
+    done = {rid for rid, r in sink.load().items() if r.get("source") not in RETRY_SOURCES}
+    pending = [it for it in items if it.id not in done]
+    stats.skipped = len(items) - len(pending)
+    if stats.skipped:
+        print(f"[batch] resuming: {stats.skipped} of {len(items)} items already done")
+
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    limiter = RateLimiter(rate)
+    progress_every = max(len(pending) // 20, 1)
+
+    async def generate(item: BatchItem, result: Dict[str, Any]) -> None:
+        ranked, parsed = result["results"], result.get("parsed") or {}
+        summary = summarize_listings(ranked, parsed)
+        async with semaphore:
+            await limiter.acquire()
+            report = await generator.agenerate(item.query or CONDITIONS_ONLY_QUERY, parsed, ranked, summary)
+        sink.write(_record(item, parsed, ranked, report))
+        stats.add(report, input_price, output_price)
+        if stats.items % progress_every == 0 or stats.items == len(pending):
+            elapsed = time.perf_counter() - t_start
+            print(f"[batch] {stats.items}/{len(pending)} done, {stats.items / elapsed:.1f} reports/s")
+
+    tasks: set[asyncio.Task] = set()
+    try:
+        for start in range(0, len(pending), max(chunk_size, 1)):
+            chunk = pending[start : start + chunk_size]
+            t0 = time.perf_counter()
+            results = await asyncio.to_thread(_retrieve, orch, chunk, df, top_k, use_semantic, context, fetch_rows)
+            stats.retrieval_seconds += time.perf_counter() - t0
+            while len(tasks) > chunk_size:  # 上一批尚未发出的调用过多时先等待，避免任务无限堆积
+                finished, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                _raise_failed(finished)
+            tasks.update(asyncio.create_task(generate(item, result)) for item, result in zip(chunk, results))
+        while tasks:
+            finished, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            _raise_failed(finished)
+    finally:
+        for task in tasks:
+            task.cancel()
+        sink.close()
+    stats.elapsed_seconds = time.perf_counter() - t_start
+    return stats
+
+
+def _raise_failed(finished: set[asyncio.Task]) -> None:
+    for task in finished:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+
+def load_listings() -> pd.DataFrame:
+    """默认库全量表（批量任务一次检索多个城市/城区，不走按条件下推的分区读取）。"""
+    df = pd.read_parquet(settings.paths.processed_parquet)
+    df = compact_listings(df) if settings.compact_listings else df
+    if len(df) >= settings.filter_index_min_rows:
+        FilterIndex.for_frame(df)  # 整个任务期间常驻，每批过滤都走预建索引
+    return df
+
+
+def main() -> None:
+    """CLI 入口：对任务文件中的问题/条件批量生成报告。"""
+    from src.agent.orchestrator import Orchestrator
+
+    parser = argparse.ArgumentParser(description="Generate assistant reports for a file of queries or condition sets")
+    parser.add_argument("input", type=Path, help=".txt（每行一个问题）或 .jsonl（问题字符串或 {id, query, conditions}）")
+    parser.add_argument("output", type=Path, help=".jsonl 文件，或写 parquet 分片的目录；已有记录视为断点")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=settings.llm_max_concurrency, help="同时进行的 LLM 调用数")
+    parser.add_argument("--rate", type=float, default=0.0, help="平均每秒最多发起的报告生成数，0 不限速")
+    parser.add_argument("--chunk-size", type=int, default=256, help="每批检索的条目数")
+    parser.add_argument("--flush-every", type=int, default=100, help="每多少条记录落盘一次（fsync 或写一个 parquet 分片）")
+    parser.add_argument("--no-semantic", action="store_true", help="只用 BM25，不加载 embedding 模型")
+    parser.add_argument("--base-url", default=settings.llm_base_url, help="OpenAI 兼容服务地址（如本地模拟服务）")
+    parser.add_argument("--api-key", default=None, help=f"缺省读取 settings.llm_api_key 或 ${settings.llm_api_key_env}")
+    parser.add_argument("--timeout", type=float, default=settings.llm_timeout_seconds, help="单次报告生成的总时限（秒）")
+    parser.add_argument("--input-price", type=float, default=0.15, help="每百万输入 token 的价格（美元），用于成本估算")
+    parser.add_argument("--output-price", type=float, default=0.60, help="每百万输出 token 的价格（美元）")
+    parser.add_argument("--restart", action="store_true", help="忽略已有输出，从头生成")
+    args = parser.parse_args()
+
+    if args.restart and args.output.exists():
+        if args.output.is_dir():
+            for part in args.output.glob("part-*.parquet"):
+                part.unlink()
+        else:
+            args.output.unlink()
+    items = read_items(args.input)
+    api_key = args.api_key or settings.llm_api_key or os.getenv(settings.llm_api_key_env)
+    if api_key is None:
+        print(f"[batch] no API key ({settings.llm_api_key_env}), reports use the local template")
+        client = None
+    else:
+        client = LLMClient(api_key=api_key, base_url=args.base_url, timeout=args.timeout, max_concurrency=args.concurrency)
+    generator = AnswerGenerator(llm_client=client)
+    print(f"[batch] {len(items)} items from {args.input} -> {args.output}")
+
+    stats = asyncio.run(
+        run_batch_reports(
+            items,
+            ReportSink(args.output, args.flush_every),
+            Orchestrator.create(),
+            load_listings(),
+            generator,
+            top_k=args.top_k,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            chunk_size=args.chunk_size,
+            use_semantic=not args.no_semantic,
+            input_price=args.input_price,
+            output_price=args.output_price,
+        )
+    )
+    print(f"[batch] {stats.summary()}")
+    record = {k: round(v, 6) if isinstance(v, float) else v for k, v in asdict(stats).items() if k != "llm_latencies"}
+    print(json.dumps({**record, "throughput": round(stats.throughput, 3)}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Process-wide pooled LLM client: shared HTTP connection pool, per-call deadline, bounded retries and a concurrency cap."""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Awaitable, Dict, Iterator, TypeVar
+
+from src.config import settings
+
+try:
+    import httpx
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, OpenAI, RateLimitError
+except Exception:  # pragma: no cover
+    httpx = None
+    OpenAI = AsyncOpenAI = None  # noqa: N816
+
+_T = TypeVar("_T")
+
+if OpenAI is not None:
+    _RETRYABLE: tuple[type[BaseException], ...] = (APITimeoutError, APIConnectionError, RateLimitError, TimeoutError, ConnectionError)
+else:  # pragma: no cover
+    _RETRYABLE = (TimeoutError, ConnectionError)
+
+
+@dataclass
+class LLMReply:
+    """一次阻塞调用的回复；token 数取自服务端返回的 usage，未返回时为 None。"""
+
+    text: str
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+
+
+def _reply(resp: Any) -> LLMReply:
+    usage = getattr(resp, "usage", None)
+    return LLMReply(
+        resp.choices[0].message.content or "",
+        getattr(usage, "prompt_tokens", None),
+        getattr(usage, "completion_tokens", None),
+    )
+
+
+def _retryable(exc: BaseException) -> bool:
+    """超时、连接错误、限流与 5xx 可重试；其余（鉴权、参数错误等）直接失败。"""
+    if isinstance(exc, _RETRYABLE):
+        return True
+    return OpenAI is not None and isinstance(exc, APIStatusError) and exc.status_code >= 500
+
+
+class LLMClient:
+    """长生命周期的 chat.completions 调用层，供所有请求共用。
+
+    - 同步/异步各一个 OpenAI client，底层 httpx 连接池复用 keep-alive 连接，不再每次请求新建连接与 TLS 握手；
+    - 每次调用有总时限 deadline（含排队、重试与流式读取，流式读取到期时由计时器中断），超时抛 TimeoutError，由调用方回退本地模板；
+    - 超时、连接错误、限流与 5xx 按指数退避（带抖动）重试，最多 max_retries 次；流式调用只在收到首个 token 前重试；
+    - 信号量限制同时进行的调用数（同步、异步各一个，均为 max_concurrency），排队时间计入 deadline。
+
+    client 传入现成的 OpenAI 兼容同步 client（如基准中的本地服务）时直接使用，异步调用在线程中执行同步版本。
+    """
+
+    def __init__(
+        self,
+        client: Any | None = None,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        timeout: float | None = None,
+        max_retries: int | None = None,
+        max_concurrency: int | None = None,
+        backoff: float | None = None,
+    ) -> None:
+        self.timeout = timeout if timeout is not None else settings.llm_timeout_seconds
+        self.max_retries = max(max_retries if max_retries is not None else settings.llm_max_retries, 0)
+        self.max_concurrency = max(max_concurrency or settings.llm_max_concurrency, 1)
+        self.backoff = backoff if backoff is not None else settings.llm_retry_backoff_seconds
+        self._api_key = api_key
+        self._base_url = base_url
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._async: tuple[asyncio.AbstractEventLoop, Any, asyncio.Semaphore] | None = None  # 异步 client 与信号量绑定事件循环
+        self._owns_client = client is None
+        self.client = client if client is not None else self._build_client()
+
+    def _limits(self) -> "httpx.Limits":
+        return httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency,
+            keepalive_expiry=settings.llm_keepalive_seconds,
+        )
+
+    def _build_client(self) -> Any:
+        # SDK 自带的重试关闭，由本类统一按 deadline 重试
+        http_client = httpx.Client(limits=self._limits(), timeout=self.timeout)
+        return OpenAI(api_key=self._api_key, base_url=self._base_url, max_retries=0, http_client=http_client)
+
+    def _async_state(self) -> tuple[Any, asyncio.Semaphore] | None:
+        """当前事件循环上的 (异步 client, 信号量)；传入了现成同步 client 时返回 None。"""
+        if not self._owns_client:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._async is None or self._async[0] is not loop:
+            http_client = httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+            client = AsyncOpenAI(api_key=self._api_key, base_url=self._base_url, max_retries=0, http_client=http_client)
+            self._async = (loop, client, asyncio.Semaphore(self.max_concurrency))
+        return self._async[1], self._async[2]
+
+    def _deadline(self, timeout: float | None) -> float:
+        return time.monotonic() + (timeout if timeout is not None else self.timeout)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return self.backoff * 2**attempt * (0.5 + random.random() / 2)
+
+    def _should_retry(self, exc: BaseException, attempt: int, end: float) -> float | None:
+        """可重试且退避后仍在 deadline 内时返回退避秒数，否则返回 None。"""
+        if attempt >= self.max_retries or not _retryable(exc):
+            return None
+        delay = self._backoff_delay(attempt)
+        if time.monotonic() + delay >= end:
+            return None
+        print(f"[LLM] attempt {attempt + 1} failed ({type(exc).__name__}: {exc}), retrying in {delay:.2f}s")
+        return delay
+
+    def _acquire(self, end: float) -> None:
+        if not self._semaphore.acquire(timeout=max(end - time.monotonic(), 0.0)):
+            raise TimeoutError(f"LLM concurrency limit ({self.max_concurrency}) still full at deadline")
+
+    def complete(self, request: Dict[str, Any], timeout: float | None = None) -> str:
+        """阻塞调用，返回完整回复文本。"""
+        return self.reply(request, timeout).text
+
+    def reply(self, request: Dict[str, Any], timeout: float | None = None) -> LLMReply:
+        """同 complete，另带服务端返回的 token 用量。"""
+        end = self._deadline(timeout)
+        attempt = 0
+        while True:
+            self._acquire(end)
+            try:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("LLM deadline exceeded")
+                return _reply(self.client.chat.completions.create(timeout=remaining, **request))
+            except Exception as exc:
+                delay = self._should_retry(exc, attempt, end)
+                if delay is None:
+                    raise
+            finally:
+                self._semaphore.release()
+            time.sleep(delay)  # 退避期间不占用并发名额
+            attempt += 1
+
+    def stream(self, request: Dict[str, Any], timeout: float | None = None) -> Iterator[str]:
+        """流式调用，逐段产出增量文本；调用方提前停止迭代时释放连接与名额。
+
+        整个读取过程受同一 deadline 约束：到期时由计时器中断响应读取（即使服务端在两个分块之间停住），抛出 TimeoutError。
+        """
+        end = self._deadline(timeout)
+        attempt = 0
+        while True:
+            started = False
+            self._acquire(end)
+            try:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("LLM deadline exceeded")
+                stream = self.client.chat.completions.create(stream=True, timeout=remaining, **request)
+                expired = threading.Event()
+                timer = threading.Timer(max(end - time.monotonic(), 0.0), _abort_stream, args=(stream, expired))
+                timer.daemon = True
+                timer.start()
+                try:
+                    for chunk in stream:
+                        if expired.is_set():
+                            break
+                        delta = (chunk.choices[0].delta.content if chunk.choices else None) or ""
+                        if delta:
+                            started = True
+                            yield delta
+                except Exception:
+                    if not expired.is_set():
+                        raise
+                finally:
+                    timer.cancel()
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+                if expired.is_set():
+                    raise TimeoutError("LLM deadline exceeded while streaming")
+                return
+            except Exception as exc:
+                delay = None if started else self._should_retry(exc, attempt, end)
+                if delay is None:
+                    raise
+            finally:
+                self._semaphore.release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def acomplete(self, request: Dict[str, Any], timeout: float | None = None) -> str:
+        """异步版 complete：共享异步连接池与异步信号量，适合单线程内并发大量报告生成。"""
+        return (await self.areply(request, timeout)).text
+
+    async def areply(self, request: Dict[str, Any], timeout: float | None = None) -> LLMReply:
+        """异步版 reply。"""
+        state = self._async_state()
+        if state is None:
+            return await asyncio.to_thread(self.reply, request, timeout)
+        client, semaphore = state
+        end = self._deadline(timeout)
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=max(end - time.monotonic(), 0.0))
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"LLM concurrency limit ({self.max_concurrency}) still full at deadline") from None
+            try:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("LLM deadline exceeded")
+                return _reply(await _within(client.chat.completions.create(timeout=remaining, **request), remaining))
+            except Exception as exc:
+                delay = self._should_retry(exc, attempt, end)
+                if delay is None:
+                    raise
+            finally:
+                semaphore.release()
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")  # pragma: no cover
+
+
+def _abort_stream(stream: Any, expired: threading.Event) -> None:
+    """deadline 到期（计时器线程）：标记超时并中断读取线程。
+
+    对底层套接字 shutdown 可立即唤醒阻塞在 recv 上的读取；拿不到套接字（非 httpx 的 client）时直接关闭响应。
+    """
+    expired.set()
+    response = getattr(stream, "response", None)
+    network = getattr(response, "extensions", {}).get("network_stream") if response is not None else None
+    sock = network.get_extra_info("socket") if network is not None else None
+    try:
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+        elif hasattr(stream, "close"):
+            stream.close()
+    except Exception:  # 连接已关闭等
+        pass
+
+
+async def _within(awaitable: Awaitable[_T], seconds: float) -> _T:
+    try:
+        return await asyncio.wait_for(awaitable, timeout=seconds)
+    except asyncio.TimeoutError:
+        raise TimeoutError("LLM deadline exceeded") from None
+
+
+_default: LLMClient | None = None
+_default_lock = threading.Lock()
+_wrapped: "weakref.WeakKeyDictionary[Any, LLMClient]" = weakref.WeakKeyDictionary()
+
+
+def get_llm_client() -> LLMClient | None:
+    """进程共享的默认 LLMClient（按 settings 构建，首次调用时创建）；未配置 API key 或未安装 openai 时返回 None。"""
+    global _default
+    if _default is None:
+        api_key = settings.llm_api_key or os.getenv(settings.llm_api_key_env)
+        if not api_key or OpenAI is None:
+            return None
+        with _default_lock:
+            if _default is None:
+                _default = LLMClient(api_key=api_key, base_url=settings.llm_base_url)
+    return _default
+
+
+def as_llm_client(client: Any | None) -> LLMClient | None:
+    """None → 默认共享 client；LLMClient 原样返回；其他 OpenAI 兼容 client 包装一次并复用同一包装（共享并发上限）。"""
+    if client is None:
+        return get_llm_client()
+    if isinstance(client, LLMClient):
+        return client
+    try:
+        wrapped = _wrapped.get(client)
+        if wrapped is None:
+            wrapped = _wrapped[client] = LLMClient(client=client)
+        return wrapped
+    except TypeError:  # 不支持弱引用的对象
+        return LLMClient(client=client)
@@ -1,20 +1,32 @@
 ﻿"""Agent orchestrator."""
 from __future__ import annotations
 
+import time
+from concurrent.futures import Future
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
 
+import numpy as np
 import pandas as pd
 
 from src.config import settings
 from src.ranking.ranker import Ranker
+from src.ranking.scoring import QUALITY_INPUT_COLUMNS, SCORING_COLUMNS
 from src.retrieval.bm25_engine import BM25Engine
-from src.retrieval.filter_engine import apply_filters
+from src.retrieval.filter_engine import FILTER_COLUMNS, apply_filters
 from src.retrieval.query_parser import QueryParser
 from src.retrieval.semantic_engine import SemanticEngine
+from src.retrieval.shard_router import ShardRouter, ShardedEngine
 from src.analytics.summary import summarize_listings
 from src.agent.answer_generator import AnswerGenerator
 from src.pipeline.context import SessionDataContext
+from src.utils.concurrency import shared_executor
+
+# 过滤、检索与排序只用这些列的窄投影；长文本与展示列在取得 top-k 后才按行补齐
+RANK_COLUMNS = tuple(dict.fromkeys([*FILTER_COLUMNS, *SCORING_COLUMNS, *QUALITY_INPUT_COLUMNS]))
+# fetch_rows(槽位数组) → 以槽位为索引的完整行，用于补齐窄表中没有的列（如分区数据集的按行读取）
+RowFetcher = Callable[[np.ndarray], pd.DataFrame]
+NO_RESULTS_ANSWER = "当前条件下没有找到合适的房源，建议放宽预算/面积/地段后再试。"
 
 
 @dataclass
@@ -25,6 +37,7 @@ class Orchestrator:
     semantic: Optional[SemanticEngine]
     parser: QueryParser
     ranker: Ranker
+    router: Optional[ShardRouter] = None  # 默认库分片路由；None 时使用全局索引
 
     @classmethod
     def create(cls) -> "Orchestrator":
@@ -33,6 +46,7 @@ class Orchestrator:
             semantic=None,
             parser=QueryParser(),
             ranker=Ranker(),
+            router=ShardRouter.load() if settings.shard_key else None,
         )
 
     def _get_bm25(self) -> BM25Engine:
@@ -45,6 +59,37 @@ class Orchestrator:
             self.semantic = SemanticEngine()
         return self.semantic
 
+    def _bm25_engine(
+        self, context: SessionDataContext | None, parsed: Dict[str, Any] | None = None
+    ) -> BM25Engine | ShardedEngine:
+        """会话上传数据用会话索引，否则用默认库索引（配置了分片时只取 parsed 条件命中的分片）。"""
+        if context is None or context.bm25_index is None:
+            if self.router is not None:
+                return self.router.engine("bm25", self.router.route(parsed or {}))
+            return self._get_bm25()
+        return BM25Engine(bundle=context.bm25_index)
+
+    def _semantic_engine(
+        self, context: SessionDataContext | None, parsed: Dict[str, Any] | None = None
+    ) -> SemanticEngine | ShardedEngine:
+        """会话上传数据用会话向量索引，否则用默认库索引（配置了分片时只取 parsed 条件命中的分片）。"""
+        if context is None or context.vector_index is None:
+            if self.router is not None:
+                return self.router.engine("semantic", self.router.route(parsed or {}))
+            return self._get_semantic()
+        return SemanticEngine(index=context.vector_index.get("index"), model=context.vector_index.get("model"))
+
+    def _retrieval_engines(
+        self, use_bm25: bool, use_semantic: bool, context: SessionDataContext | None, parsed: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """按开关取本次请求的检索引擎；在调用线程完成懒加载，工作线程不会重复加载索引/模型。"""
+        engines: Dict[str, Any] = {}
+        if use_bm25:
+            engines["bm25"] = self._bm25_engine(context, parsed)
+        if use_semantic:
+            engines["semantic"] = self._semantic_engine(context, parsed)
+        return engines
+
     def run(
         self,
         user_query: str,
@@ -54,43 +99,114 @@ class Orchestrator:
         use_bm25: bool = True,
         use_semantic: bool = True,
         context: SessionDataContext | None = None,
+        fetch_rows: RowFetcher | None = None,
     ) -> Dict[str, Any]:
-        """端到端：解析/条件→过滤→检索→融合排序。"""
+        """端到端：解析/条件→过滤→检索→融合排序。
+
+        settings.retrieval_parallel 开启时过滤与各检索分支在共享线程池上并行，timings 记录各阶段耗时（毫秒）。
+        过滤与排序只在 RANK_COLUMNS 窄投影上进行，其余列只为返回的 top_k 行从 df（或 fetch_rows）补齐。
+        """
+        start = time.perf_counter()
         parsed = conditions or self.parser.parse(user_query)
-        filtered = apply_filters(df, parsed)
+        engines = self._retrieval_engines(use_bm25, use_semantic, context, parsed)
+        timings: Dict[str, float] = {}
+        retrieved = None
+        if engines and settings.retrieval_parallel:
+            retrieved = _retrieve_parallel(user_query, df, parsed, engines, top_k * 2, timings)
+        if retrieved is None:
+            retrieved = _retrieve_serial(user_query, df, parsed, engines, top_k * 2, timings)
+        filtered, hits = retrieved
 
         if filtered.empty:
-            return {"results": pd.DataFrame(), "parsed": parsed}
+            timings["total"] = _elapsed_ms(start)
+            return {"results": pd.DataFrame(), "parsed": parsed, "timings": timings}
 
-        if use_bm25:
-            bm25_engine = self._get_bm25() if context is None or context.bm25_index is None else BM25Engine(bundle=context.bm25_index)
-            filtered = bm25_engine.attach_scores(filtered, user_query, top_k=top_k * 2)
-        else:
-            filtered = filtered.copy()
-            filtered["bm25_score"] = 0.0
-        if use_semantic:
-            if context is not None and context.vector_index is not None:
-                idx = context.vector_index.get("index")
-                model = context.vector_index.get("model")
-                filtered = SemanticEngine(index=idx, model=model).attach_scores(filtered, user_query, top_k=top_k * 2)
-            else:
-                filtered = self._get_semantic().attach_scores(filtered, user_query, top_k=top_k * 2)
-        else:
-            filtered["semantic_score"] = 0.0
-
-        ranked = self.ranker.rank(filtered, top_k=top_k)
-        return {"results": ranked, "parsed": parsed}
+        t0 = time.perf_counter()
+        retrieval = {
+            "bm25_score": _hit_array(filtered.index, hits.get("bm25", [])),
+            "semantic_score": _hit_array(filtered.index, hits.get("semantic", [])),
+        }
+        ranked = _late_materialize(self.ranker.top(filtered, top_k=top_k, retrieval=retrieval), df, fetch_rows)
+        timings["rank"] = _elapsed_ms(t0)
+        timings["total"] = _elapsed_ms(start)
+        return {"results": ranked, "parsed": parsed, "timings": timings}
 
-    def run_assistant(
+    def run_batch(
         self,
-        user_query: str,
+        queries: Sequence[str],
         df: pd.DataFrame,
         top_k: int = 10,
-        conditions: Dict[str, Any] | None = None,
-        llm_client: Any | None = None,
+        conditions: Sequence[Dict[str, Any] | None] | None = None,
+        use_bm25: bool = True,
+        use_semantic: bool = True,
         context: SessionDataContext | None = None,
-    ) -> Dict[str, Any]:
-        """助手模式：检索→统计→生成分析报告。"""
+        fetch_rows: RowFetcher | None = None,
+    ) -> List[Dict[str, Any]]:
+        """批量版 run：逐条解析/过滤后，检索引擎按批执行（一次分词/编码，全库查询合并检索），再逐条融合排序。
+
+        返回与 queries 一一对应的结果列表，每项结构同 run。
+        """
+        conditions_list = list(conditions) if conditions is not None else [None] * len(queries)
+        parsed_list = [cond or self.parser.parse(query) for query, cond in zip(queries, conditions_list)]
+        filtered_list = [apply_filters(df, parsed, RANK_COLUMNS) for parsed in parsed_list]
+
+        active = [i for i, filtered in enumerate(filtered_list) if not filtered.empty]
+        active_queries = [queries[i] for i in active]
+        allowed_list = [filtered_list[i].index.to_numpy() for i in active]
+        bm25_hits = semantic_hits = None
+        active_parsed = [parsed_list[i] for i in active]
+        if use_bm25 and active:
+            bm25_hits = self._search_batch("bm25", context, active_parsed, active_queries, top_k * 2, allowed_list)
+        if use_semantic and active:
+            semantic_hits = self._search_batch("semantic", context, active_parsed, active_queries, top_k * 2, allowed_list)
+
+        outputs: List[Dict[str, Any]] = [{"results": pd.DataFrame(), "parsed": parsed} for parsed in parsed_list]
+        for j, i in enumerate(active):
+            filtered = filtered_list[i]
+            retrieval = {
+                "bm25_score": _hit_array(filtered.index, bm25_hits[j] if bm25_hits else []),
+                "semantic_score": _hit_array(filtered.index, semantic_hits[j] if semantic_hits else []),
+            }
+            ranked = _late_materialize(self.ranker.top(filtered, top_k=top_k, retrieval=retrieval), df, fetch_rows)
+            outputs[i] = {"results": ranked, "parsed": parsed_list[i]}
+        return outputs
+
+    def _search_batch(
+        self,
+        kind: str,
+        context: SessionDataContext | None,
+        parsed_list: Sequence[Dict[str, Any]],
+        queries: Sequence[str],
+        top_k: int,
+        allowed_list: Sequence[np.ndarray],
+    ) -> List[list[tuple[int, float]]]:
+        """批量检索；默认库配置了分片时按各条的路由结果分组，每组只查询其条件命中的分片（与 run 一致）。"""
+        get_engine = self._bm25_engine if kind == "bm25" else self._semantic_engine
+        own_index = context is not None and (context.bm25_index if kind == "bm25" else context.vector_index) is not None
+        groups: Dict[tuple, List[int]] = {}
+        for j, parsed in enumerate(parsed_list):
+            route = tuple(self.router.route(parsed)) if self.router is not None and not own_index else ()
+            groups.setdefault(route, []).append(j)
+        hits: List[list[tuple[int, float]]] = [[] for _ in queries]
+        for members in groups.values():
+            engine = get_engine(context, parsed_list[members[0]])
+            part = engine.search_batch(
+                [queries[j] for j in members], top_k=top_k, allowed_list=[allowed_list[j] for j in members]
+            )
+            for j, found in zip(members, part):
+                hits[j] = found
+        return hits
+
+    def _assistant_results(
+        self,
+        user_query: str,
+        df: pd.DataFrame,
+        top_k: int,
+        conditions: Dict[str, Any] | None,
+        context: SessionDataContext | None,
+        fetch_rows: RowFetcher | None,
+    ) -> tuple[pd.DataFrame, Dict[str, Any], Dict[str, Any] | None]:
+        """助手模式的检索与统计部分：返回 (排序结果, 解析条件, 统计摘要)，无结果时摘要为 None。"""
         result = self.run(
             user_query=user_query,
             df=df,
@@ -99,16 +215,170 @@ class Orchestrator:
             use_bm25=True,
             use_semantic=True,
             context=context,
+            fetch_rows=fetch_rows,
         )
-        ranked = result["results"]
-        if ranked.empty:
-            return {"answer": "当前条件下没有找到合适的房源，建议放宽预算/面积/地段后再试。", "results": ranked}
+        ranked, parsed = result["results"], result.get("parsed", {})
+        return ranked, parsed, None if ranked.empty else summarize_listings(ranked, parsed)
+
+    def run_assistant(
+        self,
+        user_query: str,
+        df: pd.DataFrame,
+        top_k: int = 10,
+        conditions: Dict[str, Any] | None = None,
+        llm_client: Any | None = None,
+        context: SessionDataContext | None = None,
+        fetch_rows: RowFetcher | None = None,
+    ) -> Dict[str, Any]:
+        """助手模式：检索→统计→生成分析报告。"""
+        ranked, parsed, summary = self._assistant_results(user_query, df, top_k, conditions, context, fetch_rows)
+        if summary is None:
+            return {"answer": NO_RESULTS_ANSWER, "results": ranked}
 
-        summary = summarize_listings(ranked, result.get("parsed", {}))
         answer = AnswerGenerator(llm_client=llm_client).generate_report(
             user_query=user_query,
-            user_filter=result.get("parsed", {}),
+            user_filter=parsed,
             listings=ranked,
             summary_stats=summary,
         )
         return {"answer": answer, "results": ranked, "summary": summary}
+
+    def run_assistant_stream(
+        self,
+        user_query: str,
+        df: pd.DataFrame,
+        top_k: int = 10,
+        conditions: Dict[str, Any] | None = None,
+        llm_client: Any | None = None,
+        context: SessionDataContext | None = None,
+        fetch_rows: RowFetcher | None = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """run_assistant 的流式版本：检索完成后先产出结果（answer 为空），之后每收到一段报告文本产出一次累计的 answer。
+
+        每次产出的字典与 run_assistant 的返回值同构，最后一次即完整结果。
+        """
+        ranked, parsed, summary = self._assistant_results(user_query, df, top_k, conditions, context, fetch_rows)
+        if summary is None:
+            yield {"answer": NO_RESULTS_ANSWER, "results": ranked}
+            return
+
+        out = {"answer": "", "results": ranked, "summary": summary}
+        yield out
+        answer = ""
+        for delta in AnswerGenerator(llm_client=llm_client).stream_report(
+            user_query=user_query,
+            user_filter=parsed,
+            listings=ranked,
+            summary_stats=summary,
+        ):
+            answer += delta
+            yield {**out, "answer": answer}
+
+
+def _hit_array(index: pd.Index, matches: list[tuple[int, float]]) -> np.ndarray:
+    """检索命中 (行号, 得分) 写入与候选行位置对齐的数组，未命中记 0。"""
+    scores = np.zeros(len(index))
+    if not matches:
+        return scores
+    hit = dict(matches)
+    positions = index.get_indexer(list(hit))
+    found = positions >= 0
+    scores[positions[found]] = np.fromiter(hit.values(), dtype="float64", count=len(hit))[found]
+    return np.where(np.isnan(scores), 0.0, scores)
+
+
+def _late_materialize(top: pd.DataFrame, source: pd.DataFrame, fetch_rows: RowFetcher | None) -> pd.DataFrame:
+    """为排好序的 top-k 窄表补齐其余列：先取 source 中的同标签行，再由 fetch_rows 补 source 也没有的列。
+
+    列顺序与完整表一致（source 或 fetch_rows 返回的列序），排序新增的得分列在后；排序重算过的列（如 quality_score）
+    保留新值。
+    """
+    rows = top.index
+    order = list(source.columns)
+    parts = [top]
+    rest = [c for c in source.columns if c not in top.columns]
+    if rest:
+        parts.append(source.loc[rows][rest])  # 先取 k 行再选列；loc[rows, rest] 会先复制整列
+    if fetch_rows is not None and len(rows):
+        fetched = fetch_rows(rows.to_numpy())
+        order = list(dict.fromkeys([*fetched.columns, *order]))
+        have = set(top.columns).union(rest)
+        missing = [c for c in fetched.columns if c not in have]
+        if missing:
+            parts.append(fetched.loc[rows, missing])
+    merged = pd.concat(parts, axis=1) if len(parts) > 1 else top
+    columns = [c for c in order if c in merged.columns]
+    placed = set(columns)
+    result = merged[columns + [c for c in merged.columns if c not in placed]].reset_index(drop=True)
+    result.attrs = dict(source.attrs)  # 如紧凑表的标签词表
+    return result
+
+
+def _elapsed_ms(t0: float) -> float:
+    return (time.perf_counter() - t0) * 1000
+
+
+def _retrieve_serial(
+    query: str, df: pd.DataFrame, parsed: Dict[str, Any], engines: Dict[str, Any], top_n: int, timings: Dict[str, float]
+) -> tuple[pd.DataFrame, Dict[str, list[tuple[int, float]]]]:
+    """串行路径：过滤 → 各检索分支依次在候选集内检索。"""
+    t0 = time.perf_counter()
+    filtered = apply_filters(df, parsed, RANK_COLUMNS)
+    timings["filter"] = _elapsed_ms(t0)
+    hits: Dict[str, list[tuple[int, float]]] = {}
+    if filtered.empty:
+        return filtered, hits
+    # 过滤结果的行号即索引中的文档位置，检索只在该候选集内进行
+    allowed = filtered.index.to_numpy()
+    for name, engine in engines.items():
+        t0 = time.perf_counter()
+        hits[name] = engine.search(query, top_k=top_n, allowed=allowed)
+        timings[name] = _elapsed_ms(t0)
+    return filtered, hits
+
+
+def _retrieve_parallel(
+    query: str, df: pd.DataFrame, parsed: Dict[str, Any], engines: Dict[str, Any], top_n: int, timings: Dict[str, float]
+) -> tuple[pd.DataFrame, Dict[str, list[tuple[int, float]]]] | None:
+    """并行路径：检索分支提交到共享线程池先做查询侧预处理（分词/编码），过滤在调用线程执行，
+    候选集就绪后各分支再检索。线程池不可用时返回 None，由调用方回退串行路径。
+
+    分支只等待调用线程产出的候选集，不等待池内其他任务，共享池满载时也不会互相阻塞死锁。
+    """
+    allowed_future: Future = Future()
+    futures: Dict[str, Future] = {}
+    try:
+        executor = shared_executor()
+        for name, engine in engines.items():
+            futures[name] = executor.submit(_run_branch, engine, query, top_n, allowed_future)
+    except RuntimeError:  # 线程池已关闭（进程退出中）
+        allowed_future.cancel()
+        return None
+
+    t0 = time.perf_counter()
+    try:
+        filtered = apply_filters(df, parsed, RANK_COLUMNS)
+    except BaseException as exc:
+        allowed_future.set_exception(exc)
+        raise
+    timings["filter"] = _elapsed_ms(t0)
+    allowed_future.set_result(filtered.index.to_numpy())
+    if filtered.empty:
+        return filtered, {}  # 分支拿到空候选集会立即返回，不再等待
+    hits: Dict[str, list[tuple[int, float]]] = {}
+    for name, future in futures.items():
+        hits[name], timings[name] = future.result()
+    return filtered, hits
+
+
+def _run_branch(
+    engine: Any, query: str, top_n: int, allowed_future: Future
+) -> tuple[list[tuple[int, float]], float]:
+    """单个检索分支：预处理 → 等待过滤候选集 → 候选集内检索，返回 (命中, 耗时毫秒)；计时不含等待过滤的时间。"""
+    t0 = time.perf_counter()
+    prepared = engine.prepare(query)
+    prepare_ms = _elapsed_ms(t0)
+    allowed = allowed_future.result()
+    t0 = time.perf_counter()
+    hits = engine.search_prepared(prepared, top_k=top_n, allowed=allowed)
+    return hits, prepare_ms + _elapsed_ms(t0)
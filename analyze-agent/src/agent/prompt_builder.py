@@ -0,0 +1,229 @@
+"""Token-budgeted prompt construction for assistant reports: compact inputs, token counting and priority trimming."""
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence
+
+import pandas as pd
+
+from src.config import settings
+
+try:
+    import tiktoken
+except Exception:  # pragma: no cover
+    tiktoken = None
+
+# 房源简表的列与表头，按展示顺序
+LISTING_COLUMNS = {
+    "id": "ID",
+    "city": "城市",
+    "district": "城区",
+    "community": "小区",
+    "layout": "户型",
+    "total_price": "总价万",
+    "area": "面积平",
+    "unit_price": "单价元",
+    "distance_to_subway": "地铁km",
+    "school_district": "学区",
+}
+_IGNORED_FILTER_KEYS = ("raw",)  # 原始问题已单独给出
+_IGNORED_SUMMARY_KEYS = ("user_filter",)  # 与解析条件重复
+
+# 超出预算时的裁剪顺序：("summary", 键) 删除统计字段，("column", 列) 删除简表列，("rows", n) 逐行删到剩 n 行。
+# 未列出的字段（用户问题与条件、数量/价格/单价/面积/通勤/学区的核心统计、ID/城市/城区/户型/总价）始终保留。
+TRIM_ORDER: tuple[tuple[str, Any], ...] = (
+    ("summary", "year_built_avg"),
+    ("summary", "price_median"),
+    ("summary", "area_min"),
+    ("summary", "area_max"),
+    ("column", "unit_price"),
+    ("column", "area"),
+    ("rows", 3),
+    ("summary", "distance_to_subway_min"),
+    ("summary", "year_built_min"),
+    ("summary", "year_built_max"),
+    ("summary", "bedrooms_distribution"),
+    ("column", "school_district"),
+    ("column", "distance_to_subway"),
+    ("column", "community"),
+    ("rows", 1),
+)
+_MESSAGE_OVERHEAD = 4  # chat 格式每条消息的额外 token（角色与分隔符）
+_REPLY_PRIMING = 3
+
+
+@dataclass
+class BuiltPrompt:
+    """渲染后的 user prompt 及其 token 统计；tokens 含 system prompt 与消息格式开销，即整个请求的输入 token 数。"""
+
+    text: str
+    tokens: int
+    rows: int
+    total_rows: int
+    columns: List[str]
+    dropped: List[str] = field(default_factory=list)
+    exact: bool = True  # False 表示 token 数为估算（未安装 tiktoken 或编码不可用）
+
+    def describe(self) -> str:
+        trimmed = f", trimmed {', '.join(self.dropped)}" if self.dropped else ""
+        return f"{self.tokens}{'' if self.exact else ' (est.)'} tokens, {self.rows}/{self.total_rows} listings{trimmed}"
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Any | None:
+    """模型对应的 tiktoken 编码；未知模型（如 OpenAI 兼容的第三方模型）用 o200k_base，不可用时返回 None。"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception as exc:  # 编码文件无法下载等
+        print(f"[prompt] tiktoken encoding for {model} unavailable ({type(exc).__name__}), estimating token counts")
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:
+        print(f"[prompt] tiktoken encoding o200k_base unavailable ({type(exc).__name__}), estimating token counts")
+        return None
+
+
+def _estimate_tokens(text: str) -> int:
+    """无 tokenizer 时的保守估算：中日韩字符各记 1 个 token，其余约 4 个字符 1 个 token。"""
+    cjk = sum(1 for ch in text if ch >= "\u2e80")
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """按 settings.llm_model（或指定模型）的 tokenizer 计算 token 数；tokenizer 不可用时估算。"""
+    enc = _encoding(model or settings.llm_model)
+    return len(enc.encode(text)) if enc is not None else _estimate_tokens(text)
+
+
+def count_message_tokens(messages: Sequence[Dict[str, str]], model: str | None = None) -> int:
+    """chat.completions 请求 messages 的输入 token 数（含每条消息的格式开销）。"""
+    return sum(count_tokens(m["content"], model) + _MESSAGE_OVERHEAD for m in messages) + _REPLY_PRIMING
+
+
+def tokens_exact(model: str | None = None) -> bool:
+    return _encoding(model or settings.llm_model) is not None
+
+
+def _compact_json(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _is_empty(value: Any) -> bool:
+    if isinstance(value, (list, tuple, dict, set)):
+        return not value
+    return value is None or value == "" or (pd.api.types.is_scalar(value) and bool(pd.isna(value)))
+
+
+def compact_filter(user_filter: Dict[str, Any]) -> Dict[str, Any]:
+    """解析条件中去掉原始文本与空值（None、空列表/空串）。"""
+    return {k: v for k, v in user_filter.items() if k not in _IGNORED_FILTER_KEYS and not _is_empty(v)}
+
+
+def compact_summary(summary_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """统计信息中去掉内嵌的解析条件与空值，浮点保留至多两位小数。"""
+    out: Dict[str, Any] = {}
+    for k, v in summary_stats.items():
+        if k in _IGNORED_SUMMARY_KEYS or _is_empty(v):
+            continue
+        if isinstance(v, dict):
+            v = {str(kk): vv for kk, vv in v.items()}
+        elif isinstance(v, float):
+            v = round(v, 2)
+        out[k] = v
+    return out
+
+
+def _cell(col: str, value: Any) -> str:
+    if _is_empty(value):
+        return ""
+    if isinstance(value, bool) or col == "school_district":
+        return "是" if bool(value) else "否"
+    if col == "unit_price":
+        return str(int(round(float(value))))
+    if isinstance(value, float):
+        value = round(value, 1)
+        return str(int(value)) if value.is_integer() else str(value)
+    return str(value).replace("|", "/")
+
+
+def format_listings(listings: pd.DataFrame, columns: Sequence[str], rows: int) -> str:
+    """房源简表的紧凑列式文本：首行列名、每行一套房源、竖线分隔；所有行取值相同的列提到“共同”行，只写一次。"""
+    cols = [c for c in columns if c in listings.columns]
+    if not cols or rows <= 0:
+        return "（无）"
+    cells = {c: [_cell(c, v) for v in listings[c].head(rows).tolist()] for c in cols}
+    shared = [c for c in cols if rows > 1 and c != "id" and len(set(cells[c])) == 1 and cells[c][0]]
+    varying = [c for c in cols if c not in shared]
+    lines = []
+    if shared:
+        lines.append("共同：" + "；".join(f"{LISTING_COLUMNS[c]}={cells[c][0]}" for c in shared))
+    lines.append("|".join(LISTING_COLUMNS[c] for c in varying))
+    lines.extend("|".join(cells[c][i] for c in varying) for i in range(len(cells[cols[0]])))
+    return "\n".join(lines)
+
+
+def build_prompt(
+    template: str,
+    user_query: str,
+    user_filter: Dict[str, Any],
+    summary_stats: Dict[str, Any],
+    listings: pd.DataFrame,
+    system_prompt: str = "",
+    max_tokens: int | None = None,
+    max_rows: int | None = None,
+    model: str | None = None,
+) -> BuiltPrompt:
+    """渲染报告 prompt，并把整个请求（system + user）的输入 token 控制在 max_tokens 以内。
+
+    先以紧凑形式渲染全部输入；超出预算时按 TRIM_ORDER 依次删除统计字段、简表列与房源行，直到不超出。
+    全部裁剪后仍超出时照常返回（tokens 如实记录），由调用方决定是否发送。
+    """
+    max_tokens = max_tokens if max_tokens is not None else settings.llm_prompt_max_tokens
+    rows = min(len(listings), max_rows if max_rows is not None else settings.llm_prompt_max_rows)
+    total_rows = rows
+    filter_json = _compact_json(compact_filter(user_filter))
+    summary = compact_summary(summary_stats)
+    columns = [c for c in LISTING_COLUMNS if c in listings.columns]
+    system_tokens = count_tokens(system_prompt, model) + _MESSAGE_OVERHEAD if system_prompt else 0
+    dropped: List[str] = []
+
+    def render() -> BuiltPrompt:
+        text = template.format(
+            user_query=user_query,
+            user_filter_json=filter_json,
+            summary_stats_json=_compact_json(summary),
+            top_listings_table=format_listings(listings, columns, rows),
+        )
+        tokens = system_tokens + count_tokens(text, model) + _MESSAGE_OVERHEAD + _REPLY_PRIMING
+        return BuiltPrompt(text, tokens, rows, total_rows, list(columns), list(dropped), tokens_exact(model))
+
+    built = render()
+    for kind, target in TRIM_ORDER:
+        if max_tokens <= 0 or built.tokens <= max_tokens:
+            break
+        if kind == "summary" and target in summary:
+            del summary[target]
+            dropped.append(target)
+        elif kind == "column" and target in columns:
+            columns.remove(target)
+            dropped.append(target)
+        elif kind == "rows" and rows > target:
+            while rows > target and built.tokens > max_tokens:
+                rows -= 1
+                built = render()
+            dropped.append(f"listings {total_rows}->{rows}")
+            continue
+        else:
+            continue
+        built = render()
+    if 0 < max_tokens < built.tokens:
+        print(f"[prompt] {built.tokens} tokens still over budget {max_tokens} after trimming")
+    return built
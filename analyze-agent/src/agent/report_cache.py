@@ -0,0 +1,206 @@
+"""Process-wide cache of LLM assistant reports keyed by conditions, result set, summary stats and prompt template."""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+
+from src.config import settings
+from src.retrieval.query_parser import CITY_DISTRICTS
+
+CACHE_VERSION = 1  # 键的组成或报告后处理方式变化时递增，旧条目自然失效
+_DISTRICT_CITY = {d: city for city, districts in CITY_DISTRICTS.items() for d in districts}
+_IGNORED_KEYS = ("raw",)  # 原始查询文本不参与精确键（近义问法靠条件归一与语义层复用）
+
+
+def _digest(obj: Any) -> str:
+    return hashlib.blake2b(json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def normalize_conditions(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """解析条件的规范形式：去掉空值与原始文本，列表排序去重，数值统一为 float，只给城区时补上所属城市。
+
+    “北京海淀两室学区”与“海淀 2室 学区房”归一后相同。
+    """
+    out: Dict[str, Any] = {}
+    for key, value in parsed.items():
+        if key in _IGNORED_KEYS or value is None or value == [] or value == "":
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted({str(v) for v in value})
+        elif isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            value = float(value)
+        out[key] = value
+    if not out.get("city"):
+        cities = {_DISTRICT_CITY.get(d) for d in out.get("districts", [])}
+        if len(cities) == 1 and None not in cities:
+            out["city"] = cities.pop()
+    return out
+
+
+@dataclass
+class ReportCacheStats:
+    """命中统计；saved_seconds 为命中条目当初生成耗时之和减去查找耗时，即省下的 LLM 等待时间。"""
+
+    hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evicted: int = 0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return (self.hits + self.semantic_hits) / lookups if lookups else 0.0
+
+
+@dataclass
+class _Entry:
+    report: str
+    conditions_key: str
+    query: str
+    created: float
+    generation_seconds: float
+    query_vec: np.ndarray | None = field(default=None, repr=False)  # 语义层按需计算
+
+
+class ReportCache:
+    """报告缓存：进程内 LRU + TTL，线程安全。
+
+    结果键 = (有序 top 房源 id、统计摘要、提示模板与请求参数) 的摘要；同一结果键下按归一化条件精确命中。
+    开启语义层（settings.report_cache_semantic）时，结果键相同但条件不同的查询若与缓存查询的
+    embedding 余弦相似度不低于阈值，也复用该报告。
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        ttl_seconds: float | None = None,
+        semantic_threshold: float | None = None,
+        embed: Callable[[List[str]], np.ndarray] | None = None,
+    ) -> None:
+        self.max_entries = max_entries if max_entries is not None else settings.report_cache_max_entries
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.report_cache_ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self._embed = embed
+        self._entries: "OrderedDict[tuple[str, str], _Entry]" = OrderedDict()  # (结果键, 条件键) → 条目，按最近使用排序
+        self._stats = ReportCacheStats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def result_key(listing_ids: Sequence[Any], summary_stats: Dict[str, Any], prompt_config: Any) -> str:
+        """prompt_config 为决定报告内容的其余输入（模板文本、模型与采样参数等），任一变化即换键。"""
+        return _digest([CACHE_VERSION, [str(i) for i in listing_ids], summary_stats, prompt_config])
+
+    @staticmethod
+    def conditions_key(conditions: Dict[str, Any]) -> str:
+        return _digest(normalize_conditions(conditions))
+
+    def _threshold(self) -> float | None:
+        if self.semantic_threshold is not None:
+            return self.semantic_threshold
+        return settings.report_cache_semantic_threshold if settings.report_cache_semantic else None
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        if self._embed is not None:
+            return np.asarray(self._embed(queries), dtype=np.float32)
+        from src.pipeline.model_registry import get_embedding_model  # 仅语义层需要，避免无模型环境导入失败
+
+        return np.asarray(get_embedding_model().encode(queries, normalize_embeddings=True), dtype=np.float32)
+
+    def _drop_expired(self, now: float) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        stale = [k for k, e in self._entries.items() if now - e.created > self.ttl_seconds]
+        for k in stale:
+            del self._entries[k]
+        self._stats.expired += len(stale)
+
+    def get(self, result_key: str, conditions: Dict[str, Any], query: str) -> str | None:
+        """查找报告：先按 (结果键, 条件键) 精确命中，再（开启时）在同一结果键下做语义匹配；未命中返回 None。
+
+        语义匹配所需的 embedding 在锁外计算，编码期间其他请求的查找与写入不被阻塞。
+        """
+        t0 = time.perf_counter()
+        cond_key = self.conditions_key(conditions)
+        threshold = self._threshold()
+        candidates: List[_Entry] = []
+        with self._lock:
+            self._drop_expired(time.time())
+            entry = self._entries.get((result_key, cond_key))
+            if entry is not None:
+                self._record_hit(result_key, entry, "exact", t0)
+            elif threshold is not None:
+                candidates = [e for (rk, _), e in self._entries.items() if rk == result_key]
+            if entry is None and not candidates:
+                self._stats.misses += 1
+                return None
+            missing = [e for e in candidates if e.query_vec is None]
+        if entry is not None:
+            return self._report(entry, "exact")
+
+        vectors = self._embed_queries([query] + [e.query for e in missing])
+        with self._lock:
+            for e, vec in zip(missing, vectors[1:]):
+                e.query_vec = vec
+            # 编码期间可能有条目被淘汰或过期，只在仍然存在的候选中匹配
+            candidates = [e for e in candidates if self._entries.get((result_key, e.conditions_key)) is e]
+            entry = self._semantic_match(candidates, vectors[0], threshold)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._record_hit(result_key, entry, "semantic", t0)
+        return self._report(entry, "semantic")
+
+    def _record_hit(self, result_key: str, entry: _Entry, kind: str, t0: float) -> None:
+        """调用方持有锁。"""
+        self._entries.move_to_end((result_key, entry.conditions_key))
+        if kind == "exact":
+            self._stats.hits += 1
+        else:
+            self._stats.semantic_hits += 1
+        self._stats.saved_seconds += max(entry.generation_seconds - (time.perf_counter() - t0), 0.0)
+
+    def _report(self, entry: _Entry, kind: str) -> str:
+        print(f"[report-cache] {kind} hit ({entry.generation_seconds:.1f}s saved), hit rate {self._stats.hit_rate:.0%}")
+        return entry.report
+
+    @staticmethod
+    def _semantic_match(candidates: List[_Entry], query_vec: np.ndarray, threshold: float) -> _Entry | None:
+        """候选为结果集相同的条目；新查询与其缓存查询的余弦相似度最高且不低于阈值者命中。"""
+        if not candidates:
+            return None
+        sims = np.stack([e.query_vec for e in candidates]) @ query_vec
+        best = int(np.argmax(sims))
+        return candidates[best] if sims[best] >= threshold else None
+
+    def put(self, result_key: str, conditions: Dict[str, Any], query: str, report: str, generation_seconds: float) -> None:
+        """写入一条报告，超出 max_entries 时按最近最少使用淘汰。"""
+        cond_key = self.conditions_key(conditions)
+        with self._lock:
+            self._entries[(result_key, cond_key)] = _Entry(
+                report=report, conditions_key=cond_key, query=query, created=time.time(), generation_seconds=generation_seconds
+            )
+            self._entries.move_to_end((result_key, cond_key))
+            while len(self._entries) > max(self.max_entries, 0):
+                self._entries.popitem(last=False)
+                self._stats.evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中次数（精确/语义）、未命中、命中率、节省的生成耗时（秒）、条目数与淘汰/过期数。"""
+        with self._lock:
+            return {**asdict(self._stats), "hit_rate": self._stats.hit_rate, "entries": len(self._entries)}
+
+
+report_cache = ReportCache()
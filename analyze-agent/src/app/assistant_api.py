@@ -2,18 +2,19 @@
 
 import pandas as pd
 
-from src.agent.orchestrator import Orchestrator
 from src.agent.answer_generator import AnswerGenerator
 
 
 def search_assistant(query: str, top_k: int = 10):
-    from src.app.gradio_app import load_data, _format_table  # avoid circular import
+    """模式3：助手模式（默认数据源）；检索完成即返回结果表，报告随 LLM 输出逐段刷新。"""
+    from src.app.gradio_app import default_source, get_orch, has_default_data, _stream_outputs  # avoid circular import
 
-    df = load_data()
-    if df.empty:
-        return "数据未准备，请先运行生成/预处理管线。", pd.DataFrame()
-    orch = Orchestrator.create()
-    result = orch.run_assistant(user_query=query, df=df, top_k=top_k)
-    ranked = result.get("results", pd.DataFrame())
-    answer = result.get("answer", "")
-    return answer, _format_table(ranked)
+    if not has_default_data():
+        yield "数据未准备，请先运行生成/预处理管线。", pd.DataFrame()
+        return
+    orch = get_orch()  # 复用已加载的索引与模型，不在每次提问时重新构建引擎
+    parsed = orch.parser.parse(query)  # 指定城市/城区时只读取命中的分区
+    df, fetch_rows = default_source(parsed)
+    yield from _stream_outputs(
+        orch.run_assistant_stream(user_query=query, df=df, top_k=top_k, conditions=parsed, fetch_rows=fetch_rows)
+    )
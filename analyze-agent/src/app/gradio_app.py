@@ -1,6 +1,8 @@
 """Gradio UI for Analyze Agent with four modes."""
 from __future__ import annotations
 
+from typing import Iterator
+
 import gradio as gr
 import pandas as pd
 
@@ -25,19 +27,35 @@ try:
 except Exception as e:  # pragma: no cover
     print("[schema-patch] Failed to patch gradio_client.json_schema_to_python_type:", repr(e))
 
+from src.pipeline.compact import compact_listings
 from src.pipeline.context import SessionDataContext
-from src.pipeline.excel_parser import parse_uploaded_excel
-from src.pipeline.build_bm25 import build_bm25_from_dataframe
-from src.pipeline.build_vectors import build_vectors_from_dataframe
+from src.pipeline.model_registry import registry as model_registry
+from src.pipeline.upload_cache import load_session_context
 from src.app.assistant_api import search_assistant
-from src.agent.orchestrator import Orchestrator
+from src.agent.orchestrator import RANK_COLUMNS, Orchestrator, RowFetcher
 from src.agent.answer_generator import AnswerGenerator
+from src.retrieval.filter_index import FilterIndex
+from src.retrieval.listing_dataset import ListingDataset
 from src.config import settings
 
 _orch: Orchestrator | None = None
 _data: pd.DataFrame | None = None
+_dataset: ListingDataset | None = None
+_dataset_loaded = False
 _session_context: SessionDataContext | None = None
 
+_DISPLAY_COLUMNS = [
+    "id",
+    "city",
+    "district",
+    "community",
+    "layout",
+    "total_price",
+    "area",
+    "unit_price",
+    "fused_score",
+]
+
 
 def get_orch() -> Orchestrator:
     """惰性创建 Orchestrator。"""
@@ -52,35 +70,63 @@ def load_data() -> pd.DataFrame:
     global _data
     if _data is None:
         _data = pd.read_parquet(settings.paths.processed_parquet) if settings.paths.processed_parquet.exists() else pd.DataFrame()
+        if settings.compact_listings and not _data.empty:
+            _data = compact_listings(_data)  # 常驻进程内存约减少四成，过滤/排序结果不变
+        if len(_data) >= settings.filter_index_min_rows:
+            FilterIndex.for_frame(_data)  # 启动时预建过滤索引，首个请求不再承担构建开销
     return _data
 
 
+def get_dataset() -> ListingDataset | None:
+    """默认库的分区数据集；未启用（settings.data_access）、未构建或已过期时为 None。"""
+    global _dataset, _dataset_loaded
+    if not _dataset_loaded:
+        _dataset = ListingDataset.load() if settings.data_access == "dataset" else None
+        _dataset_loaded = True
+    return _dataset
+
+
+def has_default_data() -> bool:
+    """默认库是否可用（优先看数据集，避免为此加载全量表）。"""
+    return get_dataset() is not None or not load_data().empty
+
+
+def default_source(conditions: dict, scan: bool = False) -> tuple[pd.DataFrame, RowFetcher | None]:
+    """取默认库数据及补列回调，作为 Orchestrator.run 的 df / fetch_rows。
+
+    数据集可用且条件能裁剪分区（未给城市/城区时需 scan=True）时只下推读取排序所需的 RANK_COLUMNS，
+    top-k 行的其余列由数据集行存储按槽位补齐；否则用常驻全量表，避免每个请求全量扫描。
+    """
+    dataset = get_dataset()
+    if dataset is not None and (scan or dataset.prunes(conditions)):
+        if dataset.rows is None:  # 早期构建的数据集没有行存储，读取全部列
+            return dataset.read(conditions), None
+        return dataset.read(conditions, RANK_COLUMNS), dataset.take
+    return load_data(), None
+
+
 def _format_table(df: pd.DataFrame) -> pd.DataFrame:
     """统一前端展示列，缺列不报错。"""
     if df.empty:
         return df
-    display_cols = [
-        "id",
-        "city",
-        "district",
-        "community",
-        "layout",
-        "total_price",
-        "area",
-        "unit_price",
-        "fused_score",
-    ]
-    cols = [c for c in display_cols if c in df.columns]
+    cols = [c for c in _DISPLAY_COLUMNS if c in df.columns]
     return df[cols]
 
 
+def _stream_outputs(events: Iterator[dict]) -> Iterator[tuple]:
+    """run_assistant_stream 的事件 → (回答, 结果表) 输出：结果表在检索完成时渲染一次，之后只刷新回答文本。"""
+    for i, event in enumerate(events):
+        yield event.get("answer", ""), _format_table(event["results"]) if i == 0 else gr.update()
+
+
 def search_free(query: str, top_k: int = 10):
     """模式2：关键词/模糊搜索（BM25+语义+质量分）。"""
-    df = load_data()
-    if df.empty:
+    if not has_default_data():
         return "数据未准备，请先运行生成/预处理管线。", pd.DataFrame()
     orch = get_orch()
-    result = orch.run(query, df, top_k=top_k)
+    parsed = orch.parser.parse(query)
+    df, fetch_rows = default_source(parsed)
+    result = orch.run(query, df, top_k=top_k, conditions=parsed, fetch_rows=fetch_rows)
     ranked = result["results"]
     answer = AnswerGenerator().generate(query, ranked.to_dict(orient="records"))
     return answer, _format_table(ranked)
@@ -99,8 +145,7 @@ def search_filters(
     top_k: int,
 ):
     """模式1：条件筛选（仅硬过滤+质量排序，不跑 BM25/语义）。"""
-    df = load_data()
-    if df.empty:
+    if not has_default_data():
         return pd.DataFrame()
     conditions = {
         "city": None if city == _DEF_OPTION else city,
@@ -113,36 +158,46 @@ def search_filters(
         "livingrooms_exact": int(livingrooms) if livingrooms else None,
         "school_district": school_district if school_district else None,
     }
+    df, fetch_rows = default_source(conditions, scan=True)
     orch = get_orch()
-    result = orch.run(user_query="", df=df, top_k=top_k, conditions=conditions, use_bm25=False, use_semantic=False)
+    result = orch.run(
+        user_query="",
+        df=df,
+        top_k=top_k,
+        conditions=conditions,
+        use_bm25=False,
+        use_semantic=False,
+        fetch_rows=fetch_rows,
+    )
     ranked = result["results"]
     return _format_table(ranked)
 
 
 def search_assistant_upload(query: str, top_k: int = 10):
-    """模式4：助手模式（使用上传的 Excel 会话数据源）。"""
+    """模式4：助手模式（使用上传的 Excel 会话数据源），报告流式输出。"""
     global _session_context
     if _session_context is None:
-        return "尚未上传或解析 Excel 文件，请先上传待售房产列表。", pd.DataFrame()
+        yield "尚未上传或解析 Excel 文件，请先上传待售房产列表。", pd.DataFrame()
+        return
     orch = get_orch()
-    result = orch.run_assistant(user_query=query, df=_session_context.df, top_k=top_k, context=_session_context)
-    ranked = result.get("results", pd.DataFrame())
-    answer = result.get("answer", "")
-    return answer, _format_table(ranked)
+    yield from _stream_outputs(
+        orch.run_assistant_stream(user_query=query, df=_session_context.df, top_k=top_k, context=_session_context)
+    )
 
 
 def on_file_uploaded(file):
-    """解析上传的 Excel，构建临时索引并存入会话上下文。"""
+    """解析上传的 Excel，构建临时索引并存入会话上下文；同一文件再次上传直接复用磁盘缓存。"""
     global _session_context
-    df_clean = parse_uploaded_excel(file)
-    bm25_bundle = build_bm25_from_dataframe(df_clean)
-    vector_index, vector_model = build_vectors_from_dataframe(df_clean)
-    _session_context = SessionDataContext(df=df_clean, bm25_index=bm25_bundle, vector_index={"index": vector_index, "model": vector_model})
-    return f"已成功载入 {len(df_clean)} 条房源数据，用于本次分析。"
+    _session_context, cache_hit = load_session_context(file)
+    suffix = "（命中缓存）" if cache_hit else ""
+    return f"已成功载入 {len(_session_context.df)} 条房源数据，用于本次分析。{suffix}"
 
 
 def build_options():
-    """初始化城市/城区下拉框选项；若无数据则仅提供“全部”。"""
+    """初始化城市/城区下拉框选项；若无数据则仅提供“全部”。分区数据集可用时直接取分区值，不加载数据。"""
+    dataset = get_dataset()
+    if dataset is not None:
+        return [_DEF_OPTION] + dataset.partition_values("city"), [_DEF_OPTION] + dataset.partition_values("district")
     df = load_data()
     if df.empty:
         return [_DEF_OPTION], [_DEF_OPTION]
@@ -155,7 +210,20 @@ _DEF_OPTION = "全部"
 _CITIES_OPTS, _DISTRICTS_OPTS = build_options()
 
 
+def warm_up_models() -> None:
+    """启动时加载并预热 embedding 模型，上传/检索请求不再承担模型加载耗时。"""
+    try:
+        stats = model_registry.warm_up()
+        print(
+            f"[model-registry] {stats.name} ready on {stats.device}: load {stats.load_seconds:.1f}s, "
+            f"warm-up {stats.warmup_seconds:.2f}s, {stats.param_bytes / 2**20:.0f}MB"
+        )
+    except Exception as e:  # 模型不可用时仍可使用条件筛选等不依赖语义检索的模式
+        print("[model-registry] warm-up failed:", repr(e))
+
+
 def main() -> None:
+    warm_up_models()
     with gr.Blocks(title="Analyze Agent", theme=gr.themes.Soft()) as demo:
         gr.Markdown(
             "## Analyze Agent\n"
@@ -23,6 +23,11 @@ class Paths:
     bm25_index: Path = processed_dir / "bm25_index.joblib"
     vector_faiss: Path = processed_dir / "vector_index.faiss"
     vector_meta: Path = processed_dir / "vector_meta.joblib"
+    corpus_tokens: Path = processed_dir / "corpus_tokens.parquet"  # 按原文哈希缓存的 jieba 分词结果，BM25/向量构建共用
+    embedding_cache_dir: Path = processed_dir / "embedding_cache"  # 按文本哈希缓存的向量，重建索引时复用
+    listings_dataset: Path = processed_dir / "listings_dataset"  # 按 city/district 分区的 parquet 数据集，供下推读取
+    shards_dir: Path = processed_dir / "shards"  # 按分区键（如城市）拆分的 BM25/向量索引
+    upload_cache_dir: Path = processed_dir / "upload_cache"  # 上传 Excel 的会话索引缓存（按内容哈希）
 
 
 @dataclass
@@ -37,6 +42,7 @@ class RetrievalWeights:
 class Settings:
     paths: Paths = field(default_factory=Paths)
     weights: RetrievalWeights = field(default_factory=RetrievalWeights)
+    # age~renovation 六项在 preprocess 阶段预计算为 static_quality_score，调整后需重新预处理
     quality_weights: Dict[str, float] = field(
         default_factory=lambda: {
             "price": 0.25,
@@ -51,10 +57,47 @@ class Settings:
     )
     bm25_max_features: int = 8000
     bm25_ngram: tuple[int, int] = (1, 2)
+    bm25_k1: float = 1.5  # BM25 词频饱和参数
+    bm25_b: float = 0.75  # BM25 文档长度归一化强度
+    bm25_compact_ratio: float = 0.2  # 增量段文档数 + 墓碑数超过存活文档的该比例时压缩重建 BM25
+    corpus_workers: int = 0  # 离线构建时的语料分词进程数，0 表示取 CPU 核数（不超过核数）
+    corpus_parallel_min_docs: int = 2000  # 离线分词时每个进程至少分到的文档数，不足两个进程的量时串行
+    ingest_chunk_rows: int = 50_000  # 流式预处理每块行数，同时作为输出 parquet 的 row group 大小
+    dataset_partition_cols: tuple[str, ...] = ("city", "district")  # 分区数据集的 Hive 分区键
+    dataset_row_group_rows: int = 16_384  # 分区内按总价排序后的 row group 行数，越小价格区间裁剪越细
+    data_access: str = "dataset"  # dataset：默认库按条件从分区数据集下推读取；memory：常驻全量 DataFrame
+    filter_index_min_rows: int = 5000  # 常驻表（默认库/会话上传）行数不低于该值时加载后预建过滤索引
+    compact_listings: bool = True  # 常驻默认库使用紧凑 dtype（分类列、窄整型、标签位图）
     semantic_model: str = "BAAI/bge-small-zh"  # embedding model name
+    embedding_cache_dtype: str = "float16"  # 向量缓存存储精度：float16 / float32
+    vector_index_type: str = "flat"  # flat / ivf_flat / ivf_pq / hnsw
+    vector_nlist: int = 1024  # IVF 聚类中心数（按语料规模自动收缩）
+    vector_nprobe: int = 16  # IVF 查询时探查的聚类数
+    vector_pq_m: int = 16  # PQ 子空间个数（需整除向量维度）
+    vector_pq_nbits: int = 8  # 每个子空间的编码位数
+    vector_hnsw_m: int = 32  # HNSW 每个节点的邻居数
+    vector_hnsw_ef_construction: int = 80
+    vector_hnsw_ef_search: int = 64  # HNSW 查询时的候选队列长度
+    upload_cache_max_mb: int = 1024  # 上传缓存总大小上限，超出按最近最少使用淘汰
+    shard_key: str | None = None  # 设为 "city" 等分区键后，默认库检索只查询条件命中的分片（需先运行 build_shards）
+    retrieval_parallel: bool = True  # Orchestrator.run 中过滤/BM25/语义三路并行；False 走串行路径
+    retrieval_max_workers: int = 4  # 进程共享检索线程池大小（所有请求共用）
     llm_model: str = "gpt-4o-mini"
     llm_api_key_env: str = "OPENAI_API_KEY"
     llm_api_key: str | None = None  # 如需写死本地 key，可在此填入（不推荐提交）
+    llm_base_url: str | None = None  # OpenAI 兼容服务地址；None 时使用官方地址（或 OPENAI_BASE_URL 环境变量）
+    llm_timeout_seconds: float = 30.0  # 单次报告生成的总时限（含排队、重试与流式读取），超时回退本地模板
+    llm_max_retries: int = 2  # 超时/连接错误/限流/5xx 的最大重试次数（指数退避，不超出总时限）
+    llm_retry_backoff_seconds: float = 0.5  # 首次重试的退避秒数，之后每次翻倍（带随机抖动）
+    llm_max_concurrency: int = 8  # 进程内同时进行的 LLM 调用上限，同时也是连接池大小
+    llm_keepalive_seconds: float = 60.0  # 空闲 keep-alive 连接的保留时间
+    llm_prompt_max_tokens: int = 1200  # 单次报告请求的输入 token 上限（system + user），超出按优先级裁剪统计字段、简表列与房源行；<= 0 不限制
+    llm_prompt_max_rows: int = 5  # 提示中最多列出的房源数
+    report_cache_enabled: bool = True  # 按条件 + 结果集 + 统计摘要 + 模板缓存 LLM 报告
+    report_cache_max_entries: int = 512  # 报告缓存条目上限，超出按最近最少使用淘汰
+    report_cache_ttl_seconds: float = 3600.0  # 报告缓存有效期（秒），<= 0 表示不过期
+    report_cache_semantic: bool = False  # 结果集相同但条件不同时，按查询 embedding 相似度复用报告
+    report_cache_semantic_threshold: float = 0.92  # 语义复用的余弦相似度下限
 
 
 settings = Settings()
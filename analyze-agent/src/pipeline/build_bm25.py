@@ -1,54 +1,130 @@
-﻿"""Build BM25 index with jieba tokenization."""
+﻿"""Build BM25 inverted index with jieba tokenization."""
 from __future__ import annotations
 
 import joblib
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.pipeline import Pipeline
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
 
 from src.config import settings
-from src.utils.text_utils import tokenize, join_tokens
-
-
-def _build_corpus(df: pd.DataFrame) -> list[str]:
-    """将多字段文本+标签拼接并分词，生成语料列表。"""
-    text_cols = ["description", "community_intro", "surrounding"]
-    corpus = []
-    for _, row in df.iterrows():
-        parts = []
-        for col in text_cols:
-            val = row.get(col, "") if isinstance(row, dict) else row[col] if col in row else ""
-            parts.append(str(val) if pd.notna(val) else "")
-        tags = row.get("tags") if isinstance(row, dict) else row["tags"] if "tags" in row else []
-        if isinstance(tags, list):
-            parts.extend([str(t) for t in tags])
-        tokens = tokenize(" ".join(parts))
-        corpus.append(join_tokens(tokens))
-    return corpus
-
-
-def build_bm25_from_dataframe(df: pd.DataFrame) -> dict:
-    """基于 DataFrame 构建 BM25/TF-IDF 索引并返回 bundle。"""
-    corpus = _build_corpus(df)
-    vectorizer = TfidfVectorizer(
+from src.pipeline.corpus import CorpusCache, build_corpus
+
+
+def _new_vectorizer() -> CountVectorizer:
+    return CountVectorizer(
         analyzer="word",
         tokenizer=str.split,  # tokens already space-joined
+        token_pattern=None,
         preprocessor=None,
         lowercase=False,
         max_features=settings.bm25_max_features,
         ngram_range=settings.bm25_ngram,
     )
-    pipeline = Pipeline([("tfidf", vectorizer)])
-    matrix = pipeline.fit_transform(corpus)
-    return {"pipeline": pipeline, "matrix": matrix}
+
+
+def _postings(tf: sp.csr_matrix, doc_ids: np.ndarray, n_slots: int, idf: np.ndarray, avgdl: float, k1: float, b: float):
+    """doc×term 词频矩阵 → term×slot 倒排表（权重已含 idf 与长度归一化），第 i 行文档落在槽位 doc_ids[i]。"""
+    tf = tf.tocsr().astype(np.float32)
+    doc_len = np.asarray(tf.sum(axis=1)).ravel().astype(np.float32)
+    # tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))，按行展开文档长度
+    row_len = np.repeat(doc_len, np.diff(tf.indptr))
+    tf_vals = tf.data
+    weights = tf_vals * (k1 + 1) / (tf_vals + k1 * (1 - b + b * row_len / avgdl))
+    weights *= idf[tf.indices]
+    tf.data = weights.astype(np.float32)
+
+    postings = tf.T.tocsr()  # term-major：每行一个倒排表
+    postings = sp.csr_matrix((postings.data, doc_ids[postings.indices], postings.indptr), shape=(tf.shape[1], n_slots))
+    postings.sort_indices()  # indices 为升序槽位
+    return postings
+
+
+def build_bm25_from_dataframe(
+    df: pd.DataFrame, doc_ids: np.ndarray | None = None, n_slots: int | None = None, corpus: list[str] | None = None
+) -> dict:
+    """基于 DataFrame 构建 Okapi BM25 倒排索引并返回 bundle。
+
+    postings 为 term×doc 的 CSR 矩阵：第 t 行即词项 t 的倒排表（文档行号 + 预计算的 BM25 权重，
+    已含 idf 与文档长度归一化），查询时只需累加命中词项的倒排表。
+    doc_ids 为各行的文档槽位（缺省为行号 0..n-1），增量维护后的压缩重建会传入 DataFrame 的索引标签。
+    corpus 为 build_corpus 的输出（与向量索引共用），缺省时现场分词。
+    """
+    corpus = build_corpus(df) if corpus is None else corpus
+    doc_ids = np.arange(len(corpus), dtype=np.int64) if doc_ids is None else np.asarray(doc_ids, dtype=np.int64)
+    n_slots = max(int(n_slots or 0), int(doc_ids.max()) + 1 if doc_ids.size else 0)
+    vectorizer = _new_vectorizer()
+    try:
+        tf = vectorizer.fit_transform(corpus)
+    except ValueError:  # 空语料或全部为空文本
+        vectorizer = None
+        tf = None
+
+    bundle = {
+        "vectorizer": vectorizer,
+        "vocab": {},
+        "postings": None,
+        "idf": np.zeros(0, dtype=np.float32),
+        "doc_len": np.zeros(len(corpus), dtype=np.float32),
+        "avgdl": 0.0,
+        "n_docs": n_slots,
+        "k1": settings.bm25_k1,
+        "b": settings.bm25_b,
+        "segments": [],  # 增量追加的倒排段（沿用主段的词表/idf/avgdl）
+        "deleted": np.zeros(0, dtype=np.int64),  # 墓碑：已删除/被覆盖的槽位（升序）
+    }
+    if tf is None or tf.nnz == 0:
+        return bundle
+
+    k1, b = settings.bm25_k1, settings.bm25_b
+    n_docs = len(corpus)
+    doc_len = np.asarray(tf.sum(axis=1)).ravel().astype(np.float32)
+    avgdl = float(doc_len.mean()) or 1.0
+    doc_freq = np.bincount(tf.indices, minlength=tf.shape[1]).astype(np.float32)
+    idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+    postings = _postings(tf, doc_ids, n_slots, idf, avgdl, k1, b)
+    bundle.update(
+        {"vocab": vectorizer.vocabulary_, "postings": postings, "idf": idf, "doc_len": doc_len, "avgdl": avgdl}
+    )
+    return bundle
+
+
+def add_bm25_segment(bundle: dict, df: pd.DataFrame, doc_ids: np.ndarray, corpus: list[str] | None = None) -> None:
+    """把新文档作为增量段追加到 bundle（原地修改），词表/idf/avgdl 沿用主段，直到下次压缩重建。
+
+    主段词表之外的新词在压缩前不可检索。
+    """
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    if doc_ids.size == 0:
+        return
+    bundle["n_docs"] = max(bundle["n_docs"], int(doc_ids.max()) + 1)
+    if bundle["vectorizer"] is None or bundle["postings"] is None:
+        return
+    tf = bundle["vectorizer"].transform(build_corpus(df) if corpus is None else corpus)
+    segment = _postings(
+        tf, doc_ids, bundle["n_docs"], bundle["idf"], bundle["avgdl"], bundle["k1"], bundle["b"]
+    )
+    bundle.setdefault("segments", []).append(segment)
+
+
+def delete_bm25_docs(bundle: dict, doc_ids: np.ndarray) -> None:
+    """为槽位打墓碑（原地修改），查询时跳过，压缩时物理删除。"""
+    deleted = bundle.get("deleted", np.zeros(0, dtype=np.int64))
+    bundle["deleted"] = np.union1d(deleted, np.asarray(doc_ids, dtype=np.int64))
+
+
+def bm25_delta_docs(bundle: dict) -> int:
+    """增量段中的文档数（含已被墓碑覆盖的），用于判断是否需要压缩。"""
+    return sum(int(np.unique(seg.indices).size) for seg in bundle.get("segments", []))
 
 
 def build_bm25_index() -> None:
-    """构建基于 TF-IDF+jieba 的 BM25 风格索引并持久化。"""
+    """构建基于 jieba 分词的 BM25 倒排索引并持久化。"""
     df = pd.read_parquet(settings.paths.processed_parquet)
-    bundle = build_bm25_from_dataframe(df)
+    corpus = build_corpus(df, CorpusCache())  # 分词结果写入缓存，build_vectors 直接复用
+    bundle = build_bm25_from_dataframe(df, doc_ids=df.index.to_numpy(), corpus=corpus)  # 文档槽位取索引标签（增量维护后可能不连续）
     joblib.dump(bundle, settings.paths.bm25_index)
-    print(f"Saved BM25-like index to {settings.paths.bm25_index}")
+    print(f"Saved BM25 index to {settings.paths.bm25_index}")
 
 
 def main() -> None:
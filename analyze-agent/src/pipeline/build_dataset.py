@@ -0,0 +1,138 @@
+"""Write the processed listings as a Hive-partitioned Parquet dataset (e.g. city=/district=) for pushdown reads."""
+from __future__ import annotations
+
+import argparse
+import itertools
+import shutil
+from pathlib import Path
+from typing import Iterator
+
+import joblib
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.config import settings
+
+MANIFEST_FILE = "_manifest.joblib"  # 下划线前缀：pyarrow 扫描数据集时自动忽略
+SLOT_COLUMN = "_slot"  # 文档槽位（默认库 DataFrame 索引标签），与 BM25/向量索引的文档 id 对齐
+SORT_COLUMN = "total_price"  # 分区内按总价排序，row group 的 min/max 统计可裁剪价格区间
+ROWS_FILE = "_rows.arrow"  # 按槽位顺序存放完整行的未压缩 Arrow IPC 文件，内存映射后按槽位取 top-k 行的其余列
+
+
+def _slot_batches(source: Path, batch_rows: int) -> Iterator[pa.RecordBatch]:
+    """逐批读取源 parquet 并追加槽位列：有索引列时取索引标签（增量更新后的存储），否则按行位置编号。"""
+    pf = pq.ParquetFile(source)
+    index_cols = (pf.schema_arrow.pandas_metadata or {}).get("index_columns", [])
+    index_col = index_cols[0] if index_cols and isinstance(index_cols[0], str) else None
+    start, step = 0, 1
+    if index_cols and isinstance(index_cols[0], dict):  # RangeIndex 只记录在元数据中
+        start, step = index_cols[0].get("start", 0), index_cols[0].get("step", 1)
+    offset = 0
+    for batch in pf.iter_batches(batch_size=batch_rows):
+        if index_col is not None:
+            slots = batch.column(index_col).cast(pa.int64())
+            batch = batch.drop_columns([index_col])
+        else:
+            slots = pa.array(start + step * np.arange(offset, offset + batch.num_rows), type=pa.int64())
+        offset += batch.num_rows
+        yield batch.append_column(SLOT_COLUMN, slots)
+
+
+def _pandas_dtypes(source: Path) -> dict[str, str]:
+    """源 parquet 读回 pandas 时各列的 dtype（如 boolean 扩展类型），读取数据集时据此还原。"""
+    empty = pq.ParquetFile(source).schema_arrow.empty_table().to_pandas()
+    return {col: str(dtype) for col, dtype in empty.dtypes.items()}
+
+
+def build_dataset(source: Path | None = None, out_dir: Path | None = None) -> Path:
+    """由预处理 parquet 构建分区数据集：先按分区键流式落盘，再逐分区按总价排序重写为定长 row group。
+
+    另写一份按槽位顺序的行存储（ROWS_FILE）供按行取数。峰值内存取决于最大分区而非全表；
+    manifest 记录 schema、列顺序、dtype、各分区行数与源文件修改时间。
+    """
+    source = source or settings.paths.processed_parquet
+    out_dir = out_dir or settings.paths.listings_dataset
+    partition_cols = list(settings.dataset_partition_cols)
+    row_group_rows = settings.dataset_row_group_rows
+
+    batches = _slot_batches(source, row_group_rows * 4)
+    first = next(batches, None)
+    if first is None:
+        raise ValueError(f"{source} has no rows")
+    schema = first.schema.remove_metadata()
+    missing = [c for c in partition_cols if c not in schema.names]
+    if missing:
+        raise KeyError(f"partition columns {missing} not in {source}")
+    partition_schema = pa.schema([pa.field(c, pa.string()) for c in partition_cols])
+    schema = pa.schema([partition_schema.field(f.name) if f.name in partition_cols else f for f in schema])
+
+    def conformed(source_batches: Iterator[pa.RecordBatch]) -> Iterator[pa.RecordBatch]:
+        for batch in source_batches:
+            yield pa.RecordBatch.from_arrays([batch.column(f.name).cast(f.type) for f in schema], schema=schema)
+
+    tmp_dir = out_dir.with_name(f"{out_dir.name}.tmp")
+    staging = tmp_dir / "_staging"
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    partitioning = ds.partitioning(partition_schema, flavor="hive")
+    ds.write_dataset(
+        conformed(itertools.chain([first], batches)), staging, schema=schema, format="parquet", partitioning=partitioning, max_partitions=100_000
+    )
+
+    # 同一分区可能落成多个文件，按分区值归组后合并、排序并重写为单个文件
+    groups: dict[tuple, list[str]] = {}
+    keys_of: dict[tuple, dict] = {}
+    for fragment in ds.dataset(staging, format="parquet", partitioning=partitioning).get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        group = tuple(keys[c] for c in partition_cols)
+        groups.setdefault(group, []).append(fragment.path)
+        keys_of[group] = keys
+
+    sort_keys = [(SORT_COLUMN, "ascending")] if SORT_COLUMN in schema.names else []
+    sort_keys.append((SLOT_COLUMN, "ascending"))
+    partitions = []
+    for group in sorted(groups):
+        files = groups[group]
+        table = ds.dataset(files, format="parquet").to_table().sort_by(sort_keys)
+        rel = Path(files[0]).parent.relative_to(staging)
+        (tmp_dir / rel).mkdir(parents=True)
+        pq.write_table(table, tmp_dir / rel / "part-0.parquet", row_group_size=row_group_rows)
+        partitions.append({"keys": keys_of[group], "dir": rel.as_posix(), "n_rows": table.num_rows})
+    shutil.rmtree(staging)
+    with pa.OSFile(str(tmp_dir / ROWS_FILE), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in conformed(_slot_batches(source, row_group_rows * 4)):
+            writer.write_batch(batch)
+
+    dtypes = _pandas_dtypes(source)
+    joblib.dump(
+        {
+            "schema": schema,
+            "partition_cols": partition_cols,
+            "columns": [c for c in dtypes if c in schema.names],
+            "dtypes": dtypes,
+            "partitions": partitions,
+            "n_rows": sum(p["n_rows"] for p in partitions),
+            "source_mtime_ns": source.stat().st_mtime_ns,
+        },
+        tmp_dir / MANIFEST_FILE,
+    )
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp_dir.rename(out_dir)
+    print(f"Saved {len(partitions)} partitions by {partition_cols} ({sum(p['n_rows'] for p in partitions)} rows) to {out_dir}")
+    return out_dir
+
+
+def main() -> None:
+    """入口：构建分区数据集。"""
+    parser = argparse.ArgumentParser(description="Write the processed listings as a partitioned Parquet dataset")
+    parser.add_argument("--source", type=Path, default=None, help="缺省为 data/processed/listings.parquet")
+    parser.add_argument("--out", type=Path, default=None, help="缺省为 data/processed/listings_dataset")
+    args = parser.parse_args()
+    build_dataset(args.source, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Build per-partition (e.g. per-city) BM25 and vector index shards from the default listing store."""
+from __future__ import annotations
+
+import argparse
+import shutil
+from typing import Any
+
+import faiss
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.pipeline.corpus import CorpusCache, build_corpus
+from src.pipeline.embedding_cache import EmbeddingCache
+from src.pipeline.model_registry import get_embedding_model
+from src.pipeline.vector_index import build_faiss_index, describe_index
+
+MANIFEST_FILE = "manifest.joblib"
+UNKNOWN_SHARD = "__unknown__"  # 分区键缺失的行单独成片，只在未限定分区键的查询中检索
+
+
+def _restrict_columns(matrix: sp.csr_matrix, keep: np.ndarray) -> sp.csr_matrix:
+    """只保留 keep 为 True 的列（文档槽位），形状不变。"""
+    out = (matrix @ sp.diags(keep.astype(matrix.dtype))).tocsr()
+    out.eliminate_zeros()
+    out.sort_indices()
+    return out
+
+
+def shard_bm25_bundle(bundle: dict, slots: np.ndarray) -> dict:
+    """从全局 BM25 bundle 切出一个分片：倒排表只保留分片内槽位，词表/idf/avgdl 沿用全局，
+    因此分片得分与全局索引逐位一致，跨分片合并无需重新归一化。"""
+    keep = np.zeros(bundle["n_docs"], dtype=bool)
+    keep[slots] = True
+    shard = dict(bundle)
+    if bundle["postings"] is not None:
+        shard["postings"] = _restrict_columns(bundle["postings"], keep)
+    shard["segments"] = [_restrict_columns(seg, keep) for seg in bundle.get("segments", [])]
+    deleted = np.asarray(bundle.get("deleted", np.zeros(0)), dtype=np.int64)
+    shard["deleted"] = deleted[keep[deleted]] if deleted.size else deleted
+    return shard
+
+
+def shard_vector_index(embeddings: np.ndarray, slots: np.ndarray, index_type: str | None = None) -> faiss.Index:
+    """分片向量索引：IndexIDMap2 以全局槽位为 id，结果可直接与其他分片合并。"""
+    return build_faiss_index(embeddings, index_type=index_type, ids=slots)
+
+
+def partition_slots(df: pd.DataFrame, key: str) -> dict[Any, np.ndarray]:
+    """分区键取值 → 该分区的全局槽位（升序）；分区键缺失的行归入 UNKNOWN_SHARD，保证每行恰在一个分片中。"""
+    slots = df.index.to_numpy()
+    groups = df.groupby(key, sort=True, observed=True).indices  # groupby 丢弃缺失键
+    parts = {value: np.sort(slots[rows]).astype(np.int64) for value, rows in groups.items()}
+    missing = df[key].isna().to_numpy()
+    if missing.any():
+        parts[UNKNOWN_SHARD] = np.sort(slots[missing]).astype(np.int64)
+    return parts
+
+
+def build_shards(key: str | None = None) -> None:
+    """按分区键为默认库构建分片：每片一个目录（BM25 bundle + 向量索引 + meta），另写 manifest。"""
+    key = key or settings.shard_key or "city"
+    paths = settings.paths
+    df = pd.read_parquet(paths.processed_parquet)
+    if key not in df.columns:
+        raise KeyError(f"partition key {key!r} not in {paths.processed_parquet}")
+
+    corpus = build_corpus(df, CorpusCache())
+    if paths.bm25_index.exists():
+        bundle = joblib.load(paths.bm25_index)
+    else:
+        bundle = build_bm25_from_dataframe(df, doc_ids=df.index.to_numpy(), corpus=corpus)
+    model = get_embedding_model()
+    embeddings = EmbeddingCache(settings.semantic_model).encode(corpus, model)
+    row_of = pd.Series(np.arange(len(df)), index=df.index)
+
+    out_dir = paths.shards_dir
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+    shards = {}
+    for i, (value, slots) in enumerate(partition_slots(df, key).items()):
+        shard_dir = out_dir / f"shard_{i:03d}"
+        shard_dir.mkdir()
+        joblib.dump(shard_bm25_bundle(bundle, slots), shard_dir / "bm25_index.joblib")
+        index = shard_vector_index(embeddings[row_of.loc[slots].to_numpy()], slots)
+        faiss.write_index(index, str(shard_dir / "vector_index.faiss"))
+        joblib.dump(
+            {"ids": slots.tolist(), "model_name": settings.semantic_model, "index_params": describe_index(index)},
+            shard_dir / "vector_meta.joblib",
+        )
+        shards[value] = {"dir": shard_dir.name, "n_docs": int(slots.size)}
+        print(f"Shard {key}={value}: {slots.size} docs -> {shard_dir.name}")
+
+    joblib.dump(
+        {"key": key, "shards": shards, "source_mtime_ns": paths.processed_parquet.stat().st_mtime_ns},
+        out_dir / MANIFEST_FILE,
+    )
+    print(f"Saved {len(shards)} shards by {key!r} to {out_dir}")
+
+
+def main() -> None:
+    """入口：构建分片索引。"""
+    parser = argparse.ArgumentParser(description="Build per-partition BM25/vector index shards")
+    parser.add_argument("--key", default=None, help="分区键（缺省 settings.shard_key，未配置时为 city）")
+    args = parser.parse_args()
+    build_shards(args.key)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,51 +5,55 @@ import joblib
 import numpy as np
 import pandas as pd
 import faiss
-from sentence_transformers import SentenceTransformer
 
 from src.config import settings
-from src.utils.text_utils import tokenize, join_tokens
-
-
-def _build_corpus(df: pd.DataFrame) -> list[str]:
-    """拼接文本+标签并分词，生成语料列表。"""
-    text_cols = ["description", "community_intro", "surrounding"]
-    corpus = []
-    for _, row in df.iterrows():
-        parts = []
-        for col in text_cols:
-            val = row.get(col, "") if isinstance(row, dict) else row[col] if col in row else ""
-            parts.append(str(val) if pd.notna(val) else "")
-        tags = row.get("tags") if isinstance(row, dict) else row["tags"] if "tags" in row else []
-        if isinstance(tags, list):
-            parts.extend([str(t) for t in tags])
-        tokens = tokenize(" ".join(parts))
-        corpus.append(join_tokens(tokens))
-    return corpus
-
-
-def build_vectors_from_dataframe(df: pd.DataFrame):
-    """基于 DataFrame 构建语义向量索引，返回 (faiss_index, model)。"""
-    corpus = _build_corpus(df)
-    model = SentenceTransformer(settings.semantic_model)
-    embeddings = model.encode(corpus, batch_size=64, show_progress_bar=True, normalize_embeddings=True)
-    embeddings = np.asarray(embeddings, dtype="float32")
-
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
+from src.pipeline.corpus import CorpusCache, build_corpus
+from src.pipeline.embedding_cache import EmbeddingCache
+from src.pipeline.model_registry import get_embedding_model
+from src.pipeline.vector_index import build_faiss_index, describe_index
+
+
+def build_vectors_from_dataframe(
+    df: pd.DataFrame,
+    index_type: str | None = None,
+    use_cache: bool = False,
+    ids: np.ndarray | None = None,
+    corpus: list[str] | None = None,
+):
+    """基于 DataFrame 构建语义向量索引，返回 (faiss_index, model)。
+
+    index_type 缺省取 settings.vector_index_type（flat / ivf_flat / ivf_pq / hnsw）。
+    use_cache 时只编码缓存中没有的文本，其余从磁盘向量缓存组装。
+    ids 为各行的文档槽位，传入时索引外包 IndexIDMap2 以支持增量维护。
+    corpus 为 build_corpus 的输出（与 BM25 共用），缺省时现场分词。
+    """
+    corpus = build_corpus(df) if corpus is None else corpus
+    model = get_embedding_model()  # 进程内共享实例，不随每次上传重新加载
+    if use_cache:
+        embeddings = EmbeddingCache(settings.semantic_model).encode(corpus, model)
+    else:
+        embeddings = model.encode(corpus, batch_size=64, show_progress_bar=True, normalize_embeddings=True)
+        embeddings = np.asarray(embeddings, dtype="float32")
+
+    index = build_faiss_index(embeddings, index_type=index_type, ids=ids)
     return index, model
 
 
 def build_vector_index() -> None:
     """使用 bge-small-zh 生成向量并构建 FAISS 索引。"""
     df = pd.read_parquet(settings.paths.processed_parquet)
-    index, model = build_vectors_from_dataframe(df)
+    # 向量 id 取 DataFrame 索引标签（文档槽位），与 BM25 及增量维护保持一致
+    corpus = build_corpus(df, CorpusCache())  # 先运行 build_bm25 / corpus 时全部命中缓存，不再分词
+    index, model = build_vectors_from_dataframe(df, use_cache=True, ids=df.index.to_numpy(), corpus=corpus)
+    index_params = describe_index(index)
 
     settings.paths.processed_dir.mkdir(parents=True, exist_ok=True)
     faiss.write_index(index, str(settings.paths.vector_faiss))
-    joblib.dump({"ids": list(range(len(df))), "model_name": settings.semantic_model}, settings.paths.vector_meta)
-    print(f"Saved vector index to {settings.paths.vector_faiss} with {len(df)} entries")
+    joblib.dump(
+        {"ids": df.index.tolist(), "model_name": settings.semantic_model, "index_params": index_params},
+        settings.paths.vector_meta,
+    )
+    print(f"Saved {index_params['index_type']} vector index to {settings.paths.vector_faiss} with {len(df)} entries")
 
 
 def main() -> None:
@@ -0,0 +1,127 @@
+"""Compact in-memory representation of the listing table: categoricals, narrow numerics and a tag bitmask."""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import settings
+
+# 低基数字符串列 → pandas category（每行只存 1~2 字节编码）
+CATEGORY_COLUMNS = ("city", "district", "orientation", "renovation", "building_type", "company", "layout", "nearest_subway")
+# 整数语义的数值列：无缺失时取能容纳取值范围的最小整型，有缺失时用 float32（小整数可精确表示）
+INTEGER_COLUMNS = ("bedrooms", "livingrooms", "bathrooms", "floor", "total_floors", "year_built", "noise_level", "view_quality")
+# 不参与过滤/排序/统计的小数列 → float32；总价、面积、单价、地铁距离、推广权重与预计算分数保持 float64，
+# 以免用户给定的价格/面积边界或排序分数因精度变化而改变结果
+FLOAT32_COLUMNS = (
+    "management_fee",
+    "usable_area",
+    "distance_to_school",
+    "distance_to_park",
+    "lat",
+    "lon",
+    "quality_score",
+    "subway_score",
+    "school_score",
+)
+TAGS_COLUMN = "tags"
+TAG_MASK_COLUMN = "tags_mask"
+TAG_VOCAB_ATTR = "tag_vocab"  # 标签位图的词表记录在 df.attrs 中，第 i 位对应 vocab[i]
+_MASK_DTYPES = ((8, np.uint8), (16, np.uint16), (32, np.uint32), (64, np.uint64))
+
+
+def _narrow_integer(series: pd.Series) -> pd.Series:
+    values = pd.to_numeric(series, errors="coerce")
+    if values.isna().any():
+        return values.astype(np.float32)
+    if not np.array_equal(values, np.round(values)):  # 含小数，非整数语义，保持原样
+        return values
+    return pd.to_numeric(values.astype(np.int64), downcast="integer")
+
+
+def _tag_mask(tags: pd.Series) -> tuple[np.ndarray, list[str]] | None:
+    """列表列 → 多热位图；标签种类超过 64 时返回 None（保留原列表列）。"""
+    exploded = tags.reset_index(drop=True).explode().dropna()  # 索引即行位置
+    vocab = sorted(exploded.astype(str).unique())
+    dtype = next((dt for bits, dt in _MASK_DTYPES if len(vocab) <= bits), None)
+    if dtype is None:
+        return None
+    codes = pd.Categorical(exploded.astype(str), categories=vocab).codes.astype(np.uint64)
+    rows = exploded.index.to_numpy()
+    mask = np.zeros(len(tags), dtype=np.uint64)
+    np.bitwise_or.at(mask, rows, np.left_shift(np.uint64(1), codes))
+    return mask.astype(dtype), vocab
+
+
+def compact_listings(df: pd.DataFrame) -> pd.DataFrame:
+    """返回紧凑 dtype 的副本：分类列、窄数值列与标签位图（词表见 df.attrs[TAG_VOCAB_ATTR]）。
+
+    过滤、排序与统计所用列的取值不变，结果与原表逐位一致。
+    """
+    out = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in out.columns and out[col].dtype == object:
+            out[col] = out[col].astype("category")
+    for col in INTEGER_COLUMNS:
+        if col in out.columns and pd.api.types.is_numeric_dtype(out[col]):
+            out[col] = _narrow_integer(out[col])
+    for col in FLOAT32_COLUMNS:
+        if col in out.columns and pd.api.types.is_float_dtype(out[col]):
+            out[col] = out[col].astype(np.float32)
+    if TAGS_COLUMN in out.columns and (encoded := _tag_mask(out[TAGS_COLUMN])) is not None:
+        mask, vocab = encoded
+        position = out.columns.get_loc(TAGS_COLUMN)
+        out = out.drop(columns=TAGS_COLUMN)
+        out.insert(position, TAG_MASK_COLUMN, mask)
+        out.attrs[TAG_VOCAB_ATTR] = vocab
+    return out
+
+
+def decode_tags(df: pd.DataFrame) -> pd.Series:
+    """从标签位图还原标签列表（按词表顺序）；未压缩的表直接返回 tags 列。"""
+    if TAG_MASK_COLUMN not in df.columns:
+        return df[TAGS_COLUMN]
+    vocab = df.attrs[TAG_VOCAB_ATTR]
+    masks = df[TAG_MASK_COLUMN].to_numpy().astype(np.uint64)
+    decoded = {m: [t for i, t in enumerate(vocab) if int(m) >> i & 1] for m in np.unique(masks)}
+    return pd.Series([decoded[m] for m in masks], index=df.index, name=TAGS_COLUMN)
+
+
+def has_tags(df: pd.DataFrame, tags: list[str]) -> np.ndarray:
+    """同时包含全部 tags 的行（布尔数组）；位图上一次按位与即可，不需遍历列表。"""
+    if TAG_MASK_COLUMN not in df.columns:
+        wanted = set(tags)
+        return df[TAGS_COLUMN].map(lambda t: wanted.issubset(t) if isinstance(t, (list, np.ndarray)) else False).to_numpy(bool)
+    vocab = df.attrs[TAG_VOCAB_ATTR]
+    if any(t not in vocab for t in tags):
+        return np.zeros(len(df), dtype=bool)
+    want = np.uint64(sum(1 << vocab.index(t) for t in tags))
+    return (df[TAG_MASK_COLUMN].to_numpy().astype(np.uint64) & want) == want
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """逐列对比压缩前后的内存占用（MB，含字符串对象本身）。"""
+    b = before.memory_usage(deep=True, index=False) / 2**20
+    a = after.memory_usage(deep=True, index=False) / 2**20
+    if TAG_MASK_COLUMN in a.index:
+        a = a.rename({TAG_MASK_COLUMN: TAGS_COLUMN})
+    report = pd.DataFrame({"before_mb": b, "after_mb": a}).fillna(0.0)
+    report["before_dtype"] = before.dtypes.astype(str)
+    report["after_dtype"] = after.dtypes.rename({TAG_MASK_COLUMN: TAGS_COLUMN}).astype(str)
+    report.loc["TOTAL", ["before_mb", "after_mb"]] = report[["before_mb", "after_mb"]].sum()
+    return report.round(2)
+
+
+def main() -> None:
+    """CLI 入口：报告默认库压缩前后的内存占用。"""
+    parser = argparse.ArgumentParser(description="Report memory of the listing table before/after compaction")
+    parser.add_argument("--path", type=Path, default=None, help="缺省为 data/processed/listings.parquet")
+    args = parser.parse_args()
+    df = pd.read_parquet(args.path or settings.paths.processed_parquet)
+    print(memory_report(df, compact_listings(df)).to_string())
+
+
+if __name__ == "__main__":
+    main()
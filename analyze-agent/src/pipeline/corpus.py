@@ -0,0 +1,157 @@
+"""Shared corpus stage: listing text → jieba token streams, tokenized once (in parallel offline) and cached on disk by text hash."""
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Sequence
+
+import jieba
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.config import settings
+from src.pipeline.compact import TAG_MASK_COLUMN, TAGS_COLUMN, decode_tags
+from src.utils.text_utils import KEY_BYTES, join_tokens, text_key, tokenize
+
+TEXT_COLUMNS = ("description", "community_intro", "surrounding")
+CORPUS_VERSION = 1  # 文档拼接（document_texts）或分词规则（tokenize）变化时递增，依赖分词结果的缓存随之失效
+
+
+def _text_values(series: pd.Series) -> list[str]:
+    return ["" if pd.isna(v) else str(v) for v in series.tolist()]
+
+
+def _tag_lists(df: pd.DataFrame) -> list[list[str]]:
+    """各行标签；列表列读回 parquet 后为 ndarray，紧凑表则从位图还原。"""
+    if TAG_MASK_COLUMN in df.columns:
+        tags = decode_tags(df)
+    elif TAGS_COLUMN in df.columns:
+        tags = df[TAGS_COLUMN]
+    else:
+        return [[] for _ in range(len(df))]
+    return [[str(t) for t in v] if isinstance(v, (list, tuple, np.ndarray)) else [] for v in tags.tolist()]
+
+
+def document_texts(df: pd.DataFrame) -> list[str]:
+    """各行的文本字段与标签按顺序以空格拼接（分词前的文档原文），缺失字段记为空串。"""
+    fields = [_text_values(df[col]) if col in df.columns else [""] * len(df) for col in TEXT_COLUMNS]
+    return [" ".join([*parts, *tags]) for *parts, tags in zip(*fields, _tag_lists(df))]
+
+
+def _init_worker() -> None:
+    jieba.initialize()  # 每个子进程加载一次词典，避免首块分词时才加载
+
+
+def _tokenize_chunk(texts: list[str]) -> list[str]:
+    return [join_tokens(tokenize(t)) for t in texts]
+
+
+def tokenize_texts(texts: Sequence[str], workers: int | None = None, parallel: bool = True) -> list[str]:
+    """逐篇分词为空格分隔的 token 串，输出与输入同序。
+
+    parallel 为 True（离线构建）且文档数达到 settings.corpus_parallel_min_docs 时按块分发到 spawn 启动的进程池；
+    进程数不超过 CPU 核数，且每个进程至少分到 corpus_parallel_min_docs 篇文档，以摊薄子进程加载词典的开销。
+    请求路径（如 Gradio 上传）传 parallel=False 串行分词，不在多线程的服务进程中创建子进程。
+    """
+    cpus = os.cpu_count() or 1
+    workers = min(workers or settings.corpus_workers or cpus, cpus, len(texts) // max(settings.corpus_parallel_min_docs, 1))
+    if not parallel or workers <= 1:
+        return _tokenize_chunk(list(texts))
+    size = -(-len(texts) // (workers * 4))
+    chunks = [list(texts[i : i + size]) for i in range(0, len(texts), size)]
+    # spawn 而非 fork：调用方可能已启动线程（锁状态会被 fork 复制），子进程各自加载 jieba 词典
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"), initializer=_init_worker) as pool:
+        return [tokens for part in pool.map(_tokenize_chunk, chunks) for tokens in part]
+
+
+class CorpusCache:
+    """按文档原文哈希缓存分词结果，存为与默认库 parquet 同目录的 parquet（key 升序 + tokens）。"""
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = Path(path or settings.paths.corpus_tokens)
+
+    def _load(self) -> tuple[np.ndarray, np.ndarray] | None:
+        if not self.path.exists():
+            return None
+        table = pq.read_table(self.path)
+        if table.schema.names != ["key", "tokens"]:
+            print(f"Corpus cache {self.path.name} has a different layout, ignoring it")
+            return None
+        key_col = table.column("key").combine_chunks()
+        keys = np.frombuffer(key_col.buffers()[1], dtype=f"S{KEY_BYTES}", count=len(key_col), offset=key_col.offset * KEY_BYTES)
+        return keys, np.array(table.column("tokens").to_pylist(), dtype=object)
+
+    def tokens(self, texts: Sequence[str], persist: bool = True, workers: int | None = None) -> list[str]:
+        """返回各文档的 token 串：命中缓存的直接读取，其余（去重后）并行分词后写回缓存。
+
+        与 EmbeddingCache 一样，写回时只保留本次语料涉及的文本；少量增量文档传 persist=False 只读缓存。
+        """
+        keys = np.array([text_key(t) for t in texts], dtype=f"S{KEY_BYTES}")
+        uniq_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        uniq_tokens = np.empty(len(uniq_keys), dtype=object)
+
+        hit = np.zeros(len(uniq_keys), dtype=bool)
+        cached = self._load()
+        n_cached = 0 if cached is None else len(cached[0])
+        if n_cached:
+            cached_keys, cached_tokens = cached
+            pos = np.minimum(np.searchsorted(cached_keys, uniq_keys), n_cached - 1)
+            hit = cached_keys[pos] == uniq_keys
+            uniq_tokens[hit] = cached_tokens[pos[hit]]
+
+        miss = np.flatnonzero(~hit)
+        if miss.size:
+            uniq_tokens[miss] = tokenize_texts([texts[i] for i in first[miss]], workers=workers)
+        print(f"Corpus cache: {int(hit.sum())} hits, {miss.size} tokenized, {len(keys) - len(uniq_keys)} duplicates")
+
+        if persist and (miss.size or n_cached != len(uniq_keys)):  # 有新文本或有已下架房源的旧条目时重写
+            self._save(uniq_keys, uniq_tokens)
+        return uniq_tokens[inverse].tolist()
+
+    def _save(self, keys: np.ndarray, tokens: np.ndarray) -> None:
+        """写临时文件后原子替换。"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 按原始字节写入定长 key（ndarray.tolist() 会截掉末尾的 \x00）
+        key_col = pa.FixedSizeBinaryArray.from_buffers(pa.binary(KEY_BYTES), len(keys), [None, pa.py_buffer(keys.tobytes())])
+        table = pa.table({"key": key_col, "tokens": pa.array(tokens.tolist(), type=pa.string())})
+        fd, tmp = tempfile.mkstemp(prefix=".corpus-", suffix=".parquet", dir=self.path.parent)
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp)
+            os.replace(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def build_corpus(
+    df: pd.DataFrame, cache: CorpusCache | None = None, persist: bool = True, parallel: bool = True
+) -> list[str]:
+    """df → 语料（每行一个空格分隔的 token 串），BM25 与向量索引共用同一份。
+
+    cache 为 None 时只在内存中分词（如上传会话，应传 parallel=False 串行分词）；否则先查磁盘缓存，只对新增/变更的文档分词。
+    """
+    texts = document_texts(df)
+    if cache is None:
+        return tokenize_texts(texts, parallel=parallel)
+    return cache.tokens(texts, persist=persist)
+
+
+def main() -> None:
+    """CLI 入口：为默认库生成/刷新分词缓存，之后 build_bm25 与 build_vectors 直接复用。"""
+    parser = argparse.ArgumentParser(description="Tokenize the processed listings once and cache the token streams")
+    parser.add_argument("--workers", type=int, default=None, help="分词进程数，缺省为 settings.corpus_workers / CPU 核数")
+    args = parser.parse_args()
+    df = pd.read_parquet(settings.paths.processed_parquet)
+    CorpusCache().tokens(document_texts(df), workers=args.workers)
+    print(f"Saved token streams for {len(df)} listings to {settings.paths.corpus_tokens}")
+
+
+if __name__ == "__main__":
+    main()
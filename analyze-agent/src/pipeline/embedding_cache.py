@@ -0,0 +1,99 @@
+"""Disk-backed per-text embedding cache so index rebuilds only embed new or changed listings."""
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Any, Sequence
+
+import faiss
+import numpy as np
+
+from src.config import settings
+from src.utils.text_utils import KEY_BYTES, text_key  # 键为分词后的语料文本（build_corpus 的输出）
+
+
+class EmbeddingCache:
+    """按 (模型名, 文本哈希) 缓存向量，每个模型一个结构化 .npy 文件（key 升序 + 向量），以 mmap 方式读取。
+
+    向量默认以 float16 存储（体积减半），读出后转回 float32 并重新归一化；
+    新编码的向量也走同一转换，保证命中与否得到的索引完全一致。
+    """
+
+    def __init__(self, model_name: str, root: Path | None = None, dtype: str | None = None) -> None:
+        self.model_name = model_name
+        self.root = Path(root or settings.paths.embedding_cache_dir)
+        self.dtype = np.dtype(dtype or settings.embedding_cache_dtype)
+        slug = re.sub(r"[^0-9A-Za-z_.-]+", "_", model_name)
+        self.path = self.root / f"{slug}.{self.dtype.name}.npy"
+
+    def _load(self, dim: int) -> np.ndarray | None:
+        if not self.path.exists():
+            return None
+        table = np.load(self.path, mmap_mode="r")
+        if table.dtype.names != ("key", "vec") or table.dtype["vec"].shape != (dim,):
+            print(f"Embedding cache {self.path.name} has a different layout, ignoring it")
+            return None
+        return table
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        """按存储精度取整后转回 float32 并归一化。"""
+        out = np.ascontiguousarray(vectors.astype(self.dtype).astype("float32"))
+        faiss.normalize_L2(out)
+        return out
+
+    def encode(
+        self,
+        corpus: Sequence[str],
+        model: Any,
+        batch_size: int = 64,
+        show_progress_bar: bool = True,
+        persist: bool = True,
+    ) -> np.ndarray:
+        """返回 corpus 的归一化向量：命中缓存的直接读取，其余用 model 编码后写回缓存。
+
+        写回时缓存只保留本次语料涉及的文本，体积随语料规模而不是历史累计增长；
+        只编码少量增量文本时传 persist=False，只读缓存、不重写整个文件。
+        """
+        dim = model.get_sentence_embedding_dimension()
+        keys = np.array([text_key(t) for t in corpus], dtype=f"S{KEY_BYTES}")
+        uniq_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        stored = np.empty((len(uniq_keys), dim), dtype=self.dtype)  # 按存储精度取整的模型输出，即缓存文件内容
+
+        hit = np.zeros(len(uniq_keys), dtype=bool)
+        table = self._load(dim)
+        n_cached = 0 if table is None else len(table)
+        if n_cached:
+            cached_keys = np.array(table["key"])  # 拷贝而非 mmap 视图，否则 del table 后映射仍未释放
+            pos = np.minimum(np.searchsorted(cached_keys, uniq_keys), len(table) - 1)
+            hit = cached_keys[pos] == uniq_keys
+            stored[hit] = table["vec"][pos[hit]]
+        del table  # 释放 mmap，之后才能替换文件
+
+        miss = np.flatnonzero(~hit)
+        if miss.size:
+            texts = [corpus[i] for i in first[miss]]
+            fresh = model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar, normalize_embeddings=True)
+            stored[miss] = np.asarray(fresh, dtype="float32")
+        print(f"Embedding cache ({self.model_name}): {int(hit.sum())} hits, {miss.size} misses, {len(keys) - len(uniq_keys)} duplicates")
+
+        if persist and (miss.size or n_cached != len(uniq_keys)):  # 有新文本或有已下架房源的旧条目时重写
+            self._save(uniq_keys, stored)
+        uniq_vecs = self._normalize(stored)  # 命中与新编码的向量从同一份存储值归一化，逐位一致
+        return uniq_vecs[inverse]
+
+    def _save(self, keys: np.ndarray, vectors: np.ndarray) -> None:
+        """写临时文件后原子替换，构建中断不会留下半截缓存。"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        table = np.empty(len(keys), dtype=[("key", f"S{KEY_BYTES}"), ("vec", self.dtype, (vectors.shape[1],))])
+        table["key"] = keys  # np.unique 输出已升序
+        table["vec"] = vectors
+        fd, tmp = tempfile.mkstemp(prefix=".emb-", suffix=".npy", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.save(fh, table)
+            os.replace(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -63,4 +63,5 @@ def parse_uploaded_excel(file: Union[str, IO[bytes]]) -> pd.DataFrame:
 
     # 调用预处理逻辑
     df_clean = preprocess_dataframe(df_raw)
-    return df_clean
+    # 行号需与会话索引中的文档位置一一对应（dropna 后会留下空洞）
+    return df_clean.reset_index(drop=True)
@@ -0,0 +1,194 @@
+"""Incremental upsert / delete of listings across the parquet table, BM25 and vector indexes."""
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable
+
+import faiss
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.config import settings
+from src.pipeline.build_bm25 import add_bm25_segment, bm25_delta_docs, build_bm25_from_dataframe, delete_bm25_docs
+from src.pipeline.corpus import CorpusCache, build_corpus
+from src.pipeline.embedding_cache import EmbeddingCache
+from src.pipeline.excel_parser import COLUMN_MAP
+from src.pipeline.model_registry import get_embedding_model
+from src.pipeline.preprocess import preprocess_dataframe, read_raw
+from src.pipeline.vector_index import describe_index, unwrap_id_map
+
+
+@dataclass
+class ChangeStats:
+    """一次增量变更的结果统计。"""
+
+    upserted: int = 0
+    deleted: int = 0
+    not_found: int = 0  # 请求删除但库中不存在的 id
+    live_docs: int = 0
+    delta_docs: int = 0
+    tombstones: int = 0
+    compacted: bool = False
+
+
+class ListingStore:
+    """默认库的 parquet / BM25 / 向量索引三件套，按文档槽位（DataFrame 索引标签 = FAISS id = BM25 列号）对齐。
+
+    新增或更新的房源分配新的槽位（单调递增，不复用），旧槽位在 BM25 打墓碑、在向量索引中物理删除。
+    """
+
+    def __init__(self) -> None:
+        paths = settings.paths
+        for path in (paths.processed_parquet, paths.bm25_index, paths.vector_faiss, paths.vector_meta):
+            if not path.exists():
+                raise FileNotFoundError(f"{path} not found, run the full pipeline (scripts/setup.sh) first")
+        self.df = pd.read_parquet(paths.processed_parquet)
+        self.bm25 = joblib.load(paths.bm25_index)
+        if "postings" not in self.bm25:
+            raise ValueError("BM25 index uses the legacy TF-IDF format, re-run pipeline/build_bm25.py")
+        self.index = faiss.read_index(str(paths.vector_faiss))
+        self.meta = joblib.load(paths.vector_meta)
+        _, id_map = unwrap_id_map(self.index)
+        if id_map is None:
+            raise ValueError("vector index is not addressed by listing slots, re-run pipeline/build_vectors.py")
+        if describe_index(self.index)["index_type"] == "hnsw":
+            raise ValueError("HNSW index does not support deletes, use flat/ivf_flat/ivf_pq or rebuild in full")
+        self.next_slot = max(
+            int(self.bm25["n_docs"]),
+            int(self.df.index.max()) + 1 if len(self.df) else 0,
+            int(id_map.max()) + 1 if id_map.size else 0,
+        )
+
+    def _remove(self, listing_ids: Iterable[str]) -> int:
+        slots = self.df.index[self.df["id"].isin(list(listing_ids))].to_numpy(dtype=np.int64)
+        if slots.size:
+            self.df = self.df.drop(index=slots)
+            delete_bm25_docs(self.bm25, slots)
+            self.index.remove_ids(faiss.IDSelectorBatch(slots))
+        return int(slots.size)
+
+    def delete(self, listing_ids: Iterable[str]) -> int:
+        """按房源 id 删除，返回实际删除条数。"""
+        return self._remove(listing_ids)
+
+    def upsert(self, rows: pd.DataFrame) -> int:
+        """新增或整行覆盖房源（按 id 匹配），返回写入条数；rows 为原始字段，内部完成清洗。"""
+        rows = _as_stored(preprocess_dataframe(rows.rename(columns=lambda c: COLUMN_MAP.get(c, c))))
+        rows = rows.drop_duplicates(subset="id", keep="last")
+        if rows.empty:
+            return 0
+        self._remove(rows["id"])
+        slots = np.arange(self.next_slot, self.next_slot + len(rows), dtype=np.int64)
+        self.next_slot += len(rows)
+        rows.index = slots
+        self.df = pd.concat([self.df, rows])
+
+        corpus = build_corpus(rows, CorpusCache(), persist=False)  # 只读缓存，BM25 段与向量共用一次分词
+        add_bm25_segment(self.bm25, rows, slots, corpus=corpus)
+        model_name = self.meta.get("model_name", settings.semantic_model)
+        cache = EmbeddingCache(model_name)  # 只读缓存：命中的文本不再编码
+        embeddings = cache.encode(corpus, get_embedding_model(model_name), show_progress_bar=False, persist=False)
+        self.index.add_with_ids(embeddings, slots)
+        return len(rows)
+
+    def needs_compaction(self) -> bool:
+        churn = bm25_delta_docs(self.bm25) + len(self.bm25.get("deleted", ()))
+        return churn > settings.bm25_compact_ratio * max(len(self.df), 1)
+
+    def compact(self) -> None:
+        """按存活文档重建 BM25（重新统计词表/idf/avgdl，清空增量段与墓碑），槽位保持不变。"""
+        corpus = build_corpus(self.df, CorpusCache(), persist=False)  # 未变更的房源命中分词缓存
+        self.bm25 = build_bm25_from_dataframe(
+            self.df, doc_ids=self.df.index.to_numpy(), n_slots=self.next_slot, corpus=corpus
+        )
+
+    def save(self) -> None:
+        """逐个文件写临时文件再原子替换；parquet 最后写入，作为本次变更的提交点。"""
+        paths = settings.paths
+        self.meta.update({"ids": self.df.index.tolist(), "index_params": describe_index(self.index)})
+        _atomic_write(paths.vector_faiss, lambda p: faiss.write_index(self.index, str(p)))
+        _atomic_write(paths.vector_meta, lambda p: joblib.dump(self.meta, p))
+        _atomic_write(paths.bm25_index, lambda p: joblib.dump(self.bm25, p))
+        _atomic_write(paths.processed_parquet, lambda p: self.df.to_parquet(p, index=True))  # 保留槽位标签
+
+    def stats(self) -> ChangeStats:
+        return ChangeStats(
+            live_docs=len(self.df),
+            delta_docs=bm25_delta_docs(self.bm25),
+            tombstones=len(self.bm25.get("deleted", ())),
+        )
+
+
+def apply_changes(
+    upserts: pd.DataFrame | None = None, deletes: Iterable[str] = (), compact: bool | None = None
+) -> ChangeStats:
+    """对默认库执行一批增量变更并持久化；compact 缺省按 settings.bm25_compact_ratio 自动判断。"""
+    store = ListingStore()
+    deletes = list(deletes)
+    deleted = store.delete(deletes) if deletes else 0
+    upserted = store.upsert(upserts) if upserts is not None else 0
+    compacted = store.needs_compaction() if compact is None else compact
+    if compacted:
+        store.compact()
+    store.save()
+    stats = store.stats()
+    stats.upserted, stats.deleted, stats.not_found, stats.compacted = upserted, deleted, len(deletes) - deleted, compacted
+    return stats
+
+
+def read_changes(path: Path) -> pd.DataFrame:
+    """读取变更文件（.parquet / .csv / Excel）。"""
+    return read_raw(path)
+
+
+def _as_stored(df: pd.DataFrame) -> pd.DataFrame:
+    """经一次 parquet 往返，使新行与从 parquet 读出的存量行表示一致（如 tags 列为数组），全量重建结果不变。"""
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    buf.seek(0)
+    return pd.read_parquet(buf)
+
+
+def _atomic_write(path: Path, write: Callable[[Path], None]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}-", dir=path.parent)
+    os.close(fd)
+    try:
+        write(Path(tmp))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def main() -> None:
+    """CLI 入口：增量更新默认库。"""
+    parser = argparse.ArgumentParser(description="Upsert / delete listings without rebuilding the indexes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("upsert", help="新增或覆盖房源（按 id 匹配）")
+    up.add_argument("path", type=Path, help="变更文件：.parquet / .csv / .xlsx")
+    rm = sub.add_parser("delete", help="按房源 id 删除")
+    rm.add_argument("ids", nargs="+")
+    sub.add_parser("compact", help="立即压缩 BM25 增量段与墓碑")
+    args = parser.parse_args()
+
+    if args.command == "upsert":
+        stats = apply_changes(upserts=read_changes(args.path))
+    elif args.command == "delete":
+        stats = apply_changes(deletes=args.ids)
+    else:
+        stats = apply_changes(compact=True)
+    print(
+        f"upserted={stats.upserted} deleted={stats.deleted} not_found={stats.not_found} live={stats.live_docs} "
+        f"delta_docs={stats.delta_docs} tombstones={stats.tombstones} compacted={stats.compacted}"
+    )
+
+
+if __name__ == "__main__":
+    main()
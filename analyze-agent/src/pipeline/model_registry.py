@@ -0,0 +1,94 @@
+"""Process-wide registry of sentence-transformers models shared by build and retrieval."""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+
+from sentence_transformers import SentenceTransformer
+
+from src.config import settings
+
+_WARMUP_TEXTS = ["北京 海淀 两室 近地铁 学区房", "南北通透 精装修 采光好"]
+
+
+@dataclass
+class ModelStats:
+    """单个模型的加载统计。"""
+
+    name: str
+    device: str
+    load_seconds: float
+    warmup_seconds: float | None = None
+    param_bytes: int = 0  # 参数 + buffer 占用的内存（字节）
+    encode_dim: int | None = None
+
+
+class ModelRegistry:
+    """每个模型名在进程内只加载一次；build_vectors、SemanticEngine 与会话上下文共用同一实例。"""
+
+    def __init__(self) -> None:
+        self._models: Dict[str, SentenceTransformer] = {}
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def get(self, model_name: str | None = None) -> SentenceTransformer:
+        """返回已加载的模型，首次请求时加载；同名并发请求只加载一次，不同模型互不阻塞。"""
+        model_name = model_name or settings.semantic_model
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+        with self._lock:
+            name_lock = self._loading.setdefault(model_name, threading.Lock())
+        with name_lock:
+            if model_name not in self._models:
+                t0 = time.perf_counter()
+                model = SentenceTransformer(model_name)
+                load_seconds = time.perf_counter() - t0
+                self._stats[model_name] = ModelStats(
+                    name=model_name,
+                    device=str(model.device),
+                    load_seconds=load_seconds,
+                    param_bytes=_model_bytes(model),
+                    encode_dim=model.get_sentence_embedding_dimension(),
+                )
+                self._models[model_name] = model
+                print(f"[model-registry] loaded {model_name} in {load_seconds:.1f}s")
+        return self._models[model_name]
+
+    def warm_up(self, model_name: str | None = None) -> ModelStats:
+        """加载模型并做一次小批量编码，触发权重分页、算子初始化，首个真实请求不再承担这部分开销。"""
+        model_name = model_name or settings.semantic_model
+        model = self.get(model_name)
+        t0 = time.perf_counter()
+        model.encode(_WARMUP_TEXTS, normalize_embeddings=True)
+        stats = self._stats[model_name]
+        stats.warmup_seconds = time.perf_counter() - t0
+        return stats
+
+    def is_loaded(self, model_name: str | None = None) -> bool:
+        return (model_name or settings.semantic_model) in self._models
+
+    def stats(self) -> List[dict]:
+        """各已加载模型的统计（加载/预热耗时、设备、参数内存）。"""
+        return [asdict(s) for s in self._stats.values()]
+
+
+def _model_bytes(model: SentenceTransformer) -> int:
+    """参数与 buffer 的总字节数（torch 模块）；非 torch 实现返回 0。"""
+    total = 0
+    for tensors in (getattr(model, "parameters", None), getattr(model, "buffers", None)):
+        if tensors is None:
+            continue
+        total += sum(t.numel() * t.element_size() for t in tensors())
+    return total
+
+
+registry = ModelRegistry()
+
+
+def get_embedding_model(model_name: str | None = None) -> SentenceTransformer:
+    """取共享的 embedding 模型实例（缺省为 settings.semantic_model）。"""
+    return registry.get(model_name)
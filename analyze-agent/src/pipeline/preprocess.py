@@ -1,12 +1,44 @@
 """预处理房源数据并写入 Parquet。"""
 from __future__ import annotations
 
+import argparse
+import os
+import time
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from src.config import settings
+from src.pipeline.build_dataset import build_dataset
+from src.ranking.scoring import add_static_quality_columns
+
+
+NUMERIC_FIELDS = [
+    "total_price",
+    "unit_price",
+    "management_fee",
+    "bedrooms",
+    "livingrooms",
+    "bathrooms",
+    "area",
+    "usable_area",
+    "floor",
+    "total_floors",
+    "year_built",
+    "distance_to_subway",
+    "distance_to_school",
+    "distance_to_park",
+    "lat",
+    "lon",
+    "quality_score",
+    "subway_score",
+    "school_score",
+    "promotion_weight",
+]
 
 
 def _normalize_tags(raw: Iterable[str]) -> list[str]:
@@ -31,7 +63,8 @@ def preprocess_dataframe(df_raw: pd.DataFrame) -> pd.DataFrame:
     list_fields = ["tags"]
     for col in list_fields:
         if col in df.columns:
-            df[col] = df[col].apply(lambda x: _normalize_tags(x if isinstance(x, list) else [x]))
+            # parquet 读出的列表列为 ndarray（如增量变更文件），与 list 同样处理
+            df[col] = df[col].apply(lambda x: _normalize_tags(list(x) if isinstance(x, (list, np.ndarray)) else [x]))
 
     # 布尔字段
     bool_fields = ["tax_included", "elevator", "parking", "school_district"]
@@ -40,53 +73,232 @@ def preprocess_dataframe(df_raw: pd.DataFrame) -> pd.DataFrame:
             df[col] = df[col].astype("boolean")
 
     # 数值字段
-    numeric_cols = [
-        "total_price",
-        "unit_price",
-        "management_fee",
-        "bedrooms",
-        "livingrooms",
-        "bathrooms",
-        "area",
-        "usable_area",
-        "floor",
-        "total_floors",
-        "year_built",
-        "distance_to_subway",
-        "distance_to_school",
-        "distance_to_park",
-        "lat",
-        "lon",
-        "quality_score",
-        "subway_score",
-        "school_score",
-        "promotion_weight",
-    ]
-    for col in numeric_cols:
+    for col in NUMERIC_FIELDS:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce")
 
     # 必填字段缺失则丢弃
     df.dropna(subset=["id", "city", "district"], inplace=True)
+
+    # 预计算与查询无关的质量子分数，请求期只需计算价格/面积两项
+    add_static_quality_columns(df)
     return df
 
 
-def preprocess(input_path: Path | None = None, output_path: Path | None = None) -> Path:
-    """读取 Excel，清洗字段并写入 Parquet。"""
+def preprocess(
+    input_path: Path | None = None, output_path: Path | None = None, chunk_rows: int | None = None
+) -> Path:
+    """读取原始房源（Excel / CSV / Parquet），清洗字段并写入 Parquet；指定 chunk_rows 时改走流式分块路径。"""
     src_path = input_path or settings.paths.raw_excel
     dst_path = output_path or settings.paths.processed_parquet
+    if chunk_rows:
+        return preprocess_streaming(src_path, dst_path, chunk_rows)
     dst_path.parent.mkdir(parents=True, exist_ok=True)
 
-    df_raw = pd.read_excel(src_path)
+    df_raw = read_raw(src_path)
     clean_df = preprocess_dataframe(df_raw)
     clean_df.to_parquet(dst_path, index=False)
     return dst_path
 
 
+def read_raw(path: Path) -> pd.DataFrame:
+    """整表读取原始房源文件（.parquet / .csv / Excel）。"""
+    suffix = path.suffix.lower()
+    if suffix == ".parquet":
+        return pd.read_parquet(path)
+    if suffix == ".csv":
+        return pd.read_csv(path)
+    return pd.read_excel(path)
+
+
+def iter_raw_chunks(path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """按块读取原始房源（.xlsx / .csv / .parquet），每块至多 chunk_rows 行，内存占用与文件大小无关。"""
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    elif suffix == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif suffix in (".xlsx", ".xlsm"):
+        yield from _iter_excel_chunks(path, chunk_rows)
+    else:  # .xls 等 openpyxl 不支持的格式只能整表读入后再分块
+        print(f"[ingest] {suffix} cannot be streamed, reading the whole workbook")
+        df = pd.read_excel(path)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start : start + chunk_rows]
+
+
+def _iter_excel_chunks(path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """openpyxl 只读模式逐行读取首个工作表，首行为表头。"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        buf: list[tuple] = []
+        for row in rows:
+            if all(v is None for v in row):  # read_excel 同样跳过空行
+                continue
+            buf.append(row)
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame.from_records(buf, columns=columns)
+                buf = []
+        if buf:
+            yield pd.DataFrame.from_records(buf, columns=columns)
+    finally:
+        wb.close()
+
+
+class _TypeConflict(Exception):
+    """后续块中若干列无法无损转换为首块推断的类型；columns 为列名 → 放宽后的类型。"""
+
+    def __init__(self, columns: dict[str, pa.DataType]) -> None:
+        super().__init__(", ".join(columns))
+        self.columns = columns
+
+
+def _writer_schema(table: pa.Table, overrides: dict[str, pa.DataType]) -> pa.Schema:
+    """由首块推断输出 schema：全空列按字符串写出，overrides 为此前冲突后放宽的列类型。"""
+    fields = []
+    for f in table.schema:
+        if f.name in overrides:
+            f = f.with_type(overrides[f.name])
+        elif pa.types.is_null(f.type):
+            f = f.with_type(pa.string())
+        elif pa.types.is_list(f.type) and pa.types.is_null(f.type.value_type):
+            f = f.with_type(pa.list_(pa.string()))
+        fields.append(f)
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """补齐缺失列并按 schema 安全转换类型，保证各 row group 类型一致；一次报告该块所有冲突列。"""
+    columns = []
+    conflicts: dict[str, pa.DataType] = {}
+    for f in schema:
+        if f.name not in table.column_names:
+            columns.append(pa.nulls(len(table), f.type))
+            continue
+        try:
+            columns.append(table.column(f.name).cast(f.type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            conflicts[f.name] = pa.float64() if pa.types.is_integer(f.type) else pa.string()
+    if conflicts:
+        raise _TypeConflict(conflicts)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _scan_conflicts(
+    chunks: Iterator[pd.DataFrame], first: pa.Table, overrides: dict[str, pa.DataType], found: dict[str, pa.DataType]
+) -> None:
+    """出现冲突后不再写出，只把剩余块检查完，把所有需要放宽的列（含逐级放宽）收集到 found。"""
+    for chunk in chunks:
+        table = pa.Table.from_pandas(preprocess_dataframe(chunk), preserve_index=False)
+        while True:
+            try:
+                _conform(table, _writer_schema(first, {**overrides, **found}))
+                break
+            except _TypeConflict as e:  # 整数列放宽为 float64 后仍可能混入文本，再放宽为字符串
+                found.update(e.columns)
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux 下单位为 KB
+
+
+def _stream_once(
+    input_path: Path, tmp_path: Path, chunk_rows: int, overrides: dict[str, pa.DataType]
+) -> tuple[int, int]:
+    """单趟流式写出，返回 (读入行数, 保留行数)。
+
+    遇到类型冲突时停止写出，但继续检查剩余各块，最后一次性抛出含全部冲突列的 _TypeConflict，
+    因此整个预处理最多重跑一遍。
+    """
+    writer: pq.ParquetWriter | None = None
+    first: pa.Table | None = None
+    rows_in = rows_out = 0
+    t0 = time.perf_counter()
+    try:
+        chunks = iter_raw_chunks(input_path, chunk_rows)
+        for chunk in chunks:
+            rows_in += len(chunk)
+            clean = preprocess_dataframe(chunk)
+            table = pa.Table.from_pandas(clean, preserve_index=False)
+            if writer is None:
+                first = table.schema.empty_table()
+                writer = pq.ParquetWriter(tmp_path, _writer_schema(table, overrides))
+            try:
+                writer.write_table(_conform(table, writer.schema), row_group_size=chunk_rows)
+            except _TypeConflict as e:
+                found = dict(e.columns)
+                print(f"[ingest] columns {sorted(found)} do not fit the first chunk's types, checking the remaining chunks")
+                _scan_conflicts(chunks, first, overrides, found)
+                raise _TypeConflict(found) from None
+            rows_out += len(clean)
+            print(f"[ingest] {rows_in:,} rows read, {rows_out:,} kept, {rows_in / (time.perf_counter() - t0):,.0f} rows/s")
+        if writer is None:  # 空文件：与整表路径一致地写出空 parquet
+            preprocess_dataframe(pd.DataFrame(columns=["id", "city", "district"])).to_parquet(tmp_path, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows_in, rows_out
+
+
+def preprocess_streaming(input_path: Path, output_path: Path, chunk_rows: int | None = None) -> Path:
+    """流式预处理：逐块清洗并追加为 parquet row group，峰值内存只取决于块大小。
+
+    列类型取自首块（与整表路径一致，如无缺失的整数列保持 int64）；若后续块无法无损转换
+    （整数列出现小数、数值列混入文本），收集全部冲突列、一次放宽后重新处理一遍。
+    """
+    chunk_rows = chunk_rows or settings.ingest_chunk_rows
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    overrides: dict[str, pa.DataType] = {}
+    t0 = time.perf_counter()
+    try:
+        while True:
+            try:
+                rows_in, rows_out = _stream_once(input_path, tmp_path, chunk_rows, overrides)
+                break
+            except _TypeConflict as e:
+                overrides.update(e.columns)
+                widened = ", ".join(f"{c} as {t}" for c, t in e.columns.items())
+                print(f"[ingest] restarting with widened columns: {widened}")
+        os.replace(tmp_path, output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    elapsed = time.perf_counter() - t0
+    peak = _peak_rss_mb()
+    print(
+        f"[ingest] {rows_out:,}/{rows_in:,} rows -> {output_path} in {elapsed:.1f}s "
+        f"({rows_in / max(elapsed, 1e-9):,.0f} rows/s" + (f", peak RSS {peak:,.0f}MB)" if peak else ")")
+    )
+    return output_path
+
+
 def main() -> None:
     """CLI 入口：执行预处理。"""
-    saved = preprocess()
+    parser = argparse.ArgumentParser(description="Clean raw listings into the processed parquet")
+    parser.add_argument("--input", type=Path, default=None, help="原始房源文件（.xlsx / .csv / .parquet），缺省为 data/raw/listings.xlsx")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--stream", action="store_true", help="分块流式处理，适用于超大导出文件")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="每块行数（缺省 settings.ingest_chunk_rows，指定即启用流式）")
+    parser.add_argument("--no-dataset", action="store_true", help="不生成 city/district 分区数据集")
+    args = parser.parse_args()
+    chunk_rows = args.chunk_rows or (settings.ingest_chunk_rows if args.stream else None)
+    saved = preprocess(args.input, args.output, chunk_rows=chunk_rows)
     print(f"Preprocessed data saved to {saved}")
+    if args.output is None and not args.no_dataset:  # 默认库同时写出分区数据集，供下推读取
+        build_dataset(saved)
 
 
 if __name__ == "__main__":
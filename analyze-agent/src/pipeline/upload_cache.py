@@ -0,0 +1,152 @@
+"""Content-addressed on-disk cache of session indexes built from uploaded Excel files."""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import IO, Any, Union
+
+import faiss
+import jieba
+import joblib
+import pandas as pd
+
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.pipeline.build_vectors import build_vectors_from_dataframe
+from src.pipeline.context import SessionDataContext
+from src.pipeline.corpus import CORPUS_VERSION, build_corpus
+from src.pipeline.excel_parser import parse_uploaded_excel
+from src.pipeline.model_registry import get_embedding_model
+from src.retrieval.filter_index import FilterIndex
+
+CACHE_VERSION = 2  # 缓存内容格式变化（解析/索引构建逻辑调整）时递增，旧条目自然失效
+_BUNDLE_FILE = "session.joblib"
+_INDEX_FILE = "vectors.faiss"
+
+
+def read_upload_bytes(file: Union[str, os.PathLike, IO[bytes], Any]) -> bytes:
+    """读取上传文件的原始字节：兼容路径、gradio 临时文件对象（.name）与二进制文件对象。"""
+    if isinstance(file, (str, os.PathLike)):
+        return Path(file).read_bytes()
+    if hasattr(file, "read"):
+        data = file.read()
+        if hasattr(file, "seek"):
+            file.seek(0)
+        return data
+    return Path(file.name).read_bytes()
+
+
+class UploadCache:
+    """上传文件 → (清洗后 DataFrame, BM25 bundle, FAISS 索引) 的磁盘缓存。
+
+    键为文件内容的 sha256 加上影响构建结果的配置（质量权重、分词规则、模型、向量索引类型与参数、BM25 参数），
+    每个条目一个目录；命中时刷新目录 mtime，写入后按 mtime 淘汰直到总大小不超过上限。
+    """
+
+    def __init__(self, root: Path | None = None, max_bytes: int | None = None) -> None:
+        self.root = Path(root or settings.paths.upload_cache_dir)
+        self.max_bytes = max_bytes if max_bytes is not None else settings.upload_cache_max_mb * 2**20
+
+    def key_for(self, data: bytes) -> str:
+        digest = hashlib.sha256(data)
+        config = (
+            CACHE_VERSION,
+            sorted(settings.quality_weights.items()),  # 预处理写入的 static_quality_score
+            CORPUS_VERSION,
+            jieba.__version__,
+            settings.semantic_model,
+            settings.vector_index_type,
+            settings.vector_nlist,
+            settings.vector_nprobe,
+            settings.vector_pq_m,
+            settings.vector_pq_nbits,
+            settings.vector_hnsw_m,
+            settings.vector_hnsw_ef_construction,
+            settings.vector_hnsw_ef_search,
+            settings.bm25_max_features,
+            settings.bm25_ngram,
+            settings.bm25_k1,
+            settings.bm25_b,
+        )
+        digest.update(repr(config).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        """读取缓存条目，返回 {"df", "bm25_index", "vector_index"}；未命中或条目损坏时返回 None。"""
+        entry = self.root / key
+        if not entry.is_dir():
+            return None
+        try:
+            bundle = joblib.load(entry / _BUNDLE_FILE)
+            index = faiss.read_index(str(entry / _INDEX_FILE))
+        except Exception as e:  # 写入中断等导致的残缺条目直接丢弃
+            print(f"[upload-cache] drop broken entry {key[:12]}: {e!r}")
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        now = time.time()
+        os.utime(entry, (now, now))  # LRU：以目录 mtime 记录最近使用时间
+        return {"df": bundle["df"], "bm25_index": bundle["bm25_index"], "vector_index": index}
+
+    def put(self, key: str, df: pd.DataFrame, bm25_bundle: dict, vector_index: faiss.Index) -> None:
+        """先写入临时目录再原子重命名；并发上传同一文件时保留先完成的一份。"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        entry = self.root / key
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=self.root))
+        try:
+            joblib.dump({"df": df, "bm25_index": bm25_bundle}, tmp / _BUNDLE_FILE)
+            faiss.write_index(vector_index, str(tmp / _INDEX_FILE))
+            os.replace(tmp, entry)
+        except OSError as e:
+            if not entry.is_dir():  # 缓存写失败（磁盘满等）不影响本次上传
+                print(f"[upload-cache] failed to store {key[:12]}: {e!r}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self) -> None:
+        """按最近使用时间从旧到新删除条目，直到总大小不超过 max_bytes。"""
+        if not self.root.is_dir():
+            return
+        entries = []
+        for entry in self.root.iterdir():
+            if entry.is_dir() and not entry.name.startswith("."):
+                size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+                entries.append((entry.stat().st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def load_session_context(
+    file: Union[str, os.PathLike, IO[bytes], Any], cache: UploadCache | None = None
+) -> tuple[SessionDataContext, bool]:
+    """解析上传文件并构建会话索引，返回 (上下文, 是否命中缓存)；同一文件再次上传直接读缓存。"""
+    cache = cache or UploadCache()
+    data = read_upload_bytes(file)
+    key = cache.key_for(data)
+    cached = cache.get(key)
+    if cached is not None:
+        df_clean, bm25_bundle, vector_index = cached["df"], cached["bm25_index"], cached["vector_index"]
+        vector_model = get_embedding_model()
+        hit = True
+    else:
+        df_clean = parse_uploaded_excel(io.BytesIO(data))
+        corpus = build_corpus(df_clean, parallel=False)  # 只分词一次，BM25 与向量索引共用；服务进程内不启动进程池
+        bm25_bundle = build_bm25_from_dataframe(df_clean, corpus=corpus)
+        vector_index, vector_model = build_vectors_from_dataframe(df_clean, corpus=corpus)
+        cache.put(key, df_clean, bm25_bundle, vector_index)
+        hit = False
+    if len(df_clean) >= settings.filter_index_min_rows:
+        FilterIndex.for_frame(df_clean)  # 会话内常驻，后续每个请求的过滤都走预建索引
+    context = SessionDataContext(
+        df=df_clean, bm25_index=bm25_bundle, vector_index={"index": vector_index, "model": vector_model}
+    )
+    return context, hit
@@ -0,0 +1,108 @@
+"""FAISS index factory for the semantic vector index (Flat / IVF-Flat / IVF-PQ / HNSW)."""
+from __future__ import annotations
+
+import faiss
+import numpy as np
+
+from src.config import settings
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def resolve_index_params(n: int, dim: int, index_type: str | None = None) -> dict:
+    """按配置与语料规模确定索引类型及参数；数据量不足以训练时降级。"""
+    index_type = (index_type or settings.vector_index_type).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # faiss 建议每个聚类中心至少 39 个训练样本
+        nlist = min(settings.vector_nlist, n // 39)
+        if nlist < 1:
+            print(f"[vectors] {n} vectors too few to train {index_type}, falling back to flat")
+            return {"index_type": "flat"}
+        params = {"index_type": index_type, "nlist": nlist, "nprobe": min(settings.vector_nprobe, nlist)}
+        if index_type == "ivf_pq":
+            if n < 2 ** settings.vector_pq_nbits:
+                print(f"[vectors] {n} vectors too few to train PQ codebooks, falling back to ivf_flat")
+                params["index_type"] = "ivf_flat"
+                return params
+            # 子空间个数需整除维度，取不超过配置值的最大约数
+            pq_m = max(m for m in range(1, min(settings.vector_pq_m, dim) + 1) if dim % m == 0)
+            params.update({"pq_m": pq_m, "pq_nbits": settings.vector_pq_nbits})
+        return params
+
+    if index_type == "hnsw":
+        return {
+            "index_type": "hnsw",
+            "hnsw_m": settings.vector_hnsw_m,
+            "ef_construction": settings.vector_hnsw_ef_construction,
+            "ef_search": settings.vector_hnsw_ef_search,
+        }
+    return {"index_type": "flat"}
+
+
+def build_faiss_index(embeddings: np.ndarray, index_type: str | None = None, ids: np.ndarray | None = None) -> faiss.Index:
+    """对归一化向量构建内积索引（含训练）。
+
+    传入 ids 时外包 IndexIDMap2，向量按稳定的文档槽位寻址，支持增量删除/追加（HNSW 不支持删除）。
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    n, dim = embeddings.shape
+    params = resolve_index_params(n, dim, index_type)
+    kind = params["index_type"]
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch = params["ef_search"]
+    else:
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, params["nlist"], metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["pq_m"], params["pq_nbits"], metric)
+        index.train(embeddings)
+        index.nprobe = params["nprobe"]
+
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+        return index
+    index.add(embeddings)
+    return index
+
+
+def unwrap_id_map(index: faiss.Index) -> tuple[faiss.Index, np.ndarray | None]:
+    """返回 (内层索引, 外部 id 数组)；未包 IndexIDMap 时 id 即行号，返回 None。"""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index), faiss.vector_to_array(index.id_map)
+    return index, None
+
+
+def describe_index(index: faiss.Index) -> dict:
+    """从索引对象读出类型与参数，随 vector_meta 持久化。"""
+    index, _ = unwrap_id_map(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return {
+            "index_type": "hnsw",
+            "hnsw_m": int(index.hnsw.nb_neighbors(1)),
+            "ef_construction": int(index.hnsw.efConstruction),
+            "ef_search": int(index.hnsw.efSearch),
+        }
+    if isinstance(index, faiss.IndexIVF):
+        params = {"nlist": int(index.nlist), "nprobe": int(index.nprobe)}
+        if isinstance(index, faiss.IndexIVFPQ):
+            params.update({"index_type": "ivf_pq", "pq_m": int(index.pq.M), "pq_nbits": int(index.pq.nbits)})
+        else:
+            params["index_type"] = "ivf_flat"
+        return params
+    return {"index_type": "flat"}
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """索引序列化后的字节数，近似常驻内存占用。"""
+    return int(faiss.serialize_index(index).size)
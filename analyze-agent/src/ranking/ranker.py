@@ -1,9 +1,13 @@
 ﻿"""Ranking orchestrator."""
 from __future__ import annotations
 
+from typing import Dict, Optional
+
+import numpy as np
 import pandas as pd
 
-from src.ranking.scoring import fuse_scores
+from src.ranking.scoring import score_buffers
+from src.utils.array_utils import top_k_indices
 
 
 class Ranker:
@@ -14,5 +18,17 @@ class Ranker:
 
     def rank(self, df: pd.DataFrame, top_k: int = 10) -> pd.DataFrame:
         """融合得分后排序并返回前 top_k。"""
-        scored = fuse_scores(df, weights=self.weights)
-        return scored.sort_values("fused_score", ascending=False).head(top_k).reset_index(drop=True)
+        return self.top(df, top_k=top_k).reset_index(drop=True)
+
+    def top(
+        self, df: pd.DataFrame, top_k: int = 10, retrieval: Optional[Dict[str, np.ndarray]] = None
+    ) -> pd.DataFrame:
+        """同 rank，但保留输入的行标签，便于排序后按行补齐未参与排序的列。
+
+        得分只在与 df 行位置对齐的数组上计算，只有选中的 top_k 行组装为 DataFrame；
+        retrieval 为对齐的 bm25_score / semantic_score 数组，调用方无需先把它们写成 df 的列。
+        """
+        buffers = score_buffers(df, weights=self.weights, retrieval=retrieval)
+        tie_break = df["id"].to_numpy() if "id" in df.columns else None
+        top = top_k_indices(buffers["fused_score"], top_k, tie_break=tie_break)  # 同分按房源 id
+        return buffers.frame(df, top)
@@ -33,7 +33,7 @@ def _linear_norm(value: float, min_v: float, max_v: float) -> float:
 
 
 def _compute_quality_components(row: pd.Series, user_filters: Dict[str, any]) -> QualityComponents:
-    """按各维度生成 0~1 的质量子分数。"""
+    """按各维度生成 0~1 的质量子分数（单行参考实现，批量打分走列式 compute_quality_components）。"""
     # 价格：贴近预算上限/区间越高
     budget_max = user_filters.get("max_price")
     budget_min = user_filters.get("min_price")
@@ -82,25 +82,9 @@ def _compute_quality_components(row: pd.Series, user_filters: Dict[str, any]) ->
         floor_score = 1 - abs(ratio - 0.5) * 1.5  # 中间层高，顶/底稍降
         floor_score = _clip01(floor_score)
 
-    # 朝向
-    orient = str(row.get("orientation") or "")
-    if "南" in orient:
-        orientation_score = 1.0
-    elif "东" in orient or "西" in orient:
-        orientation_score = 0.6
-    else:
-        orientation_score = 0.4
-
-    # 装修
-    reno = str(row.get("renovation") or "")
-    if "精" in reno:
-        renovation_score = 1.0
-    elif "简" in reno:
-        renovation_score = 0.7
-    elif "毛" in reno:
-        renovation_score = 0.4
-    else:
-        renovation_score = 0.5
+    # 朝向 / 装修
+    orientation_score = _orientation_value(str(row.get("orientation") or ""))
+    renovation_score = _renovation_value(str(row.get("renovation") or ""))
 
     return QualityComponents(
         price=price_score,
@@ -114,81 +98,319 @@ def _compute_quality_components(row: pd.Series, user_filters: Dict[str, any]) ->
     )
 
 
-def compute_quality_scores(df: pd.DataFrame, user_filters: Optional[Dict[str, any]] = None) -> pd.DataFrame:
-    """计算质量子分数并融合为 quality_score。"""
+QUALITY_COMPONENTS = ("price", "area", "age", "subway", "school", "floor", "orientation", "renovation")
+# 只依赖房源本身、可在构建期预计算的子分数
+STATIC_COMPONENTS = ("age", "subway", "school", "floor", "orientation", "renovation")
+STATIC_QUALITY_COLUMN = "static_quality_score"
+# 含预计算列的默认库排序所需的最少列（按列读取数据时使用）
+SCORING_COLUMNS = (
+    "id",
+    "total_price",
+    "area",
+    "promotion_weight",
+    *(f"static_{name}_score" for name in STATIC_COMPONENTS),
+    STATIC_QUALITY_COLUMN,
+)
+# 无预计算列的数据（会话上传）逐项计算子分数所读取的原始列
+QUALITY_INPUT_COLUMNS = (
+    "total_price",
+    "area",
+    "year_built",
+    "distance_to_subway",
+    "school_district",
+    "floor",
+    "total_floors",
+    "orientation",
+    "renovation",
+    "promotion_weight",
+)
+
+
+def _clip01_array(x: np.ndarray) -> np.ndarray:
+    """数组版 _clip01；NaN 与标量版 max(0, min(1, nan)) 的结果一致，取 1.0。"""
+    return np.where(np.isnan(x), 1.0, np.clip(x, 0.0, 1.0))
+
+
+def _numeric_column(df: pd.DataFrame, col: str) -> np.ndarray | None:
+    """取数值列为 float64 数组（缺失为 NaN），列不存在时返回 None。"""
+    if col not in df.columns:
+        return None
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _truthy_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    """按 Python 真值语义把列转为布尔数组（与逐行 `if value` 一致，数值 NaN 为真、pd.NA 为假）。"""
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    series = df[col]
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series.fillna(False).to_numpy(dtype=bool)
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy(dtype="float64", na_value=np.nan) != 0
+    return _map_unique(series, bool, False).astype(bool)
+
+
+def _map_unique(series: pd.Series, fn, na_value) -> np.ndarray:
+    """对低基数列只在去重值上调用 fn，再按编码广播回各行；缺失值取 na_value。"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    table = np.array([fn(u) for u in uniques] + [na_value], dtype="float64")
+    return table[codes]  # 缺失值编码为 -1，恰好取到末尾的 na_value
+
+
+def _orientation_value(orient: str) -> float:
+    if "南" in orient:
+        return 1.0
+    if "东" in orient or "西" in orient:
+        return 0.6
+    return 0.4
+
+
+def _renovation_value(reno: str) -> float:
+    if "精" in reno:
+        return 1.0
+    if "简" in reno:
+        return 0.7
+    if "毛" in reno:
+        return 0.4
+    return 0.5
+
+
+def _price_score_array(df: pd.DataFrame, user_filters: Dict[str, any]) -> np.ndarray:
+    """价格子分数：贴近预算上限/区间越高。"""
+    price = _numeric_column(df, "total_price")
+    if price is None:
+        return np.full(len(df), 0.5)
+    budget_max = user_filters.get("max_price")
+    budget_min = user_filters.get("min_price")
+    if budget_max is None:
+        score = 1 - np.clip(price / (np.where(1 > price, 1.0, price) + 1e-6), 0.0, 1.0) * 0.2
+    else:
+        target = budget_max if budget_min is None else (budget_min + budget_max) / 2
+        score = _clip01_array(1 - np.abs(price - target) / (budget_max * 0.2 + 1e-6))
+        score = np.where(price > budget_max * 1.2, 0.0, score)
+    return np.where(np.isnan(price), 0.5, score)
+
+
+def _area_score_array(df: pd.DataFrame, user_filters: Dict[str, any]) -> np.ndarray:
+    """面积子分数：落在期望区间越高，超出区间平滑下降。"""
+    area = _numeric_column(df, "area")
+    if area is None:
+        return np.full(len(df), 0.5)
+    area_min = user_filters.get("min_area")
+    area_max = user_filters.get("max_area")
+    if area_min is None and area_max is None:
+        score = np.clip(area / 120, 0.0, 1.0)
+    else:
+        # 与逐行实现保持一致：两端都给定时目标取 area_min / 2（运算符优先级所致）
+        if area_max is None:
+            target = area_min if area_min else area
+        else:
+            target = area_min / 2 if area_min else area_max
+        scale = area_max * 0.3 if area_max else area * 0.3
+        score = _clip01_array(1 - np.abs(area - target) / (scale + 1e-6))
+    return np.where(np.isnan(area), 0.5, score)
+
+
+def _static_component_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """只依赖房源本身的六个子分数（年代/地铁/学区/楼层/朝向/装修）。"""
+    n = len(df)
+
+    year_built = _numeric_column(df, "year_built")
+    if year_built is None:
+        age = np.full(n, 0.5)
+    else:
+        age = np.where(np.isnan(year_built), 0.5, np.clip((year_built - 1990) / (2025 - 1990), 0.0, 1.0))
+
+    dist_subway = _numeric_column(df, "distance_to_subway")
+    if dist_subway is None:
+        subway = np.ones(n)
+    else:
+        subway = np.where(np.isnan(dist_subway), 1.0, np.clip((2.0 - dist_subway) / 1.8, 0.0, 1.0))
+
+    school = _truthy_column(df, "school_district").astype("float64")
+
+    floor = _numeric_column(df, "floor")
+    if floor is None:
+        floor = np.zeros(n)
+    total_floors = _numeric_column(df, "total_floors")
+    fallback_total = np.where(1 > floor, 1.0, floor)  # max(floor, 1)，NaN 保持 NaN
+    if total_floors is None:
+        total_floors = fallback_total
+    else:
+        total_floors = np.where(total_floors == 0, fallback_total, total_floors)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = floor / total_floors
+    floor_score = np.where(total_floors <= 1, 0.5, _clip01_array(1 - np.abs(ratio - 0.5) * 1.5))
+
+    if "orientation" in df.columns:
+        orientation = _map_unique(df["orientation"], lambda v: _orientation_value(str(v)), _orientation_value(""))
+    else:
+        orientation = np.full(n, _orientation_value(""))
+
+    if "renovation" in df.columns:
+        renovation = _map_unique(df["renovation"], lambda v: _renovation_value(str(v)), _renovation_value(""))
+    else:
+        renovation = np.full(n, _renovation_value(""))
+
+    return {
+        "age": age,
+        "subway": subway,
+        "school": school,
+        "floor": floor_score,
+        "orientation": orientation,
+        "renovation": renovation,
+    }
+
+
+def add_static_quality_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """构建期预计算与查询无关的六个子分数及其加权和，写入 static_*_score / static_quality_score 列。
+
+    就地添加列并返回 df；修改 settings.quality_weights 中这六项权重后需重新运行 preprocess。
+    """
+    components = _static_component_arrays(df)
+    w = settings.quality_weights
+    partial = np.zeros(len(df))
+    for name in STATIC_COMPONENTS:
+        df[f"static_{name}_score"] = components[name]
+        partial = partial + components[name] * w.get(name, 0)
+    df[STATIC_QUALITY_COLUMN] = partial
+    return df
+
+
+def _has_static_columns(df: pd.DataFrame) -> bool:
+    return STATIC_QUALITY_COLUMN in df.columns and all(f"static_{name}_score" in df.columns for name in STATIC_COMPONENTS)
+
+
+def compute_quality_components(df: pd.DataFrame, user_filters: Optional[Dict[str, any]] = None) -> Dict[str, np.ndarray]:
+    """列式计算八个质量子分数，返回 {维度: 与 df 行对齐的数组}；静态子分数优先取预计算列。"""
     user_filters = user_filters or {}
-    records = []
-    for _, row in df.iterrows():
-        comp = _compute_quality_components(row, user_filters)
-        w = settings.quality_weights
-        quality_score = (
-            comp.price * w.get("price", 0)
-            + comp.area * w.get("area", 0)
-            + comp.age * w.get("age", 0)
-            + comp.subway * w.get("subway", 0)
-            + comp.school * w.get("school", 0)
-            + comp.floor * w.get("floor", 0)
-            + comp.orientation * w.get("orientation", 0)
-            + comp.renovation * w.get("renovation", 0)
-        )
-        quality_score = _clip01(quality_score)
-        record = row.to_dict()
-        record.update({
-            "quality_score": quality_score,
-            "price_score": comp.price,
-            "area_score": comp.area,
-            "age_score": comp.age,
-            "subway_score": comp.subway,
-            "school_score": comp.school,
-            "floor_score": comp.floor,
-            "orientation_score": comp.orientation,
-            "renovation_score": comp.renovation,
-        })
-        records.append(record)
-    return pd.DataFrame(records)
-
-
-def _normalize_scores(scores: pd.Series) -> pd.Series:
-    if scores.empty:
+    components = {
+        "price": _price_score_array(df, user_filters),
+        "area": _area_score_array(df, user_filters),
+    }
+    if _has_static_columns(df):
+        components.update({name: df[f"static_{name}_score"].to_numpy(dtype="float64") for name in STATIC_COMPONENTS})
+    else:
+        components.update(_static_component_arrays(df))
+    return components
+
+
+def _quality_score_array(df: pd.DataFrame, components: Dict[str, np.ndarray]) -> np.ndarray:
+    """按 settings.quality_weights 融合子分数为 0~1 的质量分；df 含预计算列时直接取 static_quality_score。"""
+    w = settings.quality_weights
+    if _has_static_columns(df):
+        static_partial = df[STATIC_QUALITY_COLUMN].to_numpy(dtype="float64")
+    else:
+        static_partial = np.zeros(len(df))
+        for name in STATIC_COMPONENTS:
+            static_partial = static_partial + components[name] * w.get(name, 0)
+    quality_score = components["price"] * w.get("price", 0) + components["area"] * w.get("area", 0) + static_partial
+    return _clip01_array(quality_score)
+
+
+def compute_quality_scores(df: pd.DataFrame, user_filters: Optional[Dict[str, any]] = None) -> pd.DataFrame:
+    """计算质量子分数并融合为 quality_score（列式实现，与逐行 _compute_quality_components 等价）。
+
+    df 含预计算列时请求期只计算价格/面积两项，其余直接取 static_quality_score。
+    """
+    components = compute_quality_components(df, user_filters)
+    scored = df.copy()
+    scored["quality_score"] = _quality_score_array(df, components)
+    for name in QUALITY_COMPONENTS:
+        scored[f"{name}_score"] = components[name]
+    return scored
+
+
+def _normalize_array(scores: np.ndarray) -> np.ndarray:
+    """min-max 归一化；全部相同时为 0。"""
+    if scores.size == 0:
         return scores
     min_v = scores.min()
     max_v = scores.max()
     if max_v == min_v:
-        return pd.Series(0.0, index=scores.index)
+        return np.zeros(scores.size)
     return (scores - min_v) / (max_v - min_v)
 
 
-def fuse_scores(df: pd.DataFrame, weights: dict | None = None, query_context: Optional[Dict[str, any]] = None) -> pd.DataFrame:
-    """归一化 BM25/语义，融合质量分并应用 promotion 乘性提升。"""
+class ScoreBuffers:
+    """与候选行位置对齐的打分数组：各阶段只写数组、不复制候选 DataFrame，最后只为需要的行组装得分列。
+
+    列名与写入顺序与 fuse_scores 输出的得分列一致。
+    """
+
+    def __init__(self, n_rows: int) -> None:
+        self.n_rows = n_rows
+        self.arrays: Dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __setitem__(self, name: str, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype="float64")
+        if values.shape != (self.n_rows,):
+            raise ValueError(f"score buffer {name!r} has shape {values.shape}, expected ({self.n_rows},)")
+        self.arrays[name] = values
+
+    def frame(self, df: pd.DataFrame, positions: np.ndarray | None = None) -> pd.DataFrame:
+        """取 df 的 positions 行（缺省为全部行）并写入得分列；df 已有的同名列原位覆盖，其余追加在后。"""
+        out = df.copy() if positions is None else df.iloc[positions].copy()
+        for name, values in self.arrays.items():
+            out[name] = values if positions is None else values[positions]
+        return out
+
+
+def score_buffers(
+    df: pd.DataFrame, weights: dict | None = None, retrieval: Optional[Dict[str, np.ndarray]] = None
+) -> ScoreBuffers:
+    """计算质量分并融合 BM25/语义与 promotion，结果写入 ScoreBuffers（数值与 fuse_scores 的各列逐位一致）。
+
+    retrieval 可给出与 df 行位置对齐的 bm25_score / semantic_score 数组（缺失记 0）；未给出时取 df 的同名列。
+    """
     w = weights or {
         "quality": settings.weights.quality,
         "bm25": settings.weights.bm25,
         "semantic": settings.weights.semantic,
         "promotion_max_boost": settings.weights.promotion,
     }
+    retrieval = retrieval or {}
+    buffers = ScoreBuffers(len(df))
+    for name in ("bm25_score", "semantic_score"):
+        values = retrieval.get(name)
+        if values is None:
+            values = _numeric_column(df, name)
+        values = np.zeros(len(df)) if values is None else np.asarray(values, dtype="float64")
+        buffers[name] = np.where(np.isnan(values), 0.0, values)
 
     # 质量分
-    fused = compute_quality_scores(df)
+    components = compute_quality_components(df)
+    buffers["quality_score"] = _quality_score_array(df, components)
+    for name in QUALITY_COMPONENTS:
+        buffers[f"{name}_score"] = components[name]
 
     # 归一化 BM25 / 语义
-    fused["bm25_score"] = fused.get("bm25_score", 0).fillna(0)
-    fused["semantic_score"] = fused.get("semantic_score", 0).fillna(0)
-    fused["bm25_norm"] = _normalize_scores(fused["bm25_score"])
-    fused["semantic_norm"] = _normalize_scores(fused["semantic_score"])
+    buffers["bm25_norm"] = _normalize_array(buffers["bm25_score"])
+    buffers["semantic_norm"] = _normalize_array(buffers["semantic_score"])
 
     # 基础融合
     base_score = (
-        fused["quality_score"] * w.get("quality", 0)
-        + fused["bm25_norm"] * w.get("bm25", 0)
-        + fused["semantic_norm"] * w.get("semantic", 0)
+        buffers["quality_score"] * w.get("quality", 0)
+        + buffers["bm25_norm"] * w.get("bm25", 0)
+        + buffers["semantic_norm"] * w.get("semantic", 0)
     )
 
     # promotion 乘性加成（限制上限）
-    promo_raw = fused.get("promotion_weight", 0).fillna(0)
-    promo_score = np.sqrt(promo_raw)  # 平滑压缩
-    promotion_factor = 1.0 + w.get("promotion_max_boost", 0) * promo_score.clip(0, 1)
-
-    fused["fused_score"] = base_score * promotion_factor
-    fused["base_score"] = base_score
-    fused["promotion_factor"] = promotion_factor
-    return fused
+    promo_raw = _numeric_column(df, "promotion_weight")
+    promo_raw = np.zeros(len(df)) if promo_raw is None else np.where(np.isnan(promo_raw), 0.0, promo_raw)
+    with np.errstate(invalid="ignore"):
+        promo_score = np.sqrt(promo_raw)  # 平滑压缩
+    promotion_factor = 1.0 + w.get("promotion_max_boost", 0) * np.clip(promo_score, 0, 1)
+
+    buffers["fused_score"] = base_score * promotion_factor
+    buffers["base_score"] = base_score
+    buffers["promotion_factor"] = promotion_factor
+    return buffers
+
+
+def fuse_scores(df: pd.DataFrame, weights: dict | None = None, query_context: Optional[Dict[str, any]] = None) -> pd.DataFrame:
+    """归一化 BM25/语义，融合质量分并应用 promotion 乘性提升（返回带全部得分列的副本）。"""
+    return score_buffers(df, weights=weights).frame(df)
@@ -1,44 +1,149 @@
-﻿"""BM25/Tfidf retrieval with jieba tokenization."""
+﻿"""Okapi BM25 retrieval over an inverted index with jieba tokenization."""
 from __future__ import annotations
 
+from typing import Sequence
+
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+import scipy.sparse as sp
 
 from src.config import settings
+from src.utils.array_utils import normalize_row_ids, top_k_indices
 from src.utils.text_utils import tokenize, join_tokens
 
 
 class BM25Engine:
-    """Wrap TF-IDF index for lexical relevance."""
+    """Score documents from the postings of the query terms only."""
 
     def __init__(self, bundle: dict | None = None) -> None:
-        if bundle is not None:
-            self.pipeline = bundle["pipeline"]
-            self.matrix = bundle["matrix"]
-        else:
+        if bundle is None:
             if not settings.paths.bm25_index.exists():
                 raise FileNotFoundError(f"BM25 index not found at {settings.paths.bm25_index}, run pipeline/build_bm25.py first")
             bundle = joblib.load(settings.paths.bm25_index)
-            self.pipeline = bundle["pipeline"]
-            self.matrix = bundle["matrix"]
+        if "postings" not in bundle:
+            raise ValueError("BM25 index uses the legacy TF-IDF format, re-run pipeline/build_bm25.py")
+        self.vectorizer = bundle["vectorizer"]
+        self.vocab: dict[str, int] = bundle["vocab"]
+        self.postings = bundle["postings"]
+        self.n_docs: int = bundle["n_docs"]  # 文档槽位空间大小（增量维护后可能含已删除槽位）
+        # 增量段统一到相同的槽位宽度，便于与主段一起做矩阵乘
+        self.segments = [
+            sp.csr_matrix((seg.data, seg.indices, seg.indptr), shape=(seg.shape[0], self.n_docs))
+            for seg in bundle.get("segments", [])
+        ]
+        if self.postings is not None and self.segments:
+            self.postings = sp.csr_matrix(
+                (self.postings.data, self.postings.indices, self.postings.indptr), shape=(self.postings.shape[0], self.n_docs)
+            )
+        self.deleted = np.asarray(bundle.get("deleted", np.zeros(0)), dtype=np.int64)
+        self._analyzer = self.vectorizer.build_analyzer() if self.vectorizer is not None else None
 
     def _prep_query(self, query: str) -> str:
         """对查询分词并拼接，适配向量化器。"""
         return join_tokens(tokenize(query))
 
-    def search(self, query: str, top_k: int = 50) -> list[tuple[int, float]]:
-        """返回按 BM25 相似度排序的索引+得分。"""
-        processed = self._prep_query(query)
-        query_vec = self.pipeline.transform([processed])
-        sims = cosine_similarity(query_vec, self.matrix).ravel()
-        top_idx = np.argsort(sims)[::-1][:top_k]
-        return [(int(i), float(sims[i])) for i in top_idx if sims[i] > 0]
-
-    def attach_scores(self, df: pd.DataFrame, query: str, top_k: int = 50) -> pd.DataFrame:
-        """将 BM25 得分写入 DataFrame 副本。"""
-        matches = self.search(query, top_k=top_k)
+    def _query_terms(self, query: str) -> np.ndarray:
+        """查询 → 去重后的词项 id（未登录词直接丢弃）。"""
+        if self._analyzer is None:
+            return np.zeros(0, dtype=np.int64)
+        terms = {self.vocab[t] for t in self._analyzer(self._prep_query(query)) if t in self.vocab}
+        return np.sort(np.fromiter(terms, dtype=np.int64, count=len(terms)))  # 固定累加顺序，批量与单条得分逐位一致
+
+    def _score_terms(self, term_ids: np.ndarray, allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """累加各词项倒排表，返回 (文档行号, BM25 得分)，代价只与倒排表长度相关。
+
+        allowed 为升序去重的候选行号（过滤阶段结果），倒排表先与之求交再累加。
+        """
+        if term_ids.size == 0 or self.postings is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        doc_parts, weight_parts = [], []
+        for t in term_ids:
+            for seg in [self.postings, *self.segments]:  # 各段的槽位互不重叠
+                docs = seg.indices[seg.indptr[t] : seg.indptr[t + 1]]
+                weights = seg.data[seg.indptr[t] : seg.indptr[t + 1]]
+                if allowed is not None:
+                    keep = _intersect_sorted(docs, allowed)
+                    docs, weights = docs[keep], weights[keep]
+                doc_parts.append(docs)
+                weight_parts.append(weights)
+        docs = np.concatenate(doc_parts)
+        if docs.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        doc_ids, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weight_parts), minlength=doc_ids.size)
+        return self._drop_deleted(doc_ids.astype(np.int64), scores)
+
+    def _drop_deleted(self, doc_ids: np.ndarray, scores: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """去掉墓碑槽位（已删除或被新版本覆盖的文档）。"""
+        if self.deleted.size == 0:
+            return doc_ids, scores
+        keep = ~_intersect_sorted(doc_ids, self.deleted)
+        return doc_ids[keep], scores[keep]
+
+    def prepare(self, query: str) -> np.ndarray:
+        """查询侧预处理（分词→词项 id），与过滤结果无关，可与过滤并行执行。"""
+        return self._query_terms(query)
+
+    def search_prepared(
+        self, term_ids: np.ndarray, top_k: int = 50, allowed: np.ndarray | None = None
+    ) -> list[tuple[int, float]]:
+        """用 prepare 的结果检索，语义同 search。"""
+        allowed = normalize_row_ids(allowed, self.n_docs)
+        if allowed is not None and allowed.size == 0:
+            return []
+        return self._top_hits(*self._score_terms(term_ids, allowed), top_k)
+
+    def search(self, query: str, top_k: int = 50, allowed: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """返回按 BM25 得分排序的索引+得分；传入 allowed 时只在这些行号内检索。"""
+        return self.search_prepared(self.prepare(query), top_k=top_k, allowed=allowed)
+
+    def search_batch(
+        self, queries: Sequence[str], top_k: int = 50, allowed_list: Sequence[np.ndarray | None] | None = None
+    ) -> list[list[tuple[int, float]]]:
+        """批量检索：不限候选集的查询与倒排表做一次稀疏矩阵乘，限候选集的逐条先求交再累加。"""
+        if not queries:
+            return []
+        allowed_list = allowed_list if allowed_list is not None else [None] * len(queries)
+        allowed_list = [normalize_row_ids(a, self.n_docs) for a in allowed_list]
+        term_lists = [self._query_terms(q) for q in queries]
+
+        results: list[list[tuple[int, float]]] = [[] for _ in queries]
+        for i, allowed in enumerate(allowed_list):
+            if allowed is not None and allowed.size:
+                results[i] = self._top_hits(*self._score_terms(term_lists[i], allowed), top_k)
+        open_rows = [i for i, a in enumerate(allowed_list) if a is None]
+        if not open_rows or self.postings is None:
+            return results
+
+        counts = [term_lists[i].size for i in open_rows]
+        rows = np.repeat(np.arange(len(open_rows)), counts)
+        cols = np.concatenate([term_lists[i] for i in open_rows])
+        query_matrix = sp.csr_matrix(
+            (np.ones(cols.size, dtype=np.float64), (rows, cols)), shape=(len(open_rows), self.postings.shape[0])
+        )
+        scores = query_matrix @ self.postings  # float64 累加，与 _score_terms 的 bincount 一致
+        for seg in self.segments:
+            scores = scores + query_matrix @ seg
+        scores = scores.tocsr()
+        scores.sort_indices()
+        for row, i in enumerate(open_rows):
+            lo, hi = scores.indptr[row], scores.indptr[row + 1]
+            doc_ids, vals = self._drop_deleted(scores.indices[lo:hi].astype(np.int64), scores.data[lo:hi])
+            results[i] = self._top_hits(doc_ids, vals, top_k)
+        return results
+
+    @staticmethod
+    def _top_hits(doc_ids: np.ndarray, scores: np.ndarray, top_k: int) -> list[tuple[int, float]]:
+        """取得分最高的 top_k 篇（同分按文档行号），丢弃零分。"""
+        order = top_k_indices(scores, top_k, tie_break=doc_ids)  # 同分按文档行号
+        return [(int(doc_ids[i]), float(scores[i])) for i in order if scores[i] > 0]
+
+    def attach_scores(
+        self, df: pd.DataFrame, query: str, top_k: int = 50, allowed: np.ndarray | None = None
+    ) -> pd.DataFrame:
+        """将 BM25 得分写入 DataFrame 副本；allowed 通常为过滤后 df 的行号。"""
+        matches = self.search(query, top_k=top_k, allowed=allowed)
         if not matches:
             df["bm25_score"] = 0.0
             return df
@@ -46,3 +151,19 @@ class BM25Engine:
         df = df.copy()
         df["bm25_score"] = df.index.map(score_map).fillna(0).astype(float)
         return df
+
+
+def _intersect_sorted(docs: np.ndarray, allowed: np.ndarray) -> np.ndarray:
+    """两个升序行号数组求交，返回 docs 中命中位置的布尔掩码；较短一侧做二分查找。"""
+    if docs.size == 0 or allowed.size == 0:
+        return np.zeros(docs.size, dtype=bool)
+    if allowed.size < docs.size:
+        pos = np.searchsorted(docs, allowed)
+        hit = pos < docs.size
+        hit[hit] = docs[pos[hit]] == allowed[hit]
+        mask = np.zeros(docs.size, dtype=bool)
+        mask[pos[hit]] = True
+        return mask
+    pos = np.searchsorted(allowed, docs)
+    pos[pos == allowed.size] = allowed.size - 1
+    return allowed[pos] == docs
@@ -1,22 +1,47 @@
 """结构化硬过滤引擎。"""
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable
+from typing import Any, Dict, Sequence
 
 import pandas as pd
+from pandas.api.extensions import ExtensionDtype
 
+from src.retrieval.filter_index import FilterIndex, _to_list
 
-def _to_list(val: Any) -> Iterable:
-    """将传入值安全转为可迭代列表，用于多选条件。"""
-    if val is None:
-        return []
-    if isinstance(val, (list, tuple, set)):
-        return val
-    return [val]
+# 数据访问层按条件下推读取的 DataFrame 在 attrs 中记录所用条件
+PUSHED_CONDITIONS_ATTR = "pushed_conditions"
+# 过滤条件涉及的列；只读部分列时应包含它们，便于下游再次校验
+FILTER_COLUMNS = ("city", "district", "total_price", "area", "bedrooms", "livingrooms", "school_district")
 
 
-def apply_filters(df: pd.DataFrame, conditions: Dict[str, Any]) -> pd.DataFrame:
-    """根据解析后的条件对 DataFrame 进行硬过滤。"""
+def apply_filters(df: pd.DataFrame, conditions: Dict[str, Any], columns: Sequence[str] | None = None) -> pd.DataFrame:
+    """根据解析后的条件对 DataFrame 进行硬过滤。
+
+    常驻的大表（默认库/会话上传，加载时经 FilterIndex.for_frame 登记）走预建索引，结果与逐列掩码一致；
+    已按同一条件下推读取的 DataFrame 直接返回；其余表（单次请求的临时表）逐列扫描，不构建索引。
+    columns 给定时只取其中存在的列，选行与投影一次完成，不复制其余列。
+    """
+    names = None if columns is None else [c for c in dict.fromkeys(columns) if c in df.columns]
+    if df.attrs.get(PUSHED_CONDITIONS_ATTR) == conditions:
+        return df if names is None or len(names) == df.shape[1] else df[names]
+    index = FilterIndex.lookup(df)
+    if index is not None:
+        rows = index.query(conditions)
+        return df.iloc[rows] if names is None else _take_columns(df, rows, names)
+    return _apply_filters_mask(df, conditions, names)
+
+
+def _take_columns(df: pd.DataFrame, rows, names: list[str]) -> pd.DataFrame:
+    """逐列按行位置取值后直接组装（不合并 block），只为选中的行与列分配内存；df.iloc[rows, cols] 会先复制整列。"""
+    arrays = {}
+    for c in names:
+        col = df[c]
+        arrays[c] = col.array.take(rows) if isinstance(col.dtype, ExtensionDtype) else col.to_numpy()[rows]
+    return pd.DataFrame(arrays, index=df.index[rows], copy=False)
+
+
+def _apply_filters_mask(df: pd.DataFrame, conditions: Dict[str, Any], names: list[str] | None = None) -> pd.DataFrame:
+    """逐列布尔掩码实现，小表直接扫描即可。"""
     mask = pd.Series(True, index=df.index)
 
     if city := conditions.get("city"):
@@ -56,4 +81,6 @@ def apply_filters(df: pd.DataFrame, conditions: Dict[str, Any]) -> pd.DataFrame:
     if school_district := conditions.get("school_district"):
         mask &= df["school_district"] == school_district
 
+    if names is not None:
+        return df.loc[mask, names]
     return df.loc[mask]
@@ -0,0 +1,206 @@
+"""Prebuilt columnar filter index: categorical postings + sorted numeric arrays."""
+from __future__ import annotations
+
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+# 等值条件：字典编码后每个取值一条升序行号表
+CATEGORICAL_FIELDS = ("city", "district", "bedrooms", "livingrooms", "school_district")
+# 区间条件：值排序 + searchsorted
+RANGE_FIELDS = ("total_price", "area", "bedrooms", "livingrooms")
+ROW_DTYPE = np.int32  # 行号用 int32，候选集压缩与 gather 的带宽减半
+
+
+@dataclass
+class _Predicate:
+    """单个过滤条件：size 为命中行数（无需物化即可得知），用于从小到大求交。"""
+
+    size: int
+    materialize: Callable[[], np.ndarray]
+    check: Callable[[np.ndarray], np.ndarray]
+
+
+class FilterIndex:
+    """对一份 DataFrame 预建的过滤索引，query 返回与 apply_filters 掩码一致的升序行位置。"""
+
+    # 常驻 DataFrame 的 id → (弱引用, 索引)；请求线程并发查找/登记，读写都在锁内
+    _cache: Dict[int, tuple[weakref.ref, "FilterIndex"]] = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.n_rows = len(df)
+        self.columns = set(df.columns)
+        self._codes: Dict[str, np.ndarray] = {}
+        self._code_of: Dict[str, Dict[Any, int]] = {}
+        self._postings: Dict[str, list[np.ndarray]] = {}
+        self._rank: Dict[str, np.ndarray] = {}  # 行 → 在排序数组中的位置，区间校验只需比较名次
+        self._sorted: Dict[str, tuple[np.ndarray, np.ndarray, int]] = {}
+
+        for col in CATEGORICAL_FIELDS:
+            if col in df.columns:
+                self._build_categorical(col, df[col])
+        for col in RANGE_FIELDS:
+            if col in df.columns:
+                self._build_range(col, df[col])
+
+    @classmethod
+    def for_frame(cls, df: pd.DataFrame) -> "FilterIndex":
+        """为常驻 DataFrame（默认库/会话上传）构建并登记索引，同一对象只构建一次；请求中的临时表不应调用。"""
+        index = cls.lookup(df)
+        if index is not None:
+            return index
+        index = cls(df)  # 构建较慢，不占用锁
+        with cls._cache_lock:
+            current = cls._lookup_locked(df)
+            if current is not None:  # 并发构建同一份表时保留先登记的一份
+                return current
+            cls._cache = {k: v for k, v in cls._cache.items() if v[0]() is not None}
+            cls._cache[id(df)] = (weakref.ref(df), index)
+        return index
+
+    @classmethod
+    def lookup(cls, df: pd.DataFrame) -> FilterIndex | None:
+        """已登记的索引；未登记（临时表）时返回 None，不构建。"""
+        with cls._cache_lock:
+            return cls._lookup_locked(df)
+
+    @classmethod
+    def _lookup_locked(cls, df: pd.DataFrame) -> FilterIndex | None:
+        cached = cls._cache.get(id(df))
+        if cached is None:
+            return None
+        ref, index = cached
+        # id 在原对象回收后可能被新对象复用：弱引用必须仍指向同一对象，且行数未变
+        if ref() is not df or index.n_rows != len(df):
+            return None
+        return index
+
+    def _build_categorical(self, col: str, series: pd.Series) -> None:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        codes = codes.astype(np.min_scalar_type(-len(uniques) - 1))  # 窄编码，候选校验时 gather 更省带宽
+        order = np.argsort(codes, kind="stable")  # 同一取值内行号保持升序
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self._codes[col] = codes
+        self._code_of[col] = {value: i for i, value in enumerate(uniques)}
+        order = order.astype(ROW_DTYPE)
+        self._postings[col] = [order[bounds[i] : bounds[i + 1]] for i in range(len(uniques))]
+
+    def _build_range(self, col: str, series: pd.Series) -> None:
+        values = pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        order = np.argsort(values, kind="stable")  # NaN 排在末尾
+        n_valid = int(np.count_nonzero(~np.isnan(values)))
+        rank = np.empty(len(values), dtype=np.int32)
+        rank[order] = np.arange(len(values), dtype=np.int32)
+        self._rank[col] = rank
+        self._sorted[col] = (values[order], order.astype(ROW_DTYPE), n_valid)
+
+    def _require(self, col: str) -> None:
+        if col not in self.columns:
+            raise KeyError(col)
+
+    def _eq(self, col: str, values: Iterable[Any]) -> _Predicate:
+        self._require(col)
+        code_of = self._code_of[col]
+        codes = sorted({code_of[v] for v in values if v in code_of})
+        postings = self._postings[col]
+        size = sum(len(postings[c]) for c in codes)
+        # 查找表：lut[code] 表示该取值是否命中，末位对应缺失值（编码 -1）
+        lut = np.zeros(len(postings) + 1, dtype=bool)
+        lut[codes] = True
+
+        def materialize() -> np.ndarray:
+            if not codes:
+                return np.zeros(0, dtype=ROW_DTYPE)
+            if len(codes) == 1:
+                return postings[codes[0]]
+            return self._sorted_rows(np.concatenate([postings[c] for c in codes]))
+
+        def check(rows: np.ndarray) -> np.ndarray:
+            if len(codes) == 1:
+                return self._codes[col][rows] == codes[0]
+            return lut[self._codes[col][rows].astype(np.intp)]
+
+        return _Predicate(size, materialize, check)
+
+    def _range(self, col: str, low: float | None = None, high: float | None = None) -> _Predicate:
+        self._require(col)
+        sorted_values, order, n_valid = self._sorted[col]
+        start = 0 if low is None else int(np.searchsorted(sorted_values[:n_valid], low, side="left"))
+        stop = n_valid if high is None else int(np.searchsorted(sorted_values[:n_valid], high, side="right"))
+        stop = max(start, stop)
+
+        def materialize() -> np.ndarray:
+            return self._sorted_rows(order[start:stop])
+
+        def check(rows: np.ndarray) -> np.ndarray:
+            ranks = self._rank[col][rows]  # NaN 的名次 >= n_valid >= stop，自然落在区间外
+            return (ranks >= start) & (ranks < stop)
+
+        return _Predicate(stop - start, materialize, check)
+
+    def _sorted_rows(self, rows: np.ndarray) -> np.ndarray:
+        """无序行号转升序：命中行较多时用位图散射 O(n)，较少时直接排序 O(m log m)。"""
+        if rows.size * 16 < self.n_rows:
+            return np.sort(rows)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return np.flatnonzero(mask).astype(ROW_DTYPE)
+
+    def _predicates(self, conditions: Dict[str, Any]) -> list[_Predicate]:
+        """将解析条件翻译为谓词，语义与 filter_engine 的掩码实现逐条对应。"""
+        preds: list[_Predicate] = []
+        if city := conditions.get("city"):
+            preds.append(self._eq("city", [city]))
+        if districts := conditions.get("districts"):
+            preds.append(self._eq("district", _to_list(districts)))
+
+        min_price, max_price = conditions.get("min_price"), conditions.get("max_price")
+        if min_price is not None or max_price is not None:
+            preds.append(self._range("total_price", min_price, max_price))
+        min_area, max_area = conditions.get("min_area"), conditions.get("max_area")
+        if min_area is not None or max_area is not None:
+            preds.append(self._range("area", min_area, max_area))
+
+        for col, exact_key, min_key in (
+            ("bedrooms", "bedrooms_exact", "bedrooms"),
+            ("livingrooms", "livingrooms_exact", "livingrooms_min"),
+        ):
+            if col not in self.columns:
+                continue
+            exact, minimum = conditions.get(exact_key), conditions.get(min_key)
+            if exact is not None:
+                preds.append(self._eq(col, [exact]))
+            elif minimum is not None:
+                preds.append(self._range(col, minimum, None))
+
+        if school_district := conditions.get("school_district"):
+            preds.append(self._eq("school_district", [school_district]))
+        return preds
+
+    def query(self, conditions: Dict[str, Any]) -> np.ndarray:
+        """返回满足全部条件的升序行位置：先物化最小的候选集，其余条件只在候选上校验。"""
+        preds = sorted(self._predicates(conditions), key=lambda p: p.size)
+        if not preds:
+            return np.arange(self.n_rows, dtype=ROW_DTYPE)
+        if preds[0].size == 0:
+            return np.zeros(0, dtype=ROW_DTYPE)
+        rows = preds[0].materialize()
+        for pred in preds[1:]:
+            rows = rows[pred.check(rows)]
+            if rows.size == 0:
+                break
+        return rows
+
+
+def _to_list(val: Any) -> Iterable:
+    """将传入值安全转为可迭代列表，用于多选条件。"""
+    if val is None:
+        return []
+    if isinstance(val, (list, tuple, set)):
+        return val
+    return [val]
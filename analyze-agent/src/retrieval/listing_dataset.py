@@ -0,0 +1,183 @@
+"""Data-access layer over the partitioned listings dataset: parsed conditions → pyarrow filters + projections."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from src.config import settings
+from src.pipeline.build_dataset import MANIFEST_FILE, ROWS_FILE, SLOT_COLUMN
+from src.retrieval.filter_engine import PUSHED_CONDITIONS_ATTR
+from src.retrieval.filter_index import _to_list
+
+
+def conditions_to_filter(conditions: Dict[str, Any], columns: Iterable[str]) -> Optional[pc.Expression]:
+    """将解析条件翻译为 pyarrow 过滤表达式，语义与 filter_engine 的逐列掩码逐条对应（缺失值不命中）。
+
+    与 apply_filters 不同，city 也可传列表（多选城市）。
+    """
+    columns = set(columns)
+    preds = []
+    if city := conditions.get("city"):
+        preds.append(pc.field("city").isin(list(_to_list(city))))
+    if districts := conditions.get("districts"):
+        preds.append(pc.field("district").isin(list(_to_list(districts))))
+
+    for col, low_key, high_key in (("total_price", "min_price", "max_price"), ("area", "min_area", "max_area")):
+        if (low := conditions.get(low_key)) is not None:
+            preds.append(pc.field(col) >= low)
+        if (high := conditions.get(high_key)) is not None:
+            preds.append(pc.field(col) <= high)
+
+    for col, exact_key, min_key in (
+        ("bedrooms", "bedrooms_exact", "bedrooms"),
+        ("livingrooms", "livingrooms_exact", "livingrooms_min"),
+    ):
+        if col not in columns:
+            continue
+        exact, minimum = conditions.get(exact_key), conditions.get(min_key)
+        if exact is not None:
+            preds.append(pc.field(col) == exact)
+        elif minimum is not None:
+            preds.append(pc.field(col) >= minimum)
+
+    if school_district := conditions.get("school_district"):
+        preds.append(pc.field("school_district") == school_district)
+
+    if not preds:
+        return None
+    expr = preds[0]
+    for pred in preds[1:]:
+        expr = expr & pred
+    return expr
+
+
+class ListingDataset:
+    """默认库的分区数据集视图：按条件只扫描命中的分区/row group，并只读取所需列。"""
+
+    def __init__(self, root: Path, manifest: Dict[str, Any]) -> None:
+        self.root = root
+        self.manifest = manifest
+        schema: pa.Schema = manifest["schema"]
+        self.partition_cols = list(manifest["partition_cols"])
+        partitioning = ds.partitioning(pa.schema([schema.field(c) for c in self.partition_cols]), flavor="hive")
+        self.dataset = ds.dataset(root, schema=schema, format="parquet", partitioning=partitioning)
+        self.columns: list[str] = list(manifest["columns"])
+        rows_path = root / ROWS_FILE
+        # 内存映射：按槽位取行只触及这些行所在的页，不把整表读入内存
+        self.rows: pa.ipc.RecordBatchFileReader | None = (
+            pa.ipc.open_file(pa.memory_map(str(rows_path))) if rows_path.exists() else None
+        )
+        self._batch_starts: np.ndarray | None = None
+        self._row_slots: np.ndarray | None = None
+        self._row_sorter: np.ndarray | None = None  # 源 parquet 槽位非升序时（增量更新后）的排序位置
+
+    @classmethod
+    def load(cls, root: Path | None = None) -> Optional["ListingDataset"]:
+        """读取数据集；缺失或早于默认库 parquet（如增量更新后未重建）时返回 None，调用方回退全量读取。"""
+        root = root or settings.paths.listings_dataset
+        manifest_path = root / MANIFEST_FILE
+        if not manifest_path.exists():
+            return None
+        manifest = joblib.load(manifest_path)
+        parquet = settings.paths.processed_parquet
+        if parquet.exists() and parquet.stat().st_mtime_ns != manifest.get("source_mtime_ns"):
+            print(f"[listing-dataset] {root} is stale (listings.parquet changed), reading the parquet instead")
+            return None
+        return cls(root, manifest)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.manifest["n_rows"])
+
+    def partition_values(self, col: str) -> list[str]:
+        """某分区列的全部取值（来自 manifest，不读数据）。"""
+        return sorted({part["keys"][col] for part in self.manifest["partitions"]})
+
+    def prunes(self, conditions: Dict[str, Any]) -> bool:
+        """条件是否能裁剪分区（指定了城市或城区）。"""
+        keys = {"city": "city", "district": "districts"}
+        return any(conditions.get(keys[col]) for col in self.partition_cols if col in keys)
+
+    def column_max(self, col: str) -> float | None:
+        """由 row group 统计信息求列最大值，只读文件尾部元数据。"""
+        best = None
+        for fragment in self.dataset.get_fragments():
+            for row_group in fragment.row_groups:
+                value = (row_group.statistics or {}).get(col, {}).get("max")
+                if value is not None and (best is None or value > best):
+                    best = value
+        return best
+
+    def read(self, conditions: Dict[str, Any] | None = None, columns: Iterable[str] | None = None) -> pd.DataFrame:
+        """按条件下推读取，返回以槽位为索引、按槽位升序的 DataFrame（与对全量表 apply_filters 的结果一致）。
+
+        columns 为 None 时读取全部列；结果通过 attrs 标记已按 conditions 过滤，apply_filters 不再重复计算。
+        """
+        conditions = conditions or {}
+        names = self.columns if columns is None else [c for c in self.columns if c in set(columns)]
+        table = self.dataset.to_table(
+            columns=[*names, SLOT_COLUMN], filter=conditions_to_filter(conditions, self.columns)
+        ).sort_by(SLOT_COLUMN)
+        df = self._to_pandas(table, names)
+        df.attrs[PUSHED_CONDITIONS_ATTR] = dict(conditions)
+        return df
+
+    def take(self, slots: np.ndarray, columns: Iterable[str] | None = None) -> pd.DataFrame:
+        """按槽位从内存映射的行存储取行，返回以槽位为索引、与 slots 同序的 DataFrame（用于为 top-k 行补齐列）。"""
+        if self.rows is None:
+            raise FileNotFoundError(f"{self.root / ROWS_FILE} not found, re-run pipeline/build_dataset.py")
+        if self._row_slots is None:
+            self._index_rows()
+        slots = np.asarray(slots, dtype=np.int64)
+        positions = np.searchsorted(self._row_slots, slots, sorter=self._row_sorter)
+        positions = positions.clip(0, max(len(self._row_slots) - 1, 0))
+        if self._row_sorter is not None:
+            positions = self._row_sorter[positions]
+        if not np.array_equal(self._row_slots[positions], slots):
+            raise KeyError(f"slots not in {self.root / ROWS_FILE}: {np.setdiff1d(slots, self._row_slots)[:5].tolist()}")
+
+        names = self.columns if columns is None else [c for c in self.columns if c in set(columns)]
+        schema = self.rows.schema.remove_metadata()
+        schema = pa.schema([schema.field(c) for c in [*names, SLOT_COLUMN]])
+        # 逐 record batch 取行：整表 take 会先把各列的全部 chunk 合并成一块
+        batch_of = np.searchsorted(self._batch_starts, positions, side="right") - 1
+        pieces, picked = [], []
+        for b in np.unique(batch_of):
+            hit = np.flatnonzero(batch_of == b)
+            batch = self.rows.get_batch(int(b)).select(schema.names)
+            pieces.append(batch.take(pa.array(positions[hit] - self._batch_starts[b])))
+            picked.append(hit)
+        table = pa.Table.from_batches(pieces, schema=schema)
+        if picked:
+            table = table.take(pa.array(np.argsort(np.concatenate(picked))))  # 恢复 slots 的顺序
+        return self._to_pandas(table, names)
+
+    def _index_rows(self) -> None:
+        """首次按行取数时读取行存储的槽位列与各 record batch 的起始行。"""
+        counts, slots = [], []
+        for i in range(self.rows.num_record_batches):
+            batch = self.rows.get_batch(i)
+            counts.append(batch.num_rows)
+            slots.append(batch.column(SLOT_COLUMN).to_numpy())
+        self._batch_starts = np.cumsum([0, *counts])
+        self._row_slots = np.concatenate(slots) if slots else np.zeros(0, dtype=np.int64)
+        if not np.all(self._row_slots[1:] > self._row_slots[:-1]):
+            self._row_sorter = np.argsort(self._row_slots, kind="stable")
+
+    def _to_pandas(self, table: pa.Table, names: list[str]) -> pd.DataFrame:
+        """转为 pandas 并按 manifest 还原 dtype，槽位列作为索引。"""
+        df = table.to_pandas()
+        dtypes = self.manifest["dtypes"]
+        for col in names:
+            if str(df[col].dtype) != dtypes[col]:
+                df[col] = df[col].astype(dtypes[col])
+        df = df.set_index(SLOT_COLUMN)
+        df.index.name = None
+        return df
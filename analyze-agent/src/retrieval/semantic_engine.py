@@ -1,6 +1,8 @@
 ﻿"""Semantic retrieval using sentence-transformers and FAISS."""
 from __future__ import annotations
 
+from typing import Sequence
+
 import joblib
 import numpy as np
 import pandas as pd
@@ -8,17 +10,27 @@ import faiss
 from sentence_transformers import SentenceTransformer
 
 from src.config import settings
+from src.pipeline.model_registry import get_embedding_model
+from src.pipeline.vector_index import describe_index, unwrap_id_map
+from src.utils.array_utils import normalize_row_ids, top_k_indices
 from src.utils.text_utils import tokenize, join_tokens
 
 
 class SemanticEngine:
     """Vector similarity search wrapper."""
 
-    def __init__(self, index: faiss.Index | None = None, model: SentenceTransformer | None = None) -> None:
+    def __init__(
+        self,
+        index: faiss.Index | None = None,
+        model: SentenceTransformer | None = None,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+    ) -> None:
         if index is not None and model is not None:
             self.index = index
             self.model = model
             self.ids = list(range(index.ntotal))
+            index_params = describe_index(index)
         else:
             if not settings.paths.vector_faiss.exists() or not settings.paths.vector_meta.exists():
                 raise FileNotFoundError(
@@ -28,28 +40,120 @@ class SemanticEngine:
             meta = joblib.load(settings.paths.vector_meta)
             self.ids = meta.get("ids", [])
             model_name = meta.get("model_name", settings.semantic_model)
-            self.model = SentenceTransformer(model_name)
+            self.model = get_embedding_model(model_name)
+            index_params = meta.get("index_params") or describe_index(self.index)
+        # 默认库索引外包 IndexIDMap2（id 为文档槽位）：类型判断与子集内积作用于内层索引
+        self.base_index, self.id_map = unwrap_id_map(self.index)
+        ids_sorted = self.id_map is None or bool(np.all(np.diff(self.id_map) > 0))
+        # Flat 子集内积需要按 id 二分定位行号，id 非升序时退回 IDSelector 路径
+        self._flat_subset = (
+            isinstance(self.base_index, faiss.IndexFlat)
+            and self.base_index.metric_type == faiss.METRIC_INNER_PRODUCT
+            and ids_sorted
+        )
+        # id 恰为 0..ntotal-1 时，覆盖全部 id 的候选集才可简化为全库检索（分片索引的 id 是全局槽位）
+        self._dense_ids = self.id_map is None or self.id_map.size == 0 or (
+            ids_sorted and self.id_map[0] == 0 and self.id_map[-1] == self.index.ntotal - 1
+        )
+        # 查询期旋钮：显式参数 > 构建时持久化参数 > 全局配置
+        self.index_type: str = index_params.get("index_type", "flat")
+        self.nprobe: int = nprobe or index_params.get("nprobe") or settings.vector_nprobe
+        self.ef_search: int = ef_search or index_params.get("ef_search") or settings.vector_hnsw_ef_search
+
+    def _search_params(self, top_k: int, sel: faiss.IDSelector | None = None) -> faiss.SearchParameters | None:
+        """按索引类型生成查询参数（nprobe / efSearch / 候选集选择器）。"""
+        if isinstance(self.base_index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=sel, nprobe=self.nprobe)
+        if isinstance(self.base_index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=sel, efSearch=max(self.ef_search, top_k))
+        if sel is not None:
+            return faiss.SearchParameters(sel=sel)
+        return None
+
+    def _encode(self, queries: Sequence[str]) -> np.ndarray:
+        """对一批查询分词并一次性编码成归一化向量。"""
+        processed = [join_tokens(tokenize(q)) for q in queries]
+        vecs = self.model.encode(processed, batch_size=64, normalize_embeddings=True)
+        return np.asarray(vecs, dtype="float32")
 
     def _prep_query(self, query: str) -> np.ndarray:
         """对查询分词并编码成归一化向量。"""
-        processed = join_tokens(tokenize(query))
-        vec = self.model.encode([processed], normalize_embeddings=True)
-        return np.asarray(vec, dtype="float32")
-
-    def search(self, query: str, top_k: int = 50) -> list[tuple[int, float]]:
-        """返回语义相似度排序的索引+得分。"""
-        query_vec = self._prep_query(query)
-        scores, idxs = self.index.search(query_vec, top_k)
-        results: list[tuple[int, float]] = []
-        for score, idx in zip(scores[0], idxs[0]):
-            if idx == -1:
-                continue
-            results.append((int(idx), float(score)))
+        return self._encode([query])
+
+    def prepare(self, query: str) -> np.ndarray:
+        """查询侧预处理（分词+编码），与过滤结果无关，可与过滤并行执行。"""
+        return self._prep_query(query)
+
+    def search_prepared(
+        self, query_vec: np.ndarray, top_k: int = 50, allowed: np.ndarray | None = None
+    ) -> list[tuple[int, float]]:
+        """用 prepare 的结果检索，语义同 search。"""
+        allowed = self._normalize(allowed)
+        if allowed is not None and allowed.size == 0:
+            return []
+        return self._search_vector(query_vec, top_k, allowed)
+
+    def search(self, query: str, top_k: int = 50, allowed: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """返回语义相似度排序的索引+得分；传入 allowed 时只在这些行号内检索。"""
+        return self.search_prepared(self.prepare(query), top_k=top_k, allowed=allowed)
+
+    def search_batch(
+        self, queries: Sequence[str], top_k: int = 50, allowed_list: Sequence[np.ndarray | None] | None = None
+    ) -> list[list[tuple[int, float]]]:
+        """批量检索：一次 encode；不限候选集的查询合并为一次 FAISS 检索，限候选集的逐条走子集检索。"""
+        if not queries:
+            return []
+        allowed_list = allowed_list if allowed_list is not None else [None] * len(queries)
+        allowed_list = [self._normalize(a) for a in allowed_list]
+        query_vecs = self._encode(queries)
+
+        results: list[list[tuple[int, float]]] = [[] for _ in queries]
+        open_rows = [i for i, a in enumerate(allowed_list) if a is None]
+        if open_rows:
+            scores, idxs = self.index.search(query_vecs[open_rows], top_k, params=self._search_params(top_k))
+            for row, i in enumerate(open_rows):
+                results[i] = _hits(scores[row], idxs[row])
+        for i, allowed in enumerate(allowed_list):
+            if allowed is not None and allowed.size:
+                results[i] = self._search_vector(query_vecs[i : i + 1], top_k, allowed)
         return results
 
-    def attach_scores(self, df: pd.DataFrame, query: str, top_k: int = 50) -> pd.DataFrame:
-        """将语义得分写入 DataFrame 副本。"""
-        matches = self.search(query, top_k=top_k)
+    def _normalize(self, allowed: np.ndarray | None) -> np.ndarray | None:
+        """规整候选集；只有 id 为连续行号时，覆盖全部行号的候选集才视为不限制。"""
+        return normalize_row_ids(allowed, self.index.ntotal if self._dense_ids else 0)
+
+    def _search_vector(self, query_vec: np.ndarray, top_k: int, allowed: np.ndarray | None) -> list[tuple[int, float]]:
+        """单条已编码查询的检索；allowed 需已规整（None 表示全库）。"""
+        if allowed is None:
+            scores, idxs = self.index.search(query_vec, top_k, params=self._search_params(top_k))
+        elif self._flat_subset:
+            scores, idxs = self._search_flat_subset(query_vec, top_k, allowed)
+        else:
+            params = self._search_params(top_k, sel=faiss.IDSelectorBatch(allowed))
+            scores, idxs = self.index.search(query_vec, top_k, params=params)
+        return _hits(scores[0], idxs[0])
+
+    def _search_flat_subset(self, query_vec: np.ndarray, top_k: int, allowed: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Flat 索引直接取候选行向量做内积，代价与候选集大小成正比而非全库。"""
+        n, dim = self.base_index.ntotal, self.base_index.d
+        if n == 0:
+            return np.zeros((1, 0), dtype="float32"), np.zeros((1, 0), dtype=np.int64)
+        if self.id_map is None:
+            rows = allowed[allowed < n]
+        else:  # 外部 id 升序存放，二分定位到内层行号
+            rows = np.minimum(np.searchsorted(self.id_map, allowed), n - 1)
+            rows = rows[self.id_map[rows] == allowed]
+        xb = faiss.rev_swig_ptr(self.base_index.get_xb(), n * dim).reshape(n, dim)  # 零拷贝视图
+        sims = xb[rows] @ query_vec[0]
+        order = top_k_indices(sims, top_k)  # rows 升序，同分即按槽位
+        labels = rows if self.id_map is None else self.id_map[rows]
+        return sims[order][None, :], labels[order][None, :]
+
+    def attach_scores(
+        self, df: pd.DataFrame, query: str, top_k: int = 50, allowed: np.ndarray | None = None
+    ) -> pd.DataFrame:
+        """将语义得分写入 DataFrame 副本；allowed 通常为过滤后 df 的行号。"""
+        matches = self.search(query, top_k=top_k, allowed=allowed)
         if not matches:
             df["semantic_score"] = 0.0
             return df
@@ -57,3 +161,8 @@ class SemanticEngine:
         df = df.copy()
         df["semantic_score"] = df.index.map(score_map).fillna(0).astype(float)
         return df
+
+
+def _hits(scores: np.ndarray, idxs: np.ndarray) -> list[tuple[int, float]]:
+    """FAISS 单行结果转为 (行号, 得分) 列表，跳过 -1 占位。"""
+    return [(int(idx), float(score)) for score, idx in zip(scores, idxs) if idx != -1]
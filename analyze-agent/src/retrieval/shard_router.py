@@ -0,0 +1,116 @@
+"""Route retrieval to per-partition index shards and merge their hits."""
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import faiss
+import joblib
+import numpy as np
+
+from src.config import settings
+from src.pipeline.build_shards import MANIFEST_FILE
+from src.pipeline.model_registry import get_embedding_model
+from src.retrieval.bm25_engine import BM25Engine
+from src.retrieval.filter_index import _to_list
+from src.retrieval.semantic_engine import SemanticEngine
+from src.utils.array_utils import top_k_indices
+
+# 分区键 → QueryParser 解析结果中对应的条件字段
+ROUTE_CONDITIONS = {"city": "city", "district": "districts"}
+
+
+class ShardedEngine:
+    """把若干分片引擎包装成与 BM25Engine / SemanticEngine 相同的检索接口，结果按得分合并。
+
+    各分片文档 id 均为全局槽位且互不重叠，合并后的 top_k 与未分片索引一致（同分按槽位）。
+    """
+
+    def __init__(self, engines: Sequence[Any]) -> None:
+        self.engines = list(engines)
+
+    def prepare(self, query: str) -> Any:
+        """查询侧预处理对各分片相同（共享词表/模型），只做一次。"""
+        return self.engines[0].prepare(query) if self.engines else None
+
+    def search_prepared(self, prepared: Any, top_k: int = 50, allowed: np.ndarray | None = None) -> list[tuple[int, float]]:
+        return _merge_hits([e.search_prepared(prepared, top_k=top_k, allowed=allowed) for e in self.engines], top_k)
+
+    def search(self, query: str, top_k: int = 50, allowed: np.ndarray | None = None) -> list[tuple[int, float]]:
+        return self.search_prepared(self.prepare(query), top_k=top_k, allowed=allowed)
+
+    def search_batch(
+        self, queries: Sequence[str], top_k: int = 50, allowed_list: Sequence[np.ndarray | None] | None = None
+    ) -> list[list[tuple[int, float]]]:
+        per_shard = [e.search_batch(queries, top_k=top_k, allowed_list=allowed_list) for e in self.engines]
+        return [_merge_hits([hits[i] for hits in per_shard], top_k) for i in range(len(queries))]
+
+
+class ShardRouter:
+    """按 manifest 懒加载分片：只有被路由到的分片才会读入内存，各分片可独立加载。"""
+
+    def __init__(self, root: Path, manifest: dict) -> None:
+        self.root = root
+        self.key: str = manifest["key"]
+        self.shards: Dict[Any, dict] = manifest["shards"]
+        self._engines: Dict[tuple[str, Any], Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, root: Path | None = None) -> "ShardRouter | None":
+        """读取分片 manifest；分片缺失或落后于当前 parquet（增量更新后未重建）时返回 None，回退全局索引。"""
+        root = Path(root or settings.paths.shards_dir)
+        manifest_path = root / MANIFEST_FILE
+        if not manifest_path.exists():
+            return None
+        manifest = joblib.load(manifest_path)
+        parquet = settings.paths.processed_parquet
+        if parquet.exists() and parquet.stat().st_mtime_ns != manifest.get("source_mtime_ns"):
+            print(f"[shard-router] shards in {root} are older than {parquet}, falling back to global indexes")
+            return None
+        return cls(root, manifest)
+
+    def route(self, parsed: Dict[str, Any]) -> List[Any]:
+        """解析条件限定了分区键时只返回对应分片，否则返回全部分片（含分区键缺失行的 UNKNOWN_SHARD）。
+
+        分区键缺失的行不满足任何等值条件，限定分区键时无需检索 UNKNOWN_SHARD。
+        """
+        field = ROUTE_CONDITIONS.get(self.key, self.key)
+        values = list(_to_list(parsed.get(field)))
+        if not values:
+            return list(self.shards)
+        return [v for v in values if v in self.shards]
+
+    def _shard_engine(self, kind: str, value: Any) -> Any:
+        cache_key = (kind, value)
+        engine = self._engines.get(cache_key)
+        if engine is not None:
+            return engine
+        with self._lock:
+            if cache_key not in self._engines:
+                shard_dir = self.root / self.shards[value]["dir"]
+                if kind == "bm25":
+                    engine = BM25Engine(bundle=joblib.load(shard_dir / "bm25_index.joblib"))
+                else:
+                    meta = joblib.load(shard_dir / "vector_meta.joblib")
+                    engine = SemanticEngine(
+                        index=faiss.read_index(str(shard_dir / "vector_index.faiss")),
+                        model=get_embedding_model(meta.get("model_name")),
+                    )
+                self._engines[cache_key] = engine
+        return self._engines[cache_key]
+
+    def engine(self, kind: str, values: Sequence[Any]) -> ShardedEngine:
+        """kind 为 "bm25" 或 "semantic"；返回覆盖 values 分片的合并检索器。"""
+        return ShardedEngine([self._shard_engine(kind, v) for v in values])
+
+
+def _merge_hits(hit_lists: Sequence[list[tuple[int, float]]], top_k: int) -> list[tuple[int, float]]:
+    """多个分片的 (槽位, 得分) 列表合并取 top_k，同分按槽位升序。"""
+    hits = [h for hits in hit_lists for h in hits]
+    if len(hit_lists) <= 1 or not hits:
+        return hits[:top_k]
+    ids = np.fromiter((i for i, _ in hits), dtype=np.int64, count=len(hits))
+    scores = np.fromiter((s for _, s in hits), dtype=np.float64, count=len(hits))
+    return [hits[j] for j in top_k_indices(scores, top_k, tie_break=ids)]
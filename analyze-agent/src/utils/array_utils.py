@@ -0,0 +1,49 @@
+"""NumPy helpers shared by retrieval and ranking."""
+from __future__ import annotations
+
+import numpy as np
+
+
+def normalize_row_ids(row_ids: np.ndarray | None, n_total: int) -> np.ndarray | None:
+    """候选行号转为升序去重 int64；覆盖全库（0..n_total-1）时返回 None 表示不限制。"""
+    if row_ids is None:
+        return None
+    row_ids = np.unique(np.asarray(row_ids, dtype=np.int64))
+    if n_total > 0 and row_ids.size == n_total and row_ids[0] == 0 and row_ids[-1] == n_total - 1:
+        return None
+    return row_ids
+
+
+def top_k_indices(scores: np.ndarray, k: int, tie_break: np.ndarray | None = None) -> np.ndarray:
+    """返回得分最高的 k 个位置（按得分降序）；同分按 tie_break 升序（缺省按位置），结果确定。
+
+    先用 partition 求第 k 大的阈值，只对阈值以上及恰好同分的候选排序，代价 O(n + k log k)。
+    NaN 视为最低分。
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    n = scores.size
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    neg = np.where(np.isnan(scores), np.inf, -scores)
+    if k < n:
+        kth = np.partition(neg, k - 1)[k - 1]
+        above = np.flatnonzero(neg < kth)
+        ties = np.flatnonzero(neg == kth)
+        need = k - above.size
+        if ties.size > need:
+            # 阈值处同分过多时，只在同分集合内按 tie_break 取前 need 个
+            if tie_break is not None:
+                ties = ties[np.argsort(_tie_ranks(tie_break, ties), kind="stable")]
+            ties = ties[:need]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+    keys = candidates if tie_break is None else _tie_ranks(tie_break, candidates)
+    order = np.lexsort((keys, neg[candidates]))
+    return candidates[order[:k]].astype(np.int64)
+
+
+def _tie_ranks(tie_break: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """把候选位置上的并列键（可为字符串 id）转成可排序的整数名次。"""
+    _, ranks = np.unique(np.asarray(tie_break)[positions], return_inverse=True)
+    return ranks
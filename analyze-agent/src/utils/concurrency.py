@@ -0,0 +1,21 @@
+"""Shared bounded thread pool for request-level fan-out."""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import settings
+
+_executor: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def shared_executor() -> ThreadPoolExecutor:
+    """进程级共享线程池（懒创建），大小由 settings.retrieval_max_workers 限定，避免每个请求各自起线程。"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.retrieval_max_workers), thread_name_prefix="retrieval"
+            )
+        return _executor
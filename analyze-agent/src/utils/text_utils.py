@@ -1,6 +1,7 @@
 ﻿"""Text utilities for tokenization/normalization."""
 from __future__ import annotations
 
+import hashlib
 import re
 from typing import Iterable
 
@@ -23,3 +24,11 @@ def tokenize(text: str) -> list[str]:
 def join_tokens(tokens: Iterable[str]) -> str:
     """Join tokens with spaces for vectorizers that expect whitespace-separated tokens."""
     return " ".join(t for t in tokens if t)
+
+
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    """文本 → 16 字节摘要，用作分词/向量磁盘缓存的键。"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
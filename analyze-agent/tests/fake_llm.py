@@ -0,0 +1,104 @@
+"""Local fake OpenAI-compatible chat.completions server shared by the streaming tests and LLM benchmarks."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+REPORT = (
+    "1) 总体结论：共找到多套符合条件的房源，价格区间集中，整体匹配度较高。\n"
+    "2) 价格与户型：两室为主，单价均值处于同城区中位水平。\n"
+    "3) 地段与通勤：多数房源距地铁 1 公里以内，学区占比过半。\n"
+    "4) 重点推荐房源：性价比最高的三套均为近地铁、南北通透的两室。\n"
+    "5) 风险与建议：部分房源房龄偏老，预算允许时可放宽面积或城区。"
+)
+
+
+def fake_llm_server(
+    tokens: list[str],
+    first_token_s: float,
+    token_s: float,
+    fault: Callable[[], str | None] | None = None,
+) -> ThreadingHTTPServer:
+    """启动本地 OpenAI 兼容的 /v1/chat/completions 服务（后台线程），返回 server；base_url 为 http://host:port/v1。
+
+    使用 HTTP/1.1 keep-alive（流式响应以 chunked 编码发送），server.connections 统计建立过的 TCP 连接数。
+    fault() 每个请求调用一次：返回 "error" 时回 503，返回 "stall" 时挂起 60 秒不响应，None 时正常回复。
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self) -> None:
+            super().setup()
+            with lock:
+                server.connections += 1
+
+        def do_POST(self) -> None:  # noqa: N802
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            action = fault() if fault is not None else None
+            if action == "error":
+                self._send_json(503, {"error": {"message": "upstream overloaded", "type": "server_error"}})
+                return
+            time.sleep(60 if action == "stall" else first_token_s)
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, tok in enumerate(tokens):
+                    if i:
+                        time.sleep(token_s)
+                    self._event(body["model"], {"role": "assistant", "content": tok} if i == 0 else {"content": tok}, None)
+                self._event(body["model"], {}, "stop")
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+                return
+            time.sleep(token_s * (len(tokens) - 1))
+            self._send_json(
+                200,
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [
+                        {"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}
+                    ],
+                },
+            )
+
+        def _send_json(self, status: int, obj: dict) -> None:
+            payload = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _event(self, model: str, delta: dict, finish_reason: str | None) -> None:
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self._chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        def log_message(self, *args) -> None:
+            pass
+
+    lock = threading.Lock()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.handle_error = lambda request, client_address: None  # 客户端超时断开时不打印 BrokenPipe
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,37 @@
+"""Deterministic stand-in for the sentence-transformers model and a throwaway default store on temporary paths."""
+from __future__ import annotations
+
+import zlib
+from dataclasses import fields
+from pathlib import Path
+
+import numpy as np
+
+from src.config import Paths, settings
+from src.pipeline.model_registry import registry
+
+
+class StubEmbeddingModel:
+    """按文本 crc32 生成确定的归一化向量：相同文本得到相同向量，不同文本近似正交。"""
+
+    def __init__(self, dim: int = 16) -> None:
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, batch_size=64, show_progress_bar=False, normalize_embeddings=True, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        vecs = np.stack([np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(self.dim) for t in texts])
+        return (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)).astype("float32")
+
+
+def use_tmp_store(monkeypatch, root: Path, dim: int = 16) -> Paths:
+    """把 settings.paths 整体改到 root 下，并让模型注册表对 settings.semantic_model 返回替身模型。"""
+    base = settings.paths.base_dir
+    paths = Paths(**{f.name: root / getattr(settings.paths, f.name).relative_to(base) for f in fields(Paths)})
+    monkeypatch.setattr(settings, "paths", paths)
+    monkeypatch.setitem(registry._models, settings.semantic_model, StubEmbeddingModel(dim))
+    return paths
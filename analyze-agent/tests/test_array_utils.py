@@ -0,0 +1,77 @@
+"""top_k_indices: NaN ordering, deterministic ties at the cut-off, degenerate k; Ranker.top ties by listing id."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.ranking.ranker import Ranker
+from src.utils.array_utils import top_k_indices
+
+NAN = np.nan
+
+
+def full_sort(scores, tie_break=None) -> list[int]:
+    """参考实现：NaN 视为最低分，按 (得分降序, 并列键升序) 完整排序。"""
+    keys = range(len(scores)) if tie_break is None else tie_break
+    return sorted(range(len(scores)), key=lambda i: (np.isnan(scores[i]), -np.nan_to_num(scores[i]), keys[i]))
+
+
+def test_nan_scored_lowest() -> None:
+    scores = np.array([NAN, 0.2, -1.0, NAN, 0.9])
+    assert top_k_indices(scores, 3).tolist() == [4, 1, 2]
+    assert top_k_indices(scores, 5).tolist() == [4, 1, 2, 0, 3]
+    assert top_k_indices(np.full(3, NAN), 2).tolist() == [0, 1]
+
+
+def test_ties_at_cutoff_resolved_by_tie_break() -> None:
+    scores = np.array([0.5, 0.9, 0.5, 0.5, 0.1, 0.5])
+    assert top_k_indices(scores, 3).tolist() == [1, 0, 2]  # 缺省按位置
+    tie_break = np.array(["f", "z", "d", "b", "a", "c"])
+    assert top_k_indices(scores, 3, tie_break=tie_break).tolist() == [1, 3, 5]  # 同分按 id：b < c < d < f
+    assert top_k_indices(scores, 3, tie_break=np.array([6, 0, 5, 4, 1, 3])).tolist() == [1, 5, 3]
+
+
+@pytest.mark.parametrize("k", [1, 4, 7, 20])
+def test_matches_full_sort(k: int) -> None:
+    rng = np.random.default_rng(k)
+    scores = rng.integers(0, 4, size=20).astype(float)  # 大量同分
+    scores[rng.choice(20, size=3, replace=False)] = NAN
+    tie_break = rng.permutation(20)
+    assert top_k_indices(scores, k).tolist() == full_sort(scores)[:k]
+    assert top_k_indices(scores, k, tie_break=tie_break).tolist() == full_sort(scores, tie_break)[:k]
+
+
+def test_degenerate_k() -> None:
+    scores = np.array([0.3, 0.7, 0.7])
+    assert top_k_indices(scores, 3).tolist() == [1, 2, 0]
+    assert top_k_indices(scores, 10).tolist() == [1, 2, 0]  # k >= n：全部返回
+    assert top_k_indices(scores, 0).size == 0
+    assert top_k_indices(scores, -1).size == 0
+    assert top_k_indices(np.zeros(0), 5).size == 0
+    assert top_k_indices(scores, 2).dtype == np.int64
+
+
+def test_ranker_ties_by_listing_id() -> None:
+    row = {
+        "total_price": 500.0,
+        "area": 80.0,
+        "year_built": 2010,
+        "distance_to_subway": 0.8,
+        "school_district": True,
+        "floor": 5,
+        "total_floors": 18,
+        "orientation": "南北",
+        "renovation": "精装修",
+        "bm25_score": 1.0,
+        "semantic_score": 0.5,
+    }
+    df = pd.DataFrame([row] * 5, index=[10, 11, 12, 13, 14]).assign(id=["L9", "L3", "L7", "L1", "L5"])
+    df.loc[12, "bm25_score"] = 3.0  # 唯一的高分行
+    df.loc[14, "semantic_score"] = 0.0  # 唯一的低分行
+
+    top = Ranker().top(df, top_k=3)
+    assert top["id"].tolist() == ["L7", "L1", "L3"]  # 其余同分按房源 id 而非行位置
+    assert top.index.tolist() == [12, 13, 11]
+    assert top["fused_score"].iloc[1] == top["fused_score"].iloc[2]
+    assert Ranker().rank(df, top_k=5)["id"].tolist() == ["L7", "L1", "L3", "L9", "L5"]
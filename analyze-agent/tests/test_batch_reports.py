@@ -0,0 +1,154 @@
+"""Offline batch reports: checkpoint/resume, retried fallbacks, parquet part numbering and token accounting."""
+from __future__ import annotations
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from src.agent.answer_generator import AnswerGenerator, GeneratedReport
+from src.agent.batch_reports import BatchItem, BatchStats, ReportSink, run_batch_reports
+from src.agent.llm_client import LLMClient
+from src.config import settings
+
+LISTINGS = pd.DataFrame(
+    {
+        "id": ["L1", "L2", "L3"],
+        "city": ["北京", "北京", "上海"],
+        "district": ["海淀", "朝阳", "浦东"],
+        "layout": ["2室1厅", "3室1厅", "1室1厅"],
+        "total_price": [620.0, 880.0, 410.0],
+        "unit_price": [78980.0, 83810.0, 68000.0],
+        "area": [78.5, 105.0, 60.3],
+        "bedrooms": [2, 3, 1],
+        "distance_to_subway": [0.4, 1.2, 0.8],
+        "school_district": [True, False, True],
+        "year_built": [2008, 2015, 1999],
+    }
+)
+ITEMS = [BatchItem(f"item-{i}", query=f"两居 {i}") for i in range(6)] + [BatchItem("cond-0", conditions={"city": "北京"})]
+
+
+class StubOrchestrator:
+    """只实现 run_batch：每条返回固定的前两套房源。"""
+
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+
+    def run_batch(self, queries, df, top_k=10, conditions=None, **kwargs):
+        self.batches.append(list(queries))
+        return [{"results": df.head(2), "parsed": cond or {"raw": q}} for q, cond in zip(queries, conditions)]
+
+
+class StubGenerator:
+    """agenerate 的替身：记录调用；crash_after 条之后抛异常模拟进程崩溃，fail 中的条目返回回退报告。"""
+
+    def __init__(self, crash_after: int | None = None, fail: tuple[str, ...] = ()) -> None:
+        self.calls: list[str] = []
+        self.crash_after = crash_after
+        self.fail = fail
+
+    async def agenerate(self, user_query, user_filter, listings, summary_stats) -> GeneratedReport:
+        if self.crash_after is not None and len(self.calls) >= self.crash_after:
+            raise RuntimeError("simulated crash")
+        self.calls.append(user_query)
+        await asyncio.sleep(0)
+        if user_query in self.fail:
+            return GeneratedReport(f"(LLM 调用失败) {user_query}", "fallback", prompt_tokens=100)
+        return GeneratedReport(f"report for {user_query}", "llm", 100, 20, 0.01, tokens_exact=True)
+
+
+def run(items, sink, generator, orch=None, **kwargs) -> BatchStats:
+    kwargs.setdefault("concurrency", 1)
+    kwargs.setdefault("chunk_size", 2)
+    return asyncio.run(run_batch_reports(items, sink, orch or StubOrchestrator(), LISTINGS, generator, **kwargs))
+
+
+@pytest.mark.parametrize("output", ["reports.jsonl", "reports"])
+def test_resume_after_crash(tmp_path, output) -> None:
+    path = tmp_path / output
+    with pytest.raises(RuntimeError, match="simulated crash"):
+        run(ITEMS, ReportSink(path, flush_every=1), StubGenerator(crash_after=3))
+    assert len(ReportSink(path).load()) == 3
+
+    generator = StubGenerator()
+    stats = run(ITEMS, ReportSink(path, flush_every=1), generator)
+    records = ReportSink(path).load()
+    assert set(records) == {it.id for it in ITEMS}
+    assert (stats.skipped, stats.items, len(generator.calls)) == (3, 4, 4)
+    assert records["cond-0"]["listing_ids"] in (["L1", "L2"], json.dumps(["L1", "L2"]))
+
+
+def test_truncated_last_line_dropped(tmp_path) -> None:
+    path = tmp_path / "reports.jsonl"
+    good = [{"id": "a", "source": "llm"}, {"id": "b", "source": "llm"}]
+    path.write_text("".join(json.dumps(r) + "\n" for r in good) + '{"id": "c", "sou', encoding="utf-8")
+
+    sink = ReportSink(path)
+    assert list(sink.load()) == ["a", "b"]
+    assert path.read_text(encoding="utf-8").endswith("}\n")
+    sink.write({"id": "c", "source": "llm"})
+    sink.close()
+    assert list(ReportSink(path).load()) == ["a", "b", "c"]
+
+
+def test_fallback_reports_regenerated(tmp_path) -> None:
+    path = tmp_path / "reports.jsonl"
+    run(ITEMS, ReportSink(path), StubGenerator(fail=("两居 1", "两居 4")))
+    assert sum(r["source"] == "fallback" for r in ReportSink(path).load().values()) == 2
+
+    generator = StubGenerator()
+    stats = run(ITEMS, ReportSink(path), generator)
+    assert sorted(generator.calls) == ["两居 1", "两居 4"]
+    assert stats.skipped == len(ITEMS) - 2
+    records = ReportSink(path).load()
+    assert all(r["source"] == "llm" for r in records.values())
+    assert records["item-1"]["report"] == "report for 两居 1"
+
+
+def test_parquet_part_numbering_continues(tmp_path) -> None:
+    path = tmp_path / "reports"
+    run(ITEMS[:3], ReportSink(path, flush_every=2), StubGenerator())
+    assert sorted(p.name for p in path.glob("part-*.parquet")) == ["part-00000.parquet", "part-00001.parquet"]
+
+    run(ITEMS[:5], ReportSink(path, flush_every=2), StubGenerator())
+    assert sorted(p.name for p in path.glob("part-*.parquet"))[-1] == "part-00002.parquet"
+
+    (path / "part-00001.parquet").unlink()  # 编号出现空洞时不能按个数续号覆盖已有分片
+    sink = ReportSink(path, flush_every=1)
+    lost = set(sink.load())
+    sink.write({"id": "extra", "conditions": {}, "listing_ids": [], "source": "llm"})
+    sink.close()
+    assert (path / "part-00003.parquet").exists()
+    assert set(ReportSink(path).load()) == lost | {"extra"}
+
+
+class UsageCompletions:
+    """OpenAI 兼容 client 的替身：usage 为 None 时模拟不返回用量的服务。"""
+
+    def __init__(self, usage) -> None:
+        self.usage = usage
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **request):
+        message = SimpleNamespace(content=" 生成的报告 ")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=self.usage)
+
+
+@pytest.mark.parametrize("usage", [SimpleNamespace(prompt_tokens=321, completion_tokens=45), None])
+def test_token_usage_from_api(monkeypatch, usage) -> None:
+    monkeypatch.setattr(settings, "report_cache_enabled", False)
+    generator = AnswerGenerator(llm_client=LLMClient(client=UsageCompletions(usage)))
+    report = asyncio.run(generator.agenerate("海淀两居", {"city": "北京"}, LISTINGS, {"count": 3}))
+    assert (report.text, report.source) == ("生成的报告", "llm")
+    if usage is not None:
+        assert (report.prompt_tokens, report.completion_tokens, report.tokens_exact) == (321, 45, True)
+    else:
+        assert report.prompt_tokens > 0 and report.completion_tokens > 0 and not report.tokens_exact
+
+    stats = BatchStats()
+    stats.add(report, input_price=1.0, output_price=2.0)
+    assert stats.tokens_exact == (usage is not None)
+    assert stats.cost == pytest.approx((report.prompt_tokens + 2 * report.completion_tokens) / 1e6)
@@ -0,0 +1,109 @@
+"""BM25 inverted-index scoring must match a naive dense Okapi BM25, and candidate restriction must match the filtered full ranking."""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_from_dataframe
+from src.retrieval.bm25_engine import BM25Engine
+from src.utils.text_utils import join_tokens, tokenize
+
+DESCRIPTIONS = [
+    "海淀 学区房 两室一厅 近地铁 南北通透",
+    "朝阳 三室两厅 精装修 近地铁 地铁 地铁",
+    "浦东 一室一厅 采光好 小区安静",
+    "海淀 两室 老小区 学区房 学区房 近公园 周边配套齐全 交通便利 出行方便",
+    "西城 四合院 独门独院",
+    "朝阳 两室一厅 近地铁 公园 学区",
+    "",
+]
+QUERIES = ["海淀 学区房", "近地铁 两室一厅", "朝阳 精装修 地铁", "公园", "南北通透 采光好 四合院"]
+
+
+def listings() -> pd.DataFrame:
+    return pd.DataFrame({"id": [f"L{i}" for i in range(len(DESCRIPTIONS))], "description": DESCRIPTIONS})
+
+
+def naive_bm25(engine: BM25Engine, corpus: list[str], query: str) -> np.ndarray:
+    """逐文档逐词项的稠密参考实现：idf = log1p((N - df + 0.5) / (df + 0.5))，k1/b 长度归一化。"""
+    analyzer = engine.vectorizer.build_analyzer()
+    docs = [analyzer(text) for text in corpus]
+    n_docs = len(docs)
+    avgdl = sum(len(d) for d in docs) / n_docs
+    k1, b = settings.bm25_k1, settings.bm25_b
+    scores = np.zeros(n_docs)
+    for term in set(analyzer(join_tokens(tokenize(query)))):
+        df = sum(term in d for d in docs)
+        if df == 0:
+            continue
+        idf = math.log1p((n_docs - df + 0.5) / (df + 0.5))
+        for i, d in enumerate(docs):
+            tf = d.count(term)
+            scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avgdl))
+    return scores
+
+
+@pytest.fixture(scope="module")
+def engine_and_corpus() -> tuple[BM25Engine, list[str]]:
+    df = listings()
+    corpus = [join_tokens(tokenize(t)) for t in df["description"]]
+    return BM25Engine(build_bm25_from_dataframe(df, corpus=corpus)), corpus
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_matches_naive_bm25(engine_and_corpus, query: str) -> None:
+    engine, corpus = engine_and_corpus
+    ref = naive_bm25(engine, corpus, query)
+    expected = sorted((i for i in range(len(ref)) if ref[i] > 0), key=lambda i: (-ref[i], i))[:3]
+
+    hits = engine.search(query, top_k=3)
+    assert [doc for doc, _ in hits] == expected
+    np.testing.assert_allclose([score for _, score in hits], ref[expected], rtol=1e-5)
+
+
+def test_zero_score_documents_dropped(engine_and_corpus) -> None:
+    engine, corpus = engine_and_corpus
+    ref = naive_bm25(engine, corpus, "公园")
+    hits = engine.search("公园", top_k=len(corpus))
+    assert [doc for doc, _ in hits] == sorted(np.flatnonzero(ref > 0), key=lambda i: (-ref[i], i))
+    assert len(hits) < len(corpus) and all(score > 0 for _, score in hits)
+    assert engine.search("完全不相关的词", top_k=len(corpus)) == []
+
+
+def test_batch_matches_single(engine_and_corpus) -> None:
+    engine, _ = engine_and_corpus
+    assert engine.search_batch(QUERIES, top_k=4) == [engine.search(q, top_k=4) for q in QUERIES]
+
+
+def restricted(hits: list[tuple[int, float]], allowed, top_k: int) -> list[tuple[int, float]]:
+    """全库排序按候选集过滤后截断，作为限候选集检索的期望结果。"""
+    return [(doc, score) for doc, score in hits if doc in set(allowed)][:top_k]
+
+
+@pytest.mark.parametrize("allowed", [[0, 2, 3, 5], [1], [5, 3, 3, 0], [2, 4, 6]])
+@pytest.mark.parametrize("query", QUERIES)
+def test_allowed_equals_filtered_ranking(engine_and_corpus, query: str, allowed: list[int]) -> None:
+    engine, corpus = engine_and_corpus
+    full = engine.search(query, top_k=len(corpus))
+    assert engine.search(query, top_k=2, allowed=np.array(allowed)) == restricted(full, allowed, 2)
+
+
+def test_allowed_edge_cases(engine_and_corpus) -> None:
+    engine, corpus = engine_and_corpus
+    everything = np.arange(len(corpus))
+    for query in QUERIES:
+        assert engine.search(query, top_k=3, allowed=np.zeros(0, dtype=np.int64)) == []
+        assert engine.search(query, top_k=3, allowed=everything) == engine.search(query, top_k=3)
+        assert engine.search(query, top_k=3, allowed=everything[::-1]) == engine.search(query, top_k=3)
+
+
+def test_batch_mixed_allowed(engine_and_corpus) -> None:
+    engine, corpus = engine_and_corpus
+    allowed_list = [None, np.array([0, 3, 5]), np.zeros(0, dtype=np.int64), np.arange(len(corpus)), np.array([2])]
+    results = engine.search_batch(QUERIES, top_k=2, allowed_list=allowed_list)
+    assert results == [engine.search(q, top_k=2, allowed=a) for q, a in zip(QUERIES, allowed_list)]
+    assert results[2] == [] and results[1] == restricted(engine.search(QUERIES[1], top_k=len(corpus)), [0, 3, 5], 2)
@@ -0,0 +1,91 @@
+"""Embedding cache: hit/miss accounting, identical vectors either way, stale entries dropped, mmap released before rewrite."""
+from __future__ import annotations
+
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.pipeline.embedding_cache import EmbeddingCache
+from src.utils.text_utils import text_key
+
+DIM = 8
+
+
+class StubModel:
+    """SentenceTransformer 的替身：按文本 crc32 生成确定向量，记录实际编码的文本与编码时缓存文件是否仍被映射。"""
+
+    def __init__(self, cache_path: Path) -> None:
+        self.cache_path = cache_path
+        self.encoded: list[str] = []
+        self.mapped_during_encode: list[bool] = []
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIM
+
+    def encode(self, texts, batch_size=64, show_progress_bar=False, normalize_embeddings=True):
+        self.encoded.extend(texts)
+        self.mapped_during_encode.append(_is_mapped(self.cache_path))
+        vecs = np.stack([np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(DIM) for t in texts])
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _is_mapped(path: Path) -> bool:
+    maps = Path("/proc/self/maps")
+    return maps.exists() and str(path) in maps.read_text()
+
+
+def cached_keys(cache: EmbeddingCache) -> set[bytes]:
+    return set(np.load(cache.path)["key"].tolist())
+
+
+@pytest.mark.parametrize("dtype", ["float16", "float32"])
+def test_hits_and_misses(tmp_path, capsys, dtype: str) -> None:
+    cache = EmbeddingCache("stub/model", root=tmp_path, dtype=dtype)
+    first_corpus = ["海淀 两室", "朝阳 三室", "浦东 一室", "海淀 两室"]
+    model = StubModel(cache.path)
+    first = cache.encode(first_corpus, model, show_progress_bar=False)
+    assert sorted(model.encoded) == ["朝阳 三室", "浦东 一室", "海淀 两室"]  # 重复文本只编码一次
+    assert "0 hits, 3 misses, 1 duplicates" in capsys.readouterr().out
+    np.testing.assert_array_equal(first[0], first[3])
+
+    second_corpus = ["浦东 一室", "西城 四合院", "海淀 两室"]
+    model = StubModel(cache.path)
+    second = cache.encode(second_corpus, model, show_progress_bar=False)
+    assert model.encoded == ["西城 四合院"]
+    assert "2 hits, 1 misses, 0 duplicates" in capsys.readouterr().out
+    np.testing.assert_array_equal(second[0], first[2])  # 命中与新编码得到的向量逐位一致
+    np.testing.assert_array_equal(second[2], first[0])
+    assert second.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(second, axis=1), 1.0, rtol=1e-6)
+
+    third = cache.encode(second_corpus, StubModel(cache.path), show_progress_bar=False)
+    assert "3 hits, 0 misses" in capsys.readouterr().out
+    np.testing.assert_array_equal(third, second)
+
+
+def test_stale_entries_dropped_on_rewrite(tmp_path) -> None:
+    cache = EmbeddingCache("stub/model", root=tmp_path)
+    cache.encode(["a 1", "b 2", "c 3"], StubModel(cache.path), show_progress_bar=False)
+    assert cached_keys(cache) == {text_key(t) for t in ["a 1", "b 2", "c 3"]}
+
+    cache.encode(["b 2", "d 4"], StubModel(cache.path), show_progress_bar=False)
+    assert cached_keys(cache) == {text_key(t) for t in ["b 2", "d 4"]}  # 已下架文本的条目不再保留
+
+    cache.encode(["b 2"], StubModel(cache.path), show_progress_bar=False)  # 全部命中但有旧条目：仍重写
+    assert cached_keys(cache) == {text_key("b 2")}
+
+    before = cache.path.stat().st_mtime_ns
+    cache.encode(["b 2", "e 5"], StubModel(cache.path), show_progress_bar=False, persist=False)  # 只读
+    assert cache.path.stat().st_mtime_ns == before and cached_keys(cache) == {text_key("b 2")}
+
+
+@pytest.mark.skipif(not Path("/proc/self/maps").exists(), reason="needs /proc/self/maps")
+def test_mapping_released_before_encode(tmp_path) -> None:
+    cache = EmbeddingCache("stub/model", root=tmp_path)
+    cache.encode(["a 1", "b 2"], StubModel(cache.path), show_progress_bar=False)
+    model = StubModel(cache.path)
+    cache.encode(["a 1", "c 3"], model, show_progress_bar=False)
+    assert model.mapped_during_encode == [False]  # 编码与替换文件时已不再持有缓存文件的映射
+    assert not _is_mapped(cache.path)
@@ -0,0 +1,75 @@
+"""FilterIndex registration: only registered resident frames use the index, and lookups are identity-checked."""
+from __future__ import annotations
+
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from src.retrieval.filter_engine import _apply_filters_mask, apply_filters
+from src.retrieval.filter_index import FilterIndex
+
+
+def listings(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "city": rng.choice(["北京", "上海"], n),
+            "district": rng.choice(["海淀", "朝阳", "浦东"], n),
+            "total_price": rng.uniform(100, 1500, n).round(1),
+            "area": np.where(rng.random(n) < 0.05, np.nan, rng.uniform(30, 200, n)),
+            "bedrooms": rng.integers(1, 5, n),
+            "livingrooms": rng.integers(0, 3, n),
+            "school_district": rng.choice([True, False], n),
+        }
+    )
+
+
+CONDITIONS = [
+    {},
+    {"city": "北京", "max_price": 600.0},
+    {"districts": ["海淀", "浦东"], "min_area": 80, "bedrooms": 2},
+    {"school_district": True, "livingrooms_exact": 1, "min_price": 300.0, "max_price": 900.0},
+]
+
+
+def test_transient_frames_are_not_indexed() -> None:
+    df = listings(6000)
+    subset = df[df["city"] == "北京"]  # 请求中的临时表
+    for cond in CONDITIONS:
+        assert apply_filters(subset, cond).index.equals(_apply_filters_mask(subset, cond).index)
+    assert FilterIndex.lookup(subset) is None
+    assert FilterIndex.lookup(df) is None
+
+
+def test_registered_frame_uses_index() -> None:
+    df = listings(6000, seed=1)
+    index = FilterIndex.for_frame(df)
+    assert FilterIndex.lookup(df) is index
+    assert FilterIndex.for_frame(df) is index
+    for cond in CONDITIONS:
+        assert apply_filters(df, cond).index.equals(_apply_filters_mask(df, cond).index)
+
+
+def test_lookup_checks_identity_and_length() -> None:
+    df = listings(100, seed=2)
+    FilterIndex.for_frame(df)
+    assert FilterIndex.lookup(df.copy()) is None
+    # 模拟原对象回收后 id 被新对象复用：弱引用指向的不是查询的对象，不能命中
+    reused = listings(100, seed=3)
+    FilterIndex._cache[id(reused)] = (weakref.ref(df), FilterIndex(df))
+    assert FilterIndex.lookup(reused) is None
+    df.loc[len(df)] = df.iloc[0]  # 原地追加行后旧索引失效
+    assert FilterIndex.lookup(df) is None
+
+
+def test_concurrent_registration_builds_one_entry() -> None:
+    df = listings(6000, seed=5)
+    results: list[FilterIndex] = []
+    threads = [threading.Thread(target=lambda: results.append(FilterIndex.for_frame(df))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(r is FilterIndex.lookup(df) for r in results)
@@ -0,0 +1,151 @@
+"""Incremental upsert/delete keeps parquet, BM25 and vectors aligned by slot, and compaction equals a full rebuild."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.agent.orchestrator import Orchestrator
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_from_dataframe, build_bm25_index
+from src.pipeline.build_dataset import build_dataset
+from src.pipeline.build_shards import build_shards
+from src.pipeline.build_vectors import build_vector_index
+from src.pipeline.corpus import document_texts
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.incremental import ListingStore, apply_changes
+from src.pipeline.preprocess import preprocess_dataframe
+from src.retrieval.bm25_engine import BM25Engine
+from src.retrieval.listing_dataset import ListingDataset
+from src.retrieval.semantic_engine import SemanticEngine
+from src.retrieval.shard_router import ShardRouter
+from tests.stub_model import use_tmp_store
+
+N_BASE = 60
+
+
+@pytest.fixture()
+def raw(tmp_path, monkeypatch) -> pd.DataFrame:
+    """在 tmp_path 下跑一遍全量管线（preprocess → BM25 → 向量），返回全部原始房源；前 N_BASE 条已入库。"""
+    paths = use_tmp_store(monkeypatch, tmp_path)
+    monkeypatch.setattr(settings, "vector_index_type", "flat")
+    raw = generate_listings(n=N_BASE + 20, coverage_per_bedroom=1).reset_index(drop=True)
+    paths.processed_dir.mkdir(parents=True)
+    preprocess_dataframe(raw.head(N_BASE)).to_parquet(paths.processed_parquet, index=False)
+    build_bm25_index()
+    build_vector_index()
+    return raw
+
+
+def stored() -> pd.DataFrame:
+    return pd.read_parquet(settings.paths.processed_parquet)
+
+
+def doc_text(df: pd.DataFrame, slot: int) -> str:
+    """槽位对应文档的原文：作为查询时 BM25 命中其全部词项，替身模型给出与文档相同的向量。"""
+    return document_texts(df.loc[[slot]])[0]
+
+
+def retrieved_slots(query: str, top_k: int = 200) -> tuple[set[int], set[int]]:
+    """按全库（不限候选集）检索 BM25 与向量索引，返回两路命中的槽位集合。"""
+    bm25 = {slot for slot, _ in BM25Engine().search(query, top_k=top_k)}
+    semantic = {slot for slot, _ in SemanticEngine().search(query, top_k=top_k)}
+    return bm25, semantic
+
+
+def test_upsert_overwrites_by_id(raw) -> None:
+    before = stored()
+    target = raw.iloc[3].copy()
+    old_slot = int(before.index[before["id"] == target["id"]][0])
+    old_text = doc_text(before, old_slot)
+    target["total_price"] = 123.0
+    target["description"] = raw.iloc[7]["description"]  # 与另一条在库房源相同，主段词表内的词可检索
+
+    stats = apply_changes(upserts=pd.DataFrame([target]), compact=False)
+    after = stored()
+    assert (stats.upserted, stats.deleted, stats.live_docs) == (1, 0, N_BASE)
+    assert after["id"].is_unique and len(after) == N_BASE
+    row = after[after["id"] == target["id"]]
+    new_slot = int(row.index[0])
+    assert new_slot >= N_BASE and row["total_price"].iloc[0] == 123.0
+    assert old_slot not in after.index
+
+    bm25, semantic = retrieved_slots(old_text)
+    assert old_slot not in bm25 and old_slot not in semantic
+    bm25, semantic = retrieved_slots(doc_text(after, new_slot))
+    assert new_slot in bm25
+    assert SemanticEngine().search(doc_text(after, new_slot), top_k=1)[0][0] == new_slot
+
+
+def test_deleted_slots_never_return(raw) -> None:
+    before = stored()
+    deleted = before.iloc[[0, 5, 11, 20, 33]]
+    texts = [doc_text(before, slot) for slot in deleted.index]
+    upserts = raw.iloc[N_BASE : N_BASE + 8]
+    stats = apply_changes(upserts=upserts, deletes=[*deleted["id"], "NO-SUCH-ID"], compact=False)
+    assert (stats.upserted, stats.deleted, stats.not_found, stats.tombstones) == (8, 5, 1, 5)
+
+    after = stored()
+    assert len(after) == N_BASE + 3 and not set(deleted["id"]) & set(after["id"])
+    assert set(upserts["id"]) <= set(after["id"])
+    orchestrator = Orchestrator.create()
+    for text, (slot, row) in zip(texts, deleted.iterrows()):
+        bm25, semantic = retrieved_slots(text)
+        assert not set(deleted.index) & (bm25 | semantic)
+        result = orchestrator.run(text, after, top_k=20, conditions={"city": row["city"]})["results"]
+        assert not set(deleted["id"]) & set(result["id"])
+
+    inserted = after[after["id"] == upserts["id"].iloc[0]]
+    result = orchestrator.run(doc_text(after, inserted.index[0]), after, top_k=5, conditions={"city": inserted["city"].iloc[0]})
+    assert inserted["id"].iloc[0] in set(result["results"]["id"])
+
+    apply_changes(compact=True)  # 压缩后墓碑清空，已删除槽位也不会回到倒排表
+    for text in texts:
+        bm25, semantic = retrieved_slots(text)
+        assert not set(deleted.index) & (bm25 | semantic)
+
+
+def test_next_slot_never_reused(raw) -> None:
+    seen = set(stored().index)
+    for i in range(3):
+        batch = raw.iloc[N_BASE + 2 * i : N_BASE + 2 * i + 2]
+        apply_changes(upserts=batch, compact=False)
+        new_slots = set(stored().index) - seen
+        assert len(new_slots) == 2 and min(new_slots) > max(seen)
+        seen |= new_slots
+
+    top = int(max(seen))
+    apply_changes(deletes=list(stored().loc[[top], "id"]), compact=True)  # 删除最大槽位后再压缩
+    store = ListingStore()
+    assert store.next_slot == top + 1
+    assert store.bm25["n_docs"] == top + 1 and not store.bm25["segments"] and store.bm25["deleted"].size == 0
+
+    apply_changes(upserts=raw.iloc[[N_BASE + 10]], compact=False)
+    assert max(stored().index) == top + 1
+
+
+def test_compact_matches_full_rebuild(raw) -> None:
+    before = stored()
+    apply_changes(upserts=raw.iloc[N_BASE:], deletes=before["id"].iloc[::4], compact=False)
+    assert BM25Engine().segments  # 未压缩：新文档在增量段中
+    stats = apply_changes(compact=True)
+    assert stats.compacted and (stats.delta_docs, stats.tombstones) == (0, 0)
+
+    live = stored()
+    compacted = BM25Engine()
+    rebuilt = BM25Engine(bundle=build_bm25_from_dataframe(live, doc_ids=live.index.to_numpy()))
+    queries = [doc_text(live, slot) for slot in live.index[::7]] + ["学区房 南北通透", "近地铁 精装修"]
+    for query in queries:
+        got, expected = compacted.search(query, top_k=30), rebuilt.search(query, top_k=30)
+        assert [slot for slot, _ in got] == [slot for slot, _ in expected]
+        np.testing.assert_allclose([s for _, s in got], [s for _, s in expected], rtol=1e-6)
+
+
+def test_dataset_and_shards_stale_after_changes(raw) -> None:
+    build_dataset()
+    build_shards("city")
+    assert ListingDataset.load() is not None and ShardRouter.load() is not None
+
+    apply_changes(deletes=[raw["id"].iloc[0]])
+    assert ListingDataset.load() is None
+    assert ShardRouter.load() is None
@@ -0,0 +1,42 @@
+"""LLMClient deadlines against the local fake OpenAI-compatible server."""
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from src.agent.llm_client import LLMClient
+from tests.fake_llm import fake_llm_server
+
+REQUEST = {"model": "fake", "messages": [{"role": "user", "content": "海淀两居"}]}
+
+
+def client_for(server, timeout: float) -> LLMClient:
+    return LLMClient(api_key="fake", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0, timeout=timeout)
+
+
+def test_stream_deadline_is_wall_clock() -> None:
+    # 首个 token 在 deadline 前到达，之后服务端停住：读取超时从最后一个分块重新计时，不能据此约束总时长
+    server = fake_llm_server(["甲", "乙", "丙"], first_token_s=0.6, token_s=3.0)
+    try:
+        got = []
+        t0 = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            for delta in client_for(server, timeout=1.0).stream(REQUEST):
+                got.append(delta)
+        elapsed = time.perf_counter() - t0
+    finally:
+        server.shutdown()
+    assert got == ["甲"]
+    assert elapsed < 1.4
+
+
+def test_stream_within_deadline_reuses_connection() -> None:
+    server = fake_llm_server(list("甲乙丙丁"), first_token_s=0.0, token_s=0.01)
+    try:
+        client = client_for(server, timeout=5.0)
+        texts = ["".join(client.stream(REQUEST)) for _ in range(3)]
+    finally:
+        server.shutdown()
+    assert texts == ["甲乙丙丁"] * 3
+    assert server.connections == 1
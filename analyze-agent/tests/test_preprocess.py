@@ -0,0 +1,33 @@
+"""Streaming ingest widens every conflicting column in a single restart."""
+from __future__ import annotations
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_streaming
+
+
+def test_type_conflicts_restart_once(tmp_path, capsys) -> None:
+    raw = generate_listings(n=300)
+    raw = raw.astype({"floor": object, "year_built": object, "noise_level": object})
+    raw.loc[150, "floor"] = 3.5  # 第二块：整数列出现小数
+    raw.loc[250, "year_built"] = 2001.5  # 第三块：另一整数列出现小数
+    raw.loc[160, "noise_level"] = 2.5  # 第二块放宽为 float64
+    raw.loc[260, "noise_level"] = "高"  # 第三块再混入文本，需逐级放宽为字符串
+    src = tmp_path / "raw.csv"
+    raw.to_csv(src, index=False)
+
+    out = preprocess_streaming(src, tmp_path / "listings.parquet", chunk_rows=100)
+
+    assert capsys.readouterr().out.count("restarting") == 1
+    schema = pq.read_schema(out)
+    assert schema.field("floor").type == pa.float64()
+    assert schema.field("year_built").type == pa.float64()
+    assert schema.field("noise_level").type == pa.string()
+    assert schema.field("bedrooms").type == pa.int64()
+    df = pd.read_parquet(out)
+    assert len(df) == len(raw)
+    assert df.loc[150, "floor"] == 3.5 and df.loc[250, "year_built"] == 2001.5
+    assert df.loc[260, "noise_level"] == "高"
@@ -0,0 +1,42 @@
+"""The semantic layer of the report cache embeds queries without holding the cache lock."""
+from __future__ import annotations
+
+import threading
+import time
+
+import numpy as np
+
+from src.agent.report_cache import ReportCache
+
+
+def test_exact_lookups_not_blocked_by_embedding() -> None:
+    embedding = threading.Event()
+
+    def embed(queries: list[str]) -> np.ndarray:
+        embedding.set()
+        time.sleep(0.5)
+        return np.stack([np.full(4, 0.5) if "两居" in q else np.array([1.0, 0, 0, 0]) for q in queries])
+
+    cache = ReportCache(max_entries=10, ttl_seconds=0, semantic_threshold=0.9, embed=embed)
+    cache.put("result", {"city": "北京", "districts": ["海淀"]}, "海淀两居", "report", 3.0)
+    semantic: list[str | None] = []
+    worker = threading.Thread(target=lambda: semantic.append(cache.get("result", {"districts": ["海淀"], "bedrooms": 2}, "海淀两居室")))
+    worker.start()
+    embedding.wait()
+    t0 = time.perf_counter()
+    exact = cache.get("result", {"districts": ["海淀"], "city": "北京"}, "北京海淀两居")
+    blocked = time.perf_counter() - t0
+    worker.join()
+
+    assert exact == "report" and semantic == ["report"]
+    assert blocked < 0.25
+    stats = cache.stats()
+    assert (stats["hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_semantic_miss_below_threshold() -> None:
+    cache = ReportCache(max_entries=10, ttl_seconds=0, semantic_threshold=0.9, embed=lambda qs: np.eye(4)[: len(qs)])
+    cache.put("result", {"city": "北京"}, "海淀两居", "report", 1.0)
+    assert cache.get("result", {"city": "上海"}, "浦东别墅") is None
+    assert cache.get("other", {"city": "北京"}, "海淀两居") is None
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,88 @@
+"""Columnar quality scoring must match the row-wise reference implementation exactly."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config import settings
+from src.ranking.scoring import (
+    QUALITY_COMPONENTS,
+    _clip01,
+    _compute_quality_components,
+    add_static_quality_columns,
+    compute_quality_scores,
+)
+
+NAN = np.nan
+
+FILTER_CASES = [
+    {},
+    {"max_price": 600.0},
+    {"min_price": 300.0, "max_price": 800.0},
+    {"min_area": 80},
+    {"max_area": 120.0},
+    {"min_area": 70, "max_area": 110.0},  # 两端都给定：目标面积为 area_min / 2
+]
+
+
+def candidates() -> pd.DataFrame:
+    """手工构造的候选集：常规行、全缺失行与各子分数的裁剪边界。"""
+    return pd.DataFrame(
+        {
+            "id": ["normal", "all_nan", "above_edges", "at_edges", "below_one"],
+            "total_price": [500.0, NAN, 2000.0, 720.0, 0.5],  # 720 = 600 * 1.2；2000 超出预算上限 1.2 倍；0.5 < 1
+            "area": [90.0, NAN, 300.0, 35.0, 30.0],  # 35 = 70 / 2
+            "year_built": [2010.0, NAN, 2030.0, 1985.0, 2025.0],
+            "distance_to_subway": [0.5, NAN, 3.5, 0.0, 2.0],
+            "school_district": [True, None, False, True, False],
+            "floor": [10.0, NAN, 0.0, 30.0, 1.0],
+            "total_floors": [20.0, NAN, 0.0, 30.0, 1.0],
+            "orientation": ["南北", None, "北", "东西", "西"],
+            "renovation": ["精装修", None, "毛坯", "简装", "其他"],
+        }
+    )
+
+
+def reference_scores(df: pd.DataFrame, user_filters: dict) -> pd.DataFrame:
+    """逐行参考实现（_compute_quality_components + 加权裁剪）。"""
+    w = settings.quality_weights
+    rows = []
+    for _, row in df.iterrows():
+        comp = _compute_quality_components(row, user_filters)
+        values = {name: getattr(comp, name) for name in QUALITY_COMPONENTS}
+        total = sum(values[name] * w.get(name, 0) for name in QUALITY_COMPONENTS)
+        values["quality"] = _clip01(total)
+        rows.append(values)
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("user_filters", FILTER_CASES, ids=lambda f: ",".join(f) or "none")
+@pytest.mark.parametrize("variant", ["columnar", "prebuilt", "nullable_bool"])
+def test_columnar_matches_rowwise(user_filters: dict, variant: str) -> None:
+    df = candidates()
+    ref = reference_scores(df, user_filters)
+    if variant == "prebuilt":
+        frame = add_static_quality_columns(df.copy())  # preprocess 产出的预计算列
+    elif variant == "nullable_bool":
+        frame = df.astype({"school_district": "boolean"})  # pd.NA 学区按 False
+    else:
+        frame = df
+    scored = compute_quality_scores(frame, user_filters)
+    for name in QUALITY_COMPONENTS:
+        np.testing.assert_allclose(scored[f"{name}_score"].to_numpy(), ref[name].to_numpy(), rtol=0, atol=1e-12, err_msg=name)
+    np.testing.assert_allclose(scored["quality_score"].to_numpy(), ref["quality"].to_numpy(), rtol=0, atol=1e-12)
+
+
+def test_edge_values() -> None:
+    """几个裁剪边界的具体取值，防止参考实现与列式实现一起改错。"""
+    scored = compute_quality_scores(candidates(), {"max_price": 600.0}).set_index("id")
+    assert scored.loc["above_edges", "price_score"] == 0.0  # 超出预算上限 1.2 倍
+    assert scored.loc["at_edges", "price_score"] == pytest.approx(0.0, abs=1e-6)  # 恰为 1.2 倍：不直接归零，按偏离目标计分
+    assert scored.loc["all_nan", ["price_score", "area_score", "age_score"]].tolist() == [0.5, 0.5, 0.5]
+    assert scored.loc["all_nan", "subway_score"] == 1.0
+    assert scored.loc["above_edges", "age_score"] == 1.0 and scored.loc["above_edges", "subway_score"] == 0.0
+    assert scored.loc["above_edges", "floor_score"] == 0.5  # total_floors 为 0 时按 max(floor, 1) 处理
+
+    area = compute_quality_scores(candidates(), {"min_area": 70, "max_area": 110.0}).set_index("id")["area_score"]
+    assert area["at_edges"] == pytest.approx(1.0)  # 目标面积 70 / 2 = 35
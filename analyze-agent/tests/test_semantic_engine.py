@@ -0,0 +1,82 @@
+"""Candidate-restricted vector search must equal the full ranking filtered to the candidates."""
+from __future__ import annotations
+
+import zlib
+
+import faiss
+import numpy as np
+import pytest
+
+from src.retrieval.semantic_engine import SemanticEngine
+
+DIM = 8
+N_DOCS = 40
+QUERIES = ["海淀 学区房", "近地铁 两室", "朝阳 精装修", "浦东 一室"]
+
+
+class StubModel:
+    """SentenceTransformer 的替身：按文本 crc32 生成确定的归一化向量。"""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIM
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=True, show_progress_bar=False):
+        vecs = np.stack([np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(DIM) for t in texts])
+        return (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)).astype("float32")
+
+
+def doc_vectors() -> np.ndarray:
+    vecs = np.random.default_rng(0).standard_normal((N_DOCS, DIM)).astype("float32")
+    vecs[7] = vecs[3]  # 同分文档：限候选集检索按槽位先后
+    faiss.normalize_L2(vecs)
+    return vecs
+
+
+def flat_engine() -> SemanticEngine:
+    index = faiss.IndexFlatIP(DIM)
+    index.add(doc_vectors())
+    return SemanticEngine(index=index, model=StubModel())
+
+
+def slot_engine() -> SemanticEngine:
+    """外包 IndexIDMap2、id 为不连续的文档槽位（增量维护后的默认库 / 分片索引）。"""
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(DIM))
+    index.add_with_ids(doc_vectors(), np.arange(N_DOCS, dtype=np.int64) * 3 + 5)
+    return SemanticEngine(index=index, model=StubModel())
+
+
+def restricted(hits: list[tuple[int, float]], allowed, top_k: int) -> list[tuple[int, float]]:
+    return [(doc, score) for doc, score in hits if doc in set(allowed)][:top_k]
+
+
+def ranking(hits: list[tuple[int, float]]) -> list[int]:
+    """FAISS 全库检索对同分文档的先后不作保证，比较前统一按 (得分降序, 槽位) 排列。"""
+    return [doc for doc, _ in sorted(hits, key=lambda h: (-round(h[1], 5), h[0]))]
+
+
+@pytest.mark.parametrize("make_engine, ids", [(flat_engine, np.arange(N_DOCS)), (slot_engine, np.arange(N_DOCS) * 3 + 5)])
+@pytest.mark.parametrize("query", QUERIES)
+def test_allowed_equals_filtered_ranking(make_engine, ids: np.ndarray, query: str) -> None:
+    engine = make_engine()
+    assert engine._flat_subset
+    full = engine.search(query, top_k=N_DOCS)
+    for allowed in (ids[::3], ids[[3, 7, 11, 20]], ids[5:6], np.concatenate([ids[10:20], [ids[-1] + 1]])):
+        hits = engine.search(query, top_k=5, allowed=allowed)
+        assert [doc for doc, _ in hits] == ranking(restricted(full, allowed, 5))
+        np.testing.assert_allclose([s for _, s in hits], [s for _, s in restricted(full, allowed, 5)], rtol=1e-6)
+
+    assert engine.search(query, top_k=5, allowed=np.zeros(0, dtype=np.int64)) == []
+    everything = engine.search(query, top_k=5, allowed=ids[::-1])
+    assert ranking(everything) == ranking(full[:5])
+
+
+def test_batch_mixed_allowed() -> None:
+    engine = slot_engine()
+    ids = np.arange(N_DOCS) * 3 + 5
+    allowed_list = [None, ids[::4], np.zeros(0, dtype=np.int64), ids]
+    results = engine.search_batch(QUERIES, top_k=5, allowed_list=allowed_list)
+    for query, allowed, hits in zip(QUERIES, allowed_list, results):
+        expected = engine.search(query, top_k=5, allowed=allowed)
+        assert [doc for doc, _ in hits] == [doc for doc, _ in expected]
+        np.testing.assert_allclose([s for _, s in hits], [s for _, s in expected], rtol=1e-6)
+    assert results[2] == []
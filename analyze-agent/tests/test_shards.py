@@ -0,0 +1,104 @@
+"""Shard routing rules, hit merging, staleness, and sharded retrieval equal to the global indexes."""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.agent.orchestrator import Orchestrator
+from src.config import settings
+from src.pipeline.build_bm25 import build_bm25_index
+from src.pipeline.build_shards import UNKNOWN_SHARD, build_shards
+from src.pipeline.build_vectors import build_vector_index
+from src.pipeline.generate_listings import generate_listings
+from src.pipeline.preprocess import preprocess_dataframe
+from src.ranking.ranker import Ranker
+from src.retrieval.query_parser import QueryParser
+from src.retrieval.shard_router import ShardRouter, _merge_hits
+from tests.stub_model import use_tmp_store
+
+QUERIES = ["北京海淀两居 近地铁", "近地铁学区房", "上海浦东 精装修", "深圳 三居 南北通透", "采光好 安静"]
+
+
+def router(key: str, values: list) -> ShardRouter:
+    shards = {v: {"dir": f"shard_{i:03d}", "n_docs": 1} for i, v in enumerate(values)}
+    return ShardRouter(Path("unused"), {"key": key, "shards": shards})
+
+
+def test_route_by_city() -> None:
+    r = router("city", ["上海", "北京", UNKNOWN_SHARD])
+    assert r.route({}) == ["上海", "北京", UNKNOWN_SHARD]
+    assert r.route({"city": None, "districts": ["海淀"]}) == ["上海", "北京", UNKNOWN_SHARD]  # 未限定城市：含缺失城市的分片
+    assert r.route({"city": "北京"}) == ["北京"]  # 限定城市时不检索 UNKNOWN_SHARD
+    assert r.route({"city": ["北京", "上海"]}) == ["北京", "上海"]
+    assert r.route({"city": "广州"}) == []  # 没有该城市的分片：不检索任何分片
+    assert r.route({"city": ["广州", "上海"]}) == ["上海"]
+
+
+def test_route_by_district() -> None:
+    r = router("district", ["海淀", "朝阳", "浦东"])
+    assert r.route({"city": "北京"}) == ["海淀", "朝阳", "浦东"]
+    assert r.route({"districts": ["朝阳", "海淀"]}) == ["朝阳", "海淀"]
+    assert r.route({"districts": ["天河"]}) == []
+
+
+def test_merge_hits_ties_by_slot() -> None:
+    merged = _merge_hits([[(9, 1.0), (2, 0.5)], [(4, 1.0), (1, 0.5)], [(7, 0.75)]], top_k=4)
+    assert merged == [(4, 1.0), (9, 1.0), (7, 0.75), (1, 0.5)]
+    assert _merge_hits([[(9, 1.0), (2, 0.5)], []], top_k=5) == [(9, 1.0), (2, 0.5)]
+    assert _merge_hits([[(3, 0.2), (8, 0.1)]], top_k=1) == [(3, 0.2)]
+    assert _merge_hits([], top_k=3) == []
+
+
+def ids(output: dict) -> list[str]:
+    results = output["results"]
+    return results["id"].tolist() if "id" in results.columns else []
+
+
+@pytest.fixture()
+def store(tmp_path, monkeypatch) -> pd.DataFrame:
+    """tmp_path 下的默认库（含城市缺失的行）及按城市构建的分片，返回 listings。"""
+    paths = use_tmp_store(monkeypatch, tmp_path)
+    monkeypatch.setattr(settings, "vector_index_type", "flat")
+    df = preprocess_dataframe(generate_listings(n=90, coverage_per_bedroom=1)).reset_index(drop=True)
+    df.loc[[3, 17, 40], "city"] = None  # 分区键缺失的行归入 UNKNOWN_SHARD
+    paths.processed_dir.mkdir(parents=True)
+    df.to_parquet(paths.processed_parquet, index=False)
+    build_bm25_index()
+    build_vector_index()
+    build_shards("city")
+    return pd.read_parquet(paths.processed_parquet)
+
+
+def test_sharded_matches_global(store, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "shard_key", "city")
+    sharded = Orchestrator.create()
+    assert sharded.router is not None and UNKNOWN_SHARD in sharded.router.shards
+    unsharded = Orchestrator(bm25=None, semantic=None, parser=QueryParser(), ranker=Ranker())
+    conditions = [None, None, None, None, None, {"city": "广州"}, {"keywords": ["地铁"]}]
+    queries = QUERIES + ["广州 两居", "近地铁"]
+
+    for query, cond in zip(queries, conditions):
+        expected = ids(unsharded.run(query, store, top_k=10, conditions=cond))
+        assert ids(sharded.run(query, store, top_k=10, conditions=cond)) == expected
+        assert bool(expected) == (cond != {"city": "广州"})  # 库中没有的城市：两边都为空
+
+    batch = sharded.run_batch(queries, store, top_k=10, conditions=conditions)
+    expected = unsharded.run_batch(queries, store, top_k=10, conditions=conditions)
+    assert [ids(out) for out in batch] == [ids(out) for out in expected]
+    unknown = set(store.loc[store["city"].isna(), "id"])
+    assert unknown & {i for out in batch for i in ids(out)}  # 未限定城市的查询能检索到缺失城市的行
+
+
+def test_load_stale_after_parquet_change(store) -> None:
+    assert ShardRouter.load() is not None
+    parquet = settings.paths.processed_parquet
+    mtime = parquet.stat().st_mtime_ns
+    os.utime(parquet, ns=(mtime + 1_000_000, mtime + 1_000_000))
+    assert ShardRouter.load() is None
+    os.utime(parquet, ns=(mtime, mtime))
+    assert ShardRouter.load() is not None
+    (settings.paths.shards_dir / "manifest.joblib").unlink()
+    assert ShardRouter.load() is None
@@ -0,0 +1,81 @@
+"""Streamed assistant reports against the local fake OpenAI-compatible server."""
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from src.agent.answer_generator import AnswerGenerator
+from src.agent.llm_client import LLMClient
+from src.config import settings
+from tests.fake_llm import REPORT, fake_llm_server
+
+TOKENS = [REPORT[i : i + 3] for i in range(0, len(REPORT), 3)]
+LISTINGS = pd.DataFrame(
+    {
+        "id": ["L001", "L002"],
+        "city": ["北京", "北京"],
+        "district": ["海淀", "朝阳"],
+        "community": ["万柳书院", "望京花园"],
+        "layout": ["2室1厅", "3室1厅"],
+        "total_price": [620.0, 880.0],
+        "area": [78.5, 105.0],
+        "unit_price": [78980.0, 83810.0],
+        "distance_to_subway": [0.4, 1.2],
+        "school_district": [True, False],
+    }
+)
+FILTER = {"city": "北京", "max_price": 900.0}
+SUMMARY = {"count": 2, "price_avg": 750.0, "unit_price_avg": 81395.0, "area_avg": 91.75}
+
+
+@pytest.fixture(autouse=True)
+def no_report_cache(monkeypatch):
+    monkeypatch.setattr(settings, "report_cache_enabled", False)  # 每次都真正请求假服务
+
+
+def generator(fault=None) -> tuple[AnswerGenerator, object]:
+    server = fake_llm_server(TOKENS, first_token_s=0.0, token_s=0.001, fault=fault)
+    client = LLMClient(api_key="fake", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0, timeout=10)
+    return AnswerGenerator(llm_client=client), server
+
+
+def test_chunks_arrive_in_order() -> None:
+    gen, server = generator()
+    try:
+        chunks = list(gen.stream_report("海淀两居", FILTER, LISTINGS, SUMMARY))
+    finally:
+        server.shutdown()
+    assert chunks == TOKENS
+
+
+def test_streamed_text_equals_blocking_text() -> None:
+    gen, server = generator()
+    try:
+        streamed = "".join(gen.stream_report("海淀两居", FILTER, LISTINGS, SUMMARY))
+        blocking = gen.generate_report("海淀两居", FILTER, LISTINGS, SUMMARY)
+    finally:
+        server.shutdown()
+    assert streamed == blocking == REPORT
+
+
+def test_fallback_when_llm_fails() -> None:
+    gen, server = generator(fault=lambda: "error")
+    try:
+        chunks = list(gen.stream_report("海淀两居", FILTER, LISTINGS, SUMMARY))
+        blocking = gen.generate_report("海淀两居", FILTER, LISTINGS, SUMMARY)
+    finally:
+        server.shutdown()
+    assert len(chunks) == 1
+    assert chunks[0].startswith("(LLM 调用失败，使用本地模板。")
+    local = gen._fallback_report("海淀两居", LISTINGS, gen._format_summary(SUMMARY))
+    assert chunks[0].endswith(local) and blocking.endswith(local)
+
+
+def test_empty_results_skip_the_llm() -> None:
+    calls = []
+    gen, server = generator(fault=lambda: calls.append(1))
+    try:
+        chunks = list(gen.stream_report("海淀两居", FILTER, LISTINGS.iloc[:0], SUMMARY))
+    finally:
+        server.shutdown()
+    assert chunks == [gen.generate_report("海淀两居", FILTER, LISTINGS.iloc[:0], SUMMARY)] and not calls